@@ -0,0 +1,151 @@
+"""
+an in-process stand-in for the pymssql module, which counts connects and round trips and
+simulates a fixed latency per statement. Install it before importing mssql_resource_provider:
+
+    import fake_pymssql
+    fake_pymssql.install(latency=0.002)
+"""
+
+import re
+import sys
+import time
+
+
+class Error(Exception):
+    pass
+
+
+class InterfaceError(Error):
+    pass
+
+
+class DatabaseError(Error):
+    pass
+
+
+class OperationalError(DatabaseError):
+    pass
+
+
+class ProgrammingError(DatabaseError):
+    pass
+
+
+class IntegrityError(DatabaseError):
+    pass
+
+
+stats = {"connects": 0, "round_trips": 0}
+settings = {"latency": 0.0, "connect_latency": 0.0}
+
+# names of databases and principals which the catalog lookups report as not existing
+missing = set()
+
+
+def reset():
+    stats.update(connects=0, round_trips=0)
+
+
+def _round_trip():
+    stats["round_trips"] += 1
+    if settings["latency"]:
+        time.sleep(settings["latency"])
+
+
+class Cursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def execute(self, operation, params=None):
+        _round_trip()
+        self.connection.statements.append(operation)
+        self.rows = self.answer(operation, params)
+
+    @staticmethod
+    def answer(operation: str, params: dict = None) -> list:
+        """
+        answers the catalog lookups with an existing database and principal, unless named in `missing`.
+        """
+        if "SELECT" not in operation:
+            return []
+        params = params or {}
+        if "sys.sql_logins" in operation:
+            return [("master", 1, 7, b"\x01\x05")]
+        database_id = None if params.get("database") in missing else 5
+        if "names" in params:
+            return [
+                (name, database_id, None if name in missing else 7, b"\x01\x05")
+                for name in re.findall(r"<n>(.*?)</n>", params["names"])
+            ]
+        name = params.get("username") or params.get("login_name")
+        if name in missing:
+            return [(database_id, None, None)]
+        return [(database_id, 7, b"\x01\x05")]
+
+    def callproc(self, name, params=()):
+        _round_trip()
+        self.connection.statements.append(name)
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def close(self):
+        pass
+
+
+class Connection:
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.statements = []
+        self._autocommit = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def cursor(self):
+        return Cursor(self)
+
+    def autocommit(self, status):
+        self._autocommit = status
+
+    def commit(self):
+        if not self._autocommit:
+            _round_trip()
+
+    def rollback(self):
+        if not self._autocommit:
+            _round_trip()
+
+    def close(self):
+        pass
+
+
+def connect(**kwargs):
+    stats["connects"] += 1
+    if settings["connect_latency"]:
+        time.sleep(settings["connect_latency"])
+    return Connection(**kwargs)
+
+
+def install(latency: float = 0.0, connect_latency: float = 0.0):
+    """
+    registers this module as `pymssql`, with `latency` seconds per statement and `connect_latency` per connect.
+    """
+    settings.update(latency=latency, connect_latency=connect_latency)
+    module = sys.modules[__name__]
+    sys.modules["pymssql"] = module
+    return module
@@ -0,0 +1,24 @@
+"""
+an in-process stand-in for the boto3 ssm client, which counts the api calls.
+"""
+
+
+class FakeSSM:
+    def __init__(self, parameters: dict):
+        self.parameters = parameters
+        self.calls = 0
+
+    def get_parameter(self, Name, WithDecryption=False):
+        self.calls += 1
+        return {"Parameter": {"Name": Name, "Value": self.parameters[Name]}}
+
+    def get_parameters(self, Names, WithDecryption=False):
+        self.calls += 1
+        return {
+            "Parameters": [
+                {"Name": n, "Value": self.parameters[n]}
+                for n in Names
+                if n in self.parameters
+            ],
+            "InvalidParameters": [n for n in Names if n not in self.parameters],
+        }
@@ -0,0 +1,171 @@
+"""
+measures the overhead of the provider itself, by running mssql_resource_provider.handler against a
+fake pymssql driver, a fake ssm client and a local response sink. For each resource type and request
+type it writes a json line with the wall time, the number of SQL round trips, connects and SSM calls
+per request.
+
+    PYTHONPATH=src python benchmarks/providers.py --latency 0.002 --iterations 20 > bench.jsonl
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import fake_pymssql
+from fake_ssm import FakeSSM
+
+parameters = {"/db/sa": "P@ssW0rd", "/db/app": "S3cr3t!"}
+server = {"URL": "mssql://sa@localhost:1444/app", "PasswordParameterName": "/db/sa"}
+
+resources = {
+    "Custom::MSSQLDatabase": ({"Name": "app"}, {"Name": "app2"}),
+    "Custom::MSSQLLogin": (
+        {"LoginName": "app", "PasswordParameterName": "/db/app"},
+        {"LoginName": "app", "PasswordParameterName": "/db/app", "PasswordHash": "v2"},
+    ),
+    "Custom::MSSQLUser": (
+        {"UserName": "app", "LoginName": "app"},
+        {"UserName": "app", "LoginName": "app", "DefaultSchema": "app"},
+    ),
+    "Custom::MSSQLDatabaseGrant": (
+        {"Permissions": ["CONNECT", "SELECT"], "UserNames": ["app"], "Database": "app"},
+        {"Permissions": ["CONNECT", "INSERT"], "UserNames": ["app"], "Database": "app"},
+    ),
+    "Custom::MSSQLDatabaseBundle": (
+        {
+            "Name": "app",
+            "Logins": [{"LoginName": "app", "PasswordParameterName": "/db/app"}],
+            "Users": [{"UserName": "app", "LoginName": "app"}],
+            "Grants": [{"Permissions": ["CONNECT", "SELECT"], "UserNames": ["app"]}],
+        },
+        {
+            "Name": "app",
+            "Logins": [{"LoginName": "app", "PasswordParameterName": "/db/app"}],
+            "Users": [{"UserName": "app", "LoginName": "app"}],
+            "Grants": [{"Permissions": ["CONNECT", "INSERT"], "UserNames": ["app"]}],
+        },
+    ),
+}
+
+
+class ResponseSink(BaseHTTPRequestHandler):
+    # keeps the connection open, like the pre-signed S3 ResponseURL
+    protocol_version = "HTTP/1.1"
+    responses = []
+
+    def do_PUT(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        ResponseSink.responses.append(json.loads(body))
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_response_sink() -> str:
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), ResponseSink)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return "http://127.0.0.1:%d/" % httpd.server_port
+
+
+def request(response_url, resource_type, request_type, properties, old_properties):
+    result = {
+        "RequestType": request_type,
+        "ResponseURL": response_url,
+        "StackId": "arn:aws:cloudformation:eu-central-1:123456789012:stack/bench/guid",
+        "RequestId": str(uuid.uuid4()),
+        "ResourceType": resource_type,
+        "LogicalResourceId": "Bench",
+        "ResourceProperties": {**properties, "Server": dict(server)},
+    }
+    if request_type != "Create":
+        result["PhysicalResourceId"] = "mssql:Bench:bench"
+    if request_type == "Update":
+        result["OldResourceProperties"] = {**old_properties, "Server": dict(server)}
+    return result
+
+
+def measure(handler, ssm, events: list) -> dict:
+    durations = []
+    failures = 0
+    fake_pymssql.reset()
+    ssm.calls = 0
+    for event in events:
+        started = time.perf_counter()
+        response = handler(event, {})
+        durations.append((time.perf_counter() - started) * 1000)
+        if response["Status"] != "SUCCESS":
+            failures += 1
+            sys.stderr.write("%s\n" % response["Reason"])
+
+    n = len(events)
+    return {
+        "Requests": n,
+        "Failures": failures,
+        "WallTimeMs": {
+            "mean": round(statistics.mean(durations), 3),
+            "p50": round(statistics.median(durations), 3),
+            "max": round(max(durations), 3),
+        },
+        "RoundTrips": fake_pymssql.stats["round_trips"] / n,
+        "Connects": fake_pymssql.stats["connects"] / n,
+        "SSMCalls": ssm.calls / n,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds per statement"
+    )
+    parser.add_argument("--connect-latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    fake_pymssql.install(args.latency, args.connect_latency)
+    fake_pymssql.missing.add("app2")
+
+    import mssql_resource_provider
+    from mssql_resource_provider import connection_info, metrics
+
+    # the EMF lines would mix with the benchmark output
+    metrics.namespace = ""
+
+    ssm = FakeSSM(parameters)
+    connection_info.default_ssm_client = ssm
+    response_url = start_response_sink()
+
+    for resource_type, (properties, updated) in resources.items():
+        for request_type in ["Create", "Update", "Delete"]:
+            events = [
+                request(
+                    response_url,
+                    resource_type,
+                    request_type,
+                    updated if request_type == "Update" else properties,
+                    properties,
+                )
+                for _ in range(args.iterations)
+            ]
+            result = measure(mssql_resource_provider.handler, ssm, events)
+            print(
+                json.dumps(
+                    {
+                        "ResourceType": resource_type,
+                        "RequestType": request_type,
+                        "Latency": args.latency,
+                        **result,
+                    }
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
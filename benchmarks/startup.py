@@ -0,0 +1,51 @@
+"""
+reports the cold start cost of each resource type: the time to import the package and
+the module handling the resource type, and the resulting maximum resident set size.
+each resource type is measured in a fresh interpreter.
+
+    PYTHONPATH=src python benchmarks/startup.py
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+from mssql_resource_provider import handlers
+
+probe = """
+import json, resource, sys, time
+
+started = time.perf_counter()
+import mssql_resource_provider
+
+handler = mssql_resource_provider.get_handler(sys.argv[1])
+elapsed = time.perf_counter() - started
+
+print(json.dumps({
+    "ResourceType": sys.argv[1],
+    "ImportTime": round(elapsed * 1000, 2),
+    "MaxRSS": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "BotocoreLoaded": "botocore" in sys.modules,
+}))
+"""
+
+
+def measure(resource_type: str) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", probe, resource_type],
+        env=os.environ,
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    return json.loads(result.stdout)
+
+
+def main():
+    for resource_type in handlers:
+        print(json.dumps(measure(resource_type)))
+
+
+if __name__ == "__main__":
+    main()
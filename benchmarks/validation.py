@@ -0,0 +1,105 @@
+"""
+reports the cost of validating the resource properties of each resource type, with the
+validator of cfn_resource_provider which is built on every request, and with the cached
+validators of mssql_resource_provider.validation.
+
+    PYTHONPATH=src python benchmarks/validation.py
+"""
+
+import copy
+import importlib
+import json
+import timeit
+
+from cfn_resource_provider import ResourceProvider, default_injecting_validator
+
+from mssql_resource_provider import handlers, validation
+
+server = {"URL": "mssql://sa@localhost:1444/app", "PasswordParameterName": "/db/sa"}
+
+properties = {
+    "Custom::MSSQLLogin": {
+        "LoginName": "app",
+        "PasswordParameterName": "/db/app",
+        "Server": server,
+    },
+    "Custom::MSSQLUser": {"UserName": "app", "LoginName": "app", "Server": server},
+    "Custom::MSSQLDatabase": {"Name": "app", "Server": server},
+    "Custom::MSSQLDatabaseGrant": {
+        "Permissions": ["CONNECT", "SELECT", "INSERT"],
+        "UserNames": ["app", "reporting"],
+        "Database": "app",
+        "Server": server,
+    },
+    "Custom::MSSQLDatabaseBundle": {
+        "Name": "app",
+        "Logins": [{"LoginName": "app", "PasswordParameterName": "/db/app"}],
+        "Users": [{"UserName": "app", "LoginName": "app"}],
+        "Grants": [{"Permissions": ["CONNECT", "SELECT"], "UserNames": ["app"]}],
+        "Server": server,
+    },
+}
+
+request = {
+    "RequestType": "Create",
+    "ResponseURL": "https://httpbin.org/put",
+    "StackId": "arn:aws:cloudformation:us-west-2:EXAMPLE/stack-name/guid",
+    "RequestId": "request-1",
+    "ResourceType": "Custom::MSSQLLogin",
+    "LogicalResourceId": "Whatever",
+    "ResourceProperties": {},
+}
+
+
+def measure(statement, number: int) -> float:
+    return round(timeit.timeit(statement, number=number) / number * 1_000_000, 1)
+
+
+def main(number: int = 200):
+    import jsonschema
+
+    for resource_type, module_name in handlers.items():
+        schema = importlib.import_module(module_name).request_schema
+        instance = properties[resource_type]
+        print(
+            json.dumps(
+                {
+                    "ResourceType": resource_type,
+                    "BeforeMicroseconds": measure(
+                        lambda: default_injecting_validator.validate(
+                            copy.deepcopy(instance), schema
+                        ),
+                        number,
+                    ),
+                    "AfterMicroseconds": measure(
+                        lambda: validation.validate(copy.deepcopy(instance), schema),
+                        number,
+                    ),
+                    "Compiled": validation.get_compiled_validator(schema) is not None,
+                }
+            )
+        )
+
+    print(
+        json.dumps(
+            {
+                "ResourceType": "CloudFormationRequest",
+                "BeforeMicroseconds": measure(
+                    lambda: jsonschema.validate(
+                        request, ResourceProvider.cfn_request_schema
+                    ),
+                    number,
+                ),
+                "AfterMicroseconds": measure(
+                    lambda: validation.validate_best_match(
+                        request, ResourceProvider.cfn_request_schema
+                    ),
+                    number,
+                ),
+            }
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
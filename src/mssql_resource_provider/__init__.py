@@ -1,12 +1,47 @@
-from mssql_resource_provider import login, user, database, grant
+import importlib
+import os
+
+# maps the custom resource type to the module implementing it, imported on first use.
+handlers = {
+    "Custom::MSSQLLogin": "mssql_resource_provider.login",
+    "Custom::MSSQLUser": "mssql_resource_provider.user",
+    "Custom::MSSQLDatabase": "mssql_resource_provider.database",
+    "Custom::MSSQLDatabaseGrant": "mssql_resource_provider.grant",
+    "Custom::MSSQLDatabaseBundle": "mssql_resource_provider.bundle",
+}
+
+
+def get_handler(resource_type: str):
+    module = importlib.import_module(
+        handlers.get(resource_type, handlers["Custom::MSSQLLogin"])
+    )
+    return module.handler
 
 
 def handler(request, context):
-    if request["ResourceType"] == "Custom::MSSQLDatabase":
-        return database.handler(request, context)
-    elif request["ResourceType"] == "Custom::MSSQLUser":
-        return user.handler(request, context)
-    elif request["ResourceType"] == "Custom::MSSQLDatabaseGrant":
-        return grant.handler(request, context)
-
-    return login.handler(request, context)
+    return get_handler(request["ResourceType"])(request, context)
+
+
+def audit(request, context):
+    """
+    reports the drift of a list of resources from the catalog of a server, see mssql_resource_provider.drift.
+    """
+    return importlib.import_module("mssql_resource_provider.drift").audit(
+        request, context
+    )
+
+
+def batch(event, context):
+    """
+    handles the requests in a batch of SQS messages, see mssql_resource_provider.sqs.
+    """
+    return importlib.import_module("mssql_resource_provider.sqs").handler(
+        event, context
+    )
+
+
+# opt-in: open the connections in the Lambda init phase, see mssql_resource_provider.warmup
+if os.getenv("WARMUP_SERVERS"):
+    from mssql_resource_provider import warmup
+
+    warmup.from_environment()
@@ -1,11 +1,23 @@
+import copy
 import logging
-from typing import Optional
+import time
+from typing import Dict, List, NamedTuple, Optional
+from xml.sax.saxutils import escape
 
-import boto3
+import jsonschema
 import pymssql
 from cfn_resource_provider import ResourceProvider
 
-from mssql_resource_provider import connection_info
+from mssql_resource_provider import (
+    cfn_response,
+    connection_info,
+    connection_pool,
+    continuation,
+    hooks,
+    metrics,
+    retry,
+    validation,
+)
 from mssql_resource_provider.connection_info import _get_password_from_dict
 
 log = logging.getLogger()
@@ -39,19 +51,210 @@ request_schema = {
 }
 
 
+def sp_executesql(statement: str, **parameters: str) -> str:
+    """
+    returns a call of sp_executesql which runs `statement` with the `parameters`, a mapping of name
+    to type. The values are passed to cursor.execute as a dict for the %(name)s placeholders, so the
+    statement text is the same for every name and the server reuses its plan.
+    """
+    declarations = ", ".join(f"@{n} {t}" for n, t in parameters.items())
+    values = ", ".join(f"@{n} = %({n})s" for n in parameters)
+    statement = statement.replace("'", "''")
+    return f"EXEC sp_executesql N'{statement}', N'{declarations}', {values}"
+
+
+# the principal is looked up in the database by calling its sp_executesql through @lookup.
+identity_statement = sp_executesql(
+    """
+    SET NOCOUNT ON
+    DECLARE @database_id int, @principal_id int, @sid varbinary(85), @lookup nvarchar(300)
+    SELECT @database_id = database_id FROM sys.databases WHERE name = @database
+    IF @database_id IS NOT NULL AND @username IS NOT NULL
+    BEGIN
+        SET @lookup = QUOTENAME(@database) + N'.sys.sp_executesql'
+        EXEC @lookup
+            N'SELECT @principal_id = principal_id, @sid = sid FROM sys.database_principals WHERE name = @name',
+            N'@name sysname, @principal_id int OUTPUT, @sid varbinary(85) OUTPUT',
+            @name = @username, @principal_id = @principal_id OUTPUT, @sid = @sid OUTPUT
+    END
+    ELSE IF @login_name IS NOT NULL
+        SELECT @principal_id = principal_id, @sid = sid
+        FROM master.sys.server_principals WHERE name = @login_name
+    SELECT @database_id, @principal_id, @sid
+    """,
+    database="sysname",
+    username="sysname",
+    login_name="sysname",
+)
+
+# the usernames are passed as an xml list of <n> elements.
+identities_statement = sp_executesql(
+    """
+    SET NOCOUNT ON
+    DECLARE @database_id int, @lookup nvarchar(300)
+    SELECT @database_id = database_id FROM sys.databases WHERE name = @database
+    IF @database_id IS NULL
+        SELECT n.value('.', 'nvarchar(128)'), NULL, NULL, NULL FROM @names.nodes('/n') AS t(n)
+    ELSE
+    BEGIN
+        SET @lookup = QUOTENAME(@database) + N'.sys.sp_executesql'
+        EXEC @lookup
+            N'SELECT v.name, DB_ID(), p.principal_id, p.sid
+              FROM (SELECT n.value(''.'', ''nvarchar(128)'') AS name FROM @names.nodes(''/n'') AS t(n)) AS v
+              LEFT JOIN sys.database_principals p ON p.name = v.name',
+            N'@names xml',
+            @names = @names
+    END
+    """,
+    database="sysname",
+    names="xml",
+)
+
+
+class CatalogIdentity(NamedTuple):
+    database_id: Optional[int]
+    principal_id: Optional[int]
+    sid: Optional[bytes]
+
+
 class MSSQLResource(ResourceProvider):
     def __init__(self):
         super(MSSQLResource, self).__init__()
-        self.ssm = boto3.client("ssm")
+        self.ssm = connection_info.default_ssm_client
+        self.hooks = hooks.registry
         self.connection = None
         self.connection_info = {}
+        # request scoped snapshot of the catalog: database name -> database_id, and
+        # (database name or None for a login, principal name) -> (principal_id, sid)
+        self._databases = {}
+        self._principals = {}
+        self.metrics = None
+        self.transport = continuation.default_transport
+        self.last_error = None
+        # whether the failed attempt of the request left changes which were not rolled back
+        self.changed = False
+
+    def handle(self, request, context):
+        self.metrics = metrics.start()
+        try:
+            return super(MSSQLResource, self).handle(request, context)
+        finally:
+            self.metrics.emit(
+                {
+                    "ResourceType": request.get("ResourceType", ""),
+                    "RequestType": request.get("RequestType", ""),
+                    "ServerHost": str(self.connection_info.get("host", "")),
+                }
+            )
+
+    def send_response(self):
+        """
+        sends the response to `ResponseURL` over the shared keep-alive session, retrying on failure.
+        """
+        self._truncate_reason()
+        cfn_response.put(
+            self.request["ResponseURL"],
+            self.response,
+            self.context,
+            self.metrics if self.metrics else metrics.current(),
+        )
+
+    def execute(self):
+        """
+        executes the request, and retries it with a jittered backoff after a transient SQL Server error.
+        A request is not retried once it committed changes outside of a transaction, as replaying
+        these statements would fail.
+        """
+        response = copy.deepcopy(self.response)
+        attempt = 0
+        while True:
+            self.last_error = None
+            self.changed = False
+            super(MSSQLResource, self).execute()
+            if self.status == "SUCCESS" or self.asynchronous or self.changed:
+                return
+
+            delay = retry.backoff(
+                self.last_error, attempt, continuation.remaining_time(self.context)
+            )
+            if delay is None:
+                return
+
+            log.warning(
+                "retrying in %.2fs after transient error %s", delay, self.reason
+            )
+            metrics.current().count("Retries")
+            time.sleep(delay)
+            self.response = copy.deepcopy(response)
+            attempt += 1
+
+    def set_request(self, request, context):
+        super(MSSQLResource, self).set_request(request, context)
+        self.connection_info = {}
+        self.forget_identities()
+
+    def is_valid_cfn_request(self):
+        try:
+            validation.validate_best_match(self.request, self.cfn_request_schema)
+            return True
+        except jsonschema.ValidationError as e:
+            self.fail("invalid CloudFormation Request received: %s" % str(e.context))
+            return False
+
+    def is_valid_cfn_response(self):
+        try:
+            validation.validate_best_match(
+                self.response, ResourceProvider.cfn_response_schema
+            )
+            return True
+        except jsonschema.ValidationError as e:
+            log.warning("invalid CloudFormation response created: %s", str(e))
+            return False
+
+    def is_valid_request(self):
+        try:
+            self.convert_property_types()
+            validation.validate(self.properties, self.request_schema)
+            return True
+        except jsonschema.ValidationError as e:
+            message = (
+                e.message.replace(str(e.instance), "<instance>")
+                if isinstance(e.instance, dict)
+                else e.message
+            )
+            self.fail("invalid resource properties: %s" % message)
+            return False
 
     def convert_property_types(self):
         self.heuristic_convert_property_types(self.properties)
+        if self.get("PasswordParameterName"):
+            # the password to set must be current, the server password is refreshed on login failure
+            connection_info.invalidate_ssm_password(self.get("PasswordParameterName"))
+        if self.password_parameter_names:
+            connection_info.get_ssm_passwords(self.ssm, self.password_parameter_names)
         self.connection_info = connection_info.from_url(
             self.server_url, self.server_password
         )
 
+    @property
+    def async_state(self) -> Optional[dict]:
+        """
+        the progress of a long running request, when continued from a previous invocation.
+        """
+        return self.request.get("AsyncState")
+
+    def continue_later(self, state: dict):
+        """
+        hands the request with its progress `state` to the transport, to continue in a new invocation.
+        The response is sent by the invocation which completes the request.
+        """
+        log.info("continuing request %s in a new invocation", self.request_id)
+        try:
+            self.transport.send({**self.request, "AsyncState": state}, self.context)
+            self.asynchronous = True
+        except Exception as e:
+            self.fail("failed to continue the request, %s" % e)
+
     @property
     def deletion_policy(self):
         return self.get("DeletionPolicy")
@@ -68,74 +271,192 @@ class MSSQLResource(ResourceProvider):
     def server_password(self) -> str:
         return _get_password_from_dict(self.get("Server"), self.ssm)
 
+    @property
+    def password_parameter_names(self) -> List[str]:
+        """
+        the names of the parameters holding the server and resource passwords, fetched in one call.
+        """
+        names = [
+            self.get("Server", {}).get("PasswordParameterName"),
+            self.get("PasswordParameterName"),
+        ]
+        return [name for name in names if name]
+
     def connect(self, autocommit: bool = False):
+        with metrics.current().timer("Connect"), self.hooks.timer(
+            "connect",
+            host=self.connection_info.get("host"),
+            database=self.connection_info.get("database"),
+        ):
+            self._connect(autocommit)
+        self.connection = metrics.InstrumentedConnection(
+            self.connection, metrics.current(), self.hooks, autocommit
+        )
+
+    def _connect(self, autocommit: bool):
         try:
-            self.connection = pymssql.connect(**self.connection_info, charset="utf8")
-            self.connection.autocommit(autocommit)
+            self.connection = connection_pool.acquire(self.connection_info, autocommit)
+        except pymssql.Error as e:
+            parameter_name = self.get("Server", {}).get("PasswordParameterName")
+            if not (parameter_name and self.is_login_failure(e)):
+                self.last_error = e
+                raise ValueError("Failed to connect, %s" % e)
+
+            log.info("login failed, refreshing password from %s", parameter_name)
+            connection_info.invalidate_ssm_password(parameter_name)
+            self.connection_info = connection_info.from_url(
+                self.server_url, self.server_password
+            )
+            try:
+                self.connection = connection_pool.acquire(
+                    self.connection_info, autocommit
+                )
+            except Exception as e:
+                self.last_error = e
+                raise ValueError("Failed to connect, %s" % e)
         except Exception as e:
+            self.last_error = e
             raise ValueError("Failed to connect, %s" % e)
 
+    @staticmethod
+    def is_login_failure(error: Exception) -> bool:
+        return retry.error_number(error) == 18456
+
     def close(self):
         if not self.connection:
             return
 
-        if self.status == "SUCCESS":
-            self.connection.commit()
-        else:
-            self.connection.rollback()
-
-        self.connection.close()
-        self.connection = None
+        discard = False
+        self.changed = self.changed or getattr(self.connection, "changed", False)
+        try:
+            if self.status == "SUCCESS":
+                self.connection.commit()
+            else:
+                self.connection.rollback()
+        except pymssql.Error as error:
+            log.warning("failed to end transaction, %s", error)
+            discard = True
+            raise
+        finally:
+            connection_pool.release(
+                self.connection_info, metrics.unwrap(self.connection), discard
+            )
+            self.connection = None
 
     @staticmethod
     def safe(s):
         return s.replace("'", "''")
 
-    def get_database_id(self, name) -> Optional[str]:
+    def lookup_identity(
+        self,
+        database: Optional[str] = None,
+        username: Optional[str] = None,
+        login_name: Optional[str] = None,
+    ) -> CatalogIdentity:
+        """
+        returns the database_id of `database` and the principal_id and sid of either the user `username`
+        in `database` or the server login `login_name`, in a single round trip. The rows are kept in
+        the catalog snapshot until the end of the request, or until they are forgotten after DDL.
+        """
+        if username:
+            principal = (database, username)
+        elif login_name:
+            principal = (None, login_name)
+        else:
+            principal = None
+        if (not database or database in self._databases) and (
+            not principal or principal in self._principals
+        ):
+            return self._identity(database, principal)
 
         try:
-            with self.connection.cursor() as cursor:
+            with self.connection.cursor(read_only=True) as cursor:
                 cursor.execute(
-                    f"""
-                    SELECT schema_id FROM sys.databases 
-                    WHERE name = '{MSSQLResource.safe(name)}'
-                    """
+                    identity_statement,
+                    {
+                        "database": database,
+                        "username": username if database else None,
+                        "login_name": None if database and username else login_name,
+                    },
                 )
-                rows = cursor.fetchone()
+                row = cursor.fetchone()
         except pymssql.OperationalError:
-            rows = None
+            row = None
 
-        return rows[0] if rows else None
+        database_id, principal_id, sid = row if row else (None, None, None)
+        if database:
+            self._databases[database] = database_id
+        if principal:
+            self._principals[principal] = (principal_id, sid)
+        return self._identity(database, principal)
 
-    def get_database_id(self, database: str) -> Optional[str]:
-        try:
-            with self.connection.cursor() as cursor:
-                cursor.execute(
-                    f"""
-                    SELECT database_id FROM master.sys.databases
-                    WHERE name = '{MSSQLResource.safe(database)}'
-                    """
-                )
-                rows = cursor.fetchone()
-        except pymssql.OperationalError:
-            rows = None
+    def _identity(self, database: Optional[str], principal: Optional[tuple]):
+        principal_id, sid = self._principals.get(principal, (None, None))
+        return CatalogIdentity(self._databases.get(database), principal_id, sid)
 
-        return rows[0] if rows else None
+    def lookup_identities(
+        self, database: str, usernames: List[str]
+    ) -> Dict[str, CatalogIdentity]:
+        """
+        returns the identity of each of the `usernames` in `database` in a single round trip, and
+        keeps them in the catalog snapshot for `lookup_identity`.
+        """
+        missing = [u for u in usernames if (database, u) not in self._principals]
+        if missing:
+            names = "".join(f"<n>{escape(u)}</n>" for u in missing)
+            try:
+                with self.connection.cursor(read_only=True) as cursor:
+                    cursor.execute(
+                        identities_statement, {"database": database, "names": names}
+                    )
+                    rows = cursor.fetchall()
+            except pymssql.OperationalError:
+                rows = []
 
-    def get_user_id(self, database: str, username: str) -> Optional[str]:
-        try:
-            with self.connection.cursor() as cursor:
-                cursor.execute(
-                    f"""
-                    SELECT principal_id FROM [{database}].sys.database_principals
-                    WHERE name = '{MSSQLResource.safe(username)}'
-                    """
-                )
-                rows = cursor.fetchone()
-        except pymssql.OperationalError:
-            rows = None
+            for name, database_id, principal_id, sid in rows:
+                self._databases[database] = database_id
+                self._principals[(database, name)] = (principal_id, sid)
+            for username in missing:
+                self._principals.setdefault((database, username), (None, None))
+
+        return {u: self._identity(database, (database, u)) for u in usernames}
+
+    def remember_principal(
+        self, database: Optional[str], name: str, principal_id: int, sid: bytes
+    ):
+        """
+        adds a principal read by the provider to the catalog snapshot.
+        """
+        self._principals[(database, name)] = (principal_id, sid)
+
+    def forget_database(self, name: str):
+        """
+        removes the database and its users from the catalog snapshot, after DDL which creates, renames
+        or drops the database.
+        """
+        self._databases.pop(name, None)
+        for key in [k for k in self._principals if k[0] == name]:
+            del self._principals[key]
+
+    def forget_principal(self, database: Optional[str], name: str):
+        """
+        removes the user `name` in `database`, or the login `name` if `database` is None, from the
+        catalog snapshot after DDL which creates, renames or drops it.
+        """
+        self._principals.pop((database, name), None)
+
+    def forget_identities(self):
+        """
+        discards the catalog snapshot.
+        """
+        self._databases = {}
+        self._principals = {}
 
-        return rows[0] if rows else None
+    def get_database_id(self, database: str) -> Optional[str]:
+        return self.lookup_identity(database).database_id
+
+    def get_user_id(self, database: str, username: str) -> Optional[str]:
+        return self.lookup_identity(database, username).principal_id
 
     @staticmethod
     def get_exception_message(error: pymssql.Error) -> str:
@@ -155,4 +476,5 @@ class MSSQLResource(ResourceProvider):
             return str(error)
 
     def report_failure(self, error: pymssql.Error):
+        self.last_error = error
         self.fail(self.get_exception_message(error)[0:200])
@@ -0,0 +1,373 @@
+import logging
+from typing import Dict, List
+
+import pymssql
+
+from mssql_resource_provider import connection_info, database, grant, login, user
+from mssql_resource_provider.base import MSSQLResource
+from mssql_resource_provider.connection_info import _get_password_from_dict
+
+log = logging.getLogger()
+
+request_schema = {
+    "$schema": "http://json-schema.org/draft-04/schema#",
+    "type": "object",
+    "required": ["Server", "Name"],
+    "properties": {
+        "Server": connection_info.request_schema,
+        "Name": database.request_schema["properties"]["Name"],
+        "ForceDisconnect": {
+            "type": "boolean",
+            "default": False,
+            "description": "on delete, disconnect all sessions using the database or the logins",
+        },
+        "Logins": {
+            "type": "array",
+            "default": [],
+            "items": {
+                "type": "object",
+                "oneOf": [
+                    {"required": ["LoginName", "Password"]},
+                    {"required": ["LoginName", "PasswordParameterName"]},
+                ],
+                "properties": {
+                    "LoginName": login.request_schema["properties"]["LoginName"],
+                    "DefaultDatabase": {
+                        "type": "string",
+                        "pattern": r"^[^\[\]]*$",
+                        "description": "the default database of the login, defaults to the bundle database",
+                    },
+                    "Password": login.request_schema["properties"]["Password"],
+                    "PasswordParameterName": login.request_schema["properties"][
+                        "PasswordParameterName"
+                    ],
+                    "PasswordHash": login.request_schema["properties"]["PasswordHash"],
+                },
+            },
+        },
+        "Users": {
+            "type": "array",
+            "default": [],
+            "items": {
+                "type": "object",
+                "required": ["UserName", "LoginName"],
+                "properties": {
+                    "UserName": user.request_schema["properties"]["UserName"],
+                    "LoginName": user.request_schema["properties"]["LoginName"],
+                    "DefaultSchema": user.request_schema["properties"]["DefaultSchema"],
+                },
+            },
+        },
+        "Grants": {
+            "type": "array",
+            "default": [],
+            "items": {
+                "type": "object",
+                "required": ["Permissions", "UserNames"],
+                "properties": {
+                    "Permissions": grant.request_schema["properties"]["Permissions"],
+                    "UserNames": grant.request_schema["properties"]["UserNames"],
+                },
+            },
+        },
+    },
+}
+
+
+def _by_name(items: List[dict], key: str) -> Dict[str, dict]:
+    return {item[key]: item for item in items}
+
+
+def _users(items: List[dict]) -> Dict[str, dict]:
+    return {
+        u["UserName"]: {**u, "DefaultSchema": u.get("DefaultSchema", "dbo")}
+        for u in items
+    }
+
+
+def _grants(properties: dict) -> Dict[str, set]:
+    result = {}
+    for g in properties.get("Grants", []):
+        for username in g["UserNames"]:
+            result.setdefault(username, set()).update(
+                " ".join(p.upper().split()) for p in g["Permissions"]
+            )
+    return result
+
+
+class MSSQLDatabaseBundle(MSSQLResource):
+    """
+    creates a database with its logins, users and grants in a single request, over a single connection.
+    """
+
+    def __init__(self):
+        super(MSSQLDatabaseBundle, self).__init__()
+        self.request_schema = request_schema
+
+    @property
+    def name(self) -> str:
+        return self.get("Name")
+
+    @property
+    def old_name(self) -> str:
+        return self.get_old("Name", self.name)
+
+    @property
+    def logins(self) -> Dict[str, dict]:
+        return _by_name(self.get("Logins", []), "LoginName")
+
+    @property
+    def old_logins(self) -> Dict[str, dict]:
+        return _by_name(self.get_old("Logins", []), "LoginName")
+
+    @property
+    def users(self) -> Dict[str, dict]:
+        return _users(self.get("Users", []))
+
+    @property
+    def old_users(self) -> Dict[str, dict]:
+        return _users(self.get_old("Users", []))
+
+    @property
+    def password_parameter_names(self) -> List[str]:
+        names = super(MSSQLDatabaseBundle, self).password_parameter_names
+        names.extend(
+            l["PasswordParameterName"]
+            for l in self.logins.values()
+            if l.get("PasswordParameterName")
+        )
+        return names
+
+    def convert_property_types(self):
+        # the passwords to set on the logins must be current, as for the login resource
+        for properties in self.logins.values():
+            if properties.get("PasswordParameterName"):
+                connection_info.invalidate_ssm_password(
+                    properties["PasswordParameterName"]
+                )
+        super(MSSQLDatabaseBundle, self).convert_property_types()
+
+    @property
+    def url(self):
+        return "mssql:%s:bundle:%s" % (
+            self.logical_resource_id,
+            self.get_database_id(self.name),
+        )
+
+    def password(self, properties: dict) -> str:
+        return _get_password_from_dict(properties, self.ssm)
+
+    def create_login_statement(self, properties: dict) -> str:
+        return login.create_login_statement(
+            properties["LoginName"],
+            self.password(properties),
+            properties.get("DefaultDatabase", self.name),
+        )
+
+    def alter_login_statement(self, properties: dict) -> str:
+        return login.alter_login_statement(
+            properties["LoginName"],
+            self.password(properties),
+            properties.get("DefaultDatabase", self.name),
+        )
+
+    @staticmethod
+    def create_user_statement(properties: dict) -> str:
+        return user.create_user_statement(
+            properties["UserName"],
+            properties["LoginName"],
+            properties["DefaultSchema"],
+        )
+
+    @staticmethod
+    def alter_user_statement(properties: dict) -> str:
+        return user.alter_user_statement(
+            properties["UserName"],
+            properties["LoginName"],
+            properties["DefaultSchema"],
+        )
+
+    def execute_batch(self, statements: List[str]):
+        if not statements:
+            return
+        with self.connection.cursor() as cursor:
+            cursor.execute(";\n".join(statements))
+
+    def use_database(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"USE [{self.name}]")
+
+    def use_server_database(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"USE [{self.connection_info['database']}]")
+
+    def forget_catalog(self, databases: List[str], logins: List[str]):
+        for name in databases:
+            self.forget_database(name)
+        for name in logins:
+            self.forget_principal(None, name)
+
+    def create(self):
+        created, created_logins = False, []
+        try:
+            self.connect(autocommit=True)
+            log.info("create database bundle %s", self.name)
+            self.execute_batch([database.create_database_statement(self.name)])
+            created = True
+            self.forget_database(self.name)
+            self.physical_resource_id = self.url
+            # a statement per login, so a failed create drops only the logins it created
+            for name, properties in self.logins.items():
+                self.execute_batch([self.create_login_statement(properties)])
+                created_logins.append(name)
+            self.use_database()
+            self.execute_batch(
+                [self.create_user_statement(u) for u in self.users.values()]
+                + grant.grant_statements(
+                    self.name,
+                    {u: sorted(p) for u, p in _grants(self.properties).items()},
+                )
+            )
+            self.use_server_database()
+            self.forget_catalog([self.name], self.logins)
+            self.set_attribute("Name", self.name)
+        except pymssql.Error as error:
+            self.report_failure(error)
+            if not created or self.drop_created(created_logins):
+                self.physical_resource_id = "could-not-create"
+        finally:
+            self.close()
+
+    def drop_created(self, logins: List[str]) -> bool:
+        """
+        drops the database and the `logins` of a create which failed after CREATE DATABASE. Returns
+        False if they could not be dropped, in which case the physical resource id refers to the
+        database so a delete will.
+        """
+        try:
+            self.use_server_database()
+            self.execute_batch(
+                [login.drop_login_statement(n) for n in logins]
+                + [database.drop_database_statement(self.name)]
+            )
+            self.forget_catalog([self.name], logins)
+            # nothing of the failed create is left, so it may be retried
+            self.connection.changed = False
+            return True
+        except pymssql.Error as error:
+            log.warning(
+                "failed to drop database bundle %s of a failed create, %s",
+                self.name,
+                error,
+            )
+            return False
+
+    def update(self):
+        """
+        applies the minimal set of statements to get from the old to the new properties. logins and
+        users are matched by name: a renamed login or user is dropped and created again. logins
+        without an explicit DefaultDatabase are altered when the database is renamed.
+        """
+        old_logins, new_logins = self.old_logins, self.logins
+        old_users, new_users = self.old_users, self.users
+        grants, revokes = grant.grant_delta(
+            _grants(self.old_properties), _grants(self.properties)
+        )
+        renamed = self.name != self.old_name
+
+        try:
+            self.connect(autocommit=True)
+            log.info("update database bundle %s", self.name)
+            if renamed:
+                with self.connection.cursor() as cursor:
+                    cursor.callproc(
+                        "rdsadmin.dbo.rds_modify_db_name", (self.old_name, self.name)
+                    )
+
+            self.use_database()
+            self.execute_batch(
+                grant.revoke_statements(self.name, revokes)
+                + [user.drop_user_statement(n) for n in old_users if n not in new_users]
+            )
+            self.use_server_database()
+            self.execute_batch(
+                [
+                    login.drop_login_statement(n)
+                    for n in old_logins
+                    if n not in new_logins
+                ]
+                + [
+                    self.create_login_statement(l)
+                    for n, l in new_logins.items()
+                    if n not in old_logins
+                ]
+                + [
+                    self.alter_login_statement(l)
+                    for n, l in new_logins.items()
+                    if n in old_logins
+                    and (l != old_logins[n] or (renamed and "DefaultDatabase" not in l))
+                ]
+            )
+            self.use_database()
+            self.execute_batch(
+                [
+                    self.create_user_statement(u)
+                    for n, u in new_users.items()
+                    if n not in old_users
+                ]
+                + [
+                    self.alter_user_statement(u)
+                    for n, u in new_users.items()
+                    if n in old_users and u != old_users[n]
+                ]
+                + grant.grant_statements(self.name, grants)
+            )
+            self.use_server_database()
+            self.forget_catalog([self.old_name, self.name], [*old_logins, *new_logins])
+            self.physical_resource_id = self.url
+            self.set_attribute("Name", self.name)
+        except pymssql.Error as error:
+            self.report_failure(error)
+        finally:
+            self.close()
+
+    def delete(self):
+        if self.physical_resource_id == "could-not-create":
+            self.success("database bundle was never created")
+            return
+
+        try:
+            self.connect(autocommit=True)
+            log.info("delete database bundle %s", self.name)
+            if self.get("ForceDisconnect"):
+                self.execute_batch(
+                    [database.drop_database_statement(self.name, True)]
+                    + (
+                        [login.force_drop_logins_statement(list(self.logins))]
+                        if self.logins
+                        else []
+                    )
+                )
+            else:
+                self.execute_batch(
+                    [database.drop_database_statement(self.name)]
+                    + [
+                        f"IF SUSER_ID(N'{MSSQLResource.safe(n)}') IS NOT NULL {login.drop_login_statement(n)}"
+                        for n in self.logins
+                    ]
+                )
+            self.forget_catalog([self.name], self.logins)
+        except pymssql.Error as error:
+            self.report_failure(error)
+        finally:
+            self.close()
+
+
+provider = None
+
+
+def handler(request, context):
+    global provider
+    if provider is None:
+        provider = MSSQLDatabaseBundle()
+    return provider.handle(request, context)
@@ -0,0 +1,93 @@
+"""
+puts the responses to CloudFormation over a keep-alive HTTP session shared by all requests in the
+process, so a warm invocation reuses the TLS connection to the pre-signed ResponseURL. A failed PUT
+is retried with a jittered backoff until the invocation is about to time out, as CloudFormation
+otherwise waits an hour for the response.
+"""
+
+import logging
+import random
+import threading
+import time
+from typing import Optional
+
+import requests
+
+from mssql_resource_provider import continuation, metrics
+
+log = logging.getLogger()
+
+# seconds to connect and to wait for the reply of a single PUT
+connect_timeout = 3.05
+read_timeout = 10.0
+
+# seconds of the first backoff, doubled on every attempt up to max_delay
+base_delay = 0.25
+max_delay = 4.0
+
+# attempts when the remaining time of the invocation is unknown
+max_attempts = 5
+
+# the status codes of a PUT which is likely to succeed on retry
+retry_status_codes = {408, 429, 500, 502, 503, 504}
+
+_lock = threading.Lock()
+_session: Optional[requests.Session] = None
+
+
+def session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = requests.Session()
+    return _session
+
+
+def backoff(attempt: int, remaining_time: Optional[float]) -> Optional[float]:
+    """
+    returns the seconds to wait before another attempt to put the response, or None if there is no
+    time left in the invocation for another attempt.
+    """
+    delay = random.uniform(0, min(max_delay, base_delay * 2**attempt))
+    if remaining_time is None:
+        return delay if attempt + 1 < max_attempts else None
+    if remaining_time - delay < connect_timeout + read_timeout:
+        return None
+    return delay
+
+
+def put(url: str, response: dict, context, request_metrics: metrics.RequestMetrics):
+    """
+    puts the `response` to `url`, and raises an exception if it did not succeed before the deadline.
+    """
+    attempt = 0
+    while True:
+        retryable = True
+        try:
+            with request_metrics.timer("ResponsePut"):
+                r = session().put(
+                    url,
+                    json=response,
+                    headers={"content-type": ""},
+                    timeout=(connect_timeout, read_timeout),
+                )
+            if r.status_code == 200:
+                return
+            error = "status code %d, %s" % (r.status_code, r.text)
+            retryable = r.status_code in retry_status_codes
+        except requests.RequestException as e:
+            error = str(e)
+
+        delay = (
+            backoff(attempt, continuation.remaining_time(context))
+            if retryable
+            else None
+        )
+        if delay is None:
+            raise Exception("failed to put the response to %s, %s" % (url, error))
+
+        log.warning("retrying the response in %.2fs after %s", delay, error)
+        request_metrics.count("ResponseRetries")
+        time.sleep(delay)
+        attempt += 1
@@ -1,6 +1,23 @@
+import logging
+import random
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, List
 from urllib.parse import urlparse, ParseResult, unquote, parse_qs
 
-from botocore.exceptions import ClientError
+from mssql_resource_provider import hooks, metrics
+
+log = logging.getLogger()
+
+# decrypted parameter values are cached for at most `ssm_cache_ttl` seconds, and
+# at most `ssm_cache_size` of them are kept.
+ssm_cache_ttl = 300.0
+ssm_cache_size = 128
+ssm_max_attempts = 5
+
+_ssm_cache_lock = Lock()
+_ssm_cache: "OrderedDict[str, tuple]" = OrderedDict()
 
 request_schema = {
     "$schema": "http://json-schema.org/draft-04/schema#",
@@ -24,6 +41,11 @@ request_schema = {
 }
 
 
+# the options in the query string of the url which are integers. lock_timeout is not a pymssql
+# option, but is set on the session after connect.
+integer_options = ["login_timeout", "timeout", "lock_timeout"]
+
+
 def from_url(jdbc_url: str, password=None) -> dict:
     """
     create pymssql connection information from `jdbc_url`. if no password was specified and
@@ -49,8 +71,17 @@ def from_url(jdbc_url: str, password=None) -> dict:
     ...
     ValueError: unsupport scheme in url
     >>> from_url("mssql://mssql", "MyPassWord") # default user, port and database
-    {'host': 'mssql', 'port': 1433, 'user': 'sa', 'database': 'master', 'password': 'MyPassWord'}pyth
-
+    {'host': 'mssql', 'port': 1433, 'user': 'sa', 'database': 'master', 'password': 'MyPassWord'}
+    >>> from_url("mssql://mssql?login_timeout=5&timeout=20") # login and query timeout in seconds
+    {'host': 'mssql', 'port': 1433, 'user': 'sa', 'database': 'master', 'login_timeout': 5, 'timeout': 20}
+    >>> from_url("mssql://mssql?tds_version=7.4&appname=cfn-mssql") # protocol version and application name
+    {'host': 'mssql', 'port': 1433, 'user': 'sa', 'database': 'master', 'tds_version': '7.4', 'appname': 'cfn-mssql'}
+    >>> from_url("mssql://mssql?lock_timeout=5000") # SET LOCK_TIMEOUT in milliseconds after connect
+    {'host': 'mssql', 'port': 1433, 'user': 'sa', 'database': 'master', 'lock_timeout': 5000}
+    >>> from_url("mssql://mssql?timeout=soon") # invalid timeout
+    Traceback (most recent call last):
+    ...
+    ValueError: timeout in url must be an integer
     """
     url: ParseResult = urlparse(jdbc_url)
     query = parse_qs(url.query) if url.query else {}
@@ -70,25 +101,149 @@ def from_url(jdbc_url: str, password=None) -> dict:
     elif password:
         connect_info["password"] = password
 
-    if "charset" in query:
-        connect_info["charset"] = query["charset"][0]
+    for name in ["charset", "tds_version", "appname"]:
+        if name in query:
+            connect_info[name] = query[name][0]
+
+    for name in integer_options:
+        if name in query:
+            try:
+                connect_info[name] = int(query[name][0])
+            except ValueError:
+                raise ValueError(f"{name} in url must be an integer")
 
     return connect_info
 
 
+class _LazySSMClient:
+    """
+    creates the boto3 ssm client on first use, so botocore is only loaded when a
+    PasswordParameterName is actually used.
+    """
+
+    def __init__(self):
+        self._client = None
+        self._lock = Lock()
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import boto3
+
+                    self._client = boto3.client("ssm")
+        return getattr(self._client, name)
+
+
+default_ssm_client = _LazySSMClient()
+
+
+def _cached_ssm_password(name: str):
+    with _ssm_cache_lock:
+        entry = _ssm_cache.get(name)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del _ssm_cache[name]
+            return None
+        _ssm_cache.move_to_end(name)
+        return value
+
+
+def _cache_ssm_password(name: str, value: str):
+    with _ssm_cache_lock:
+        _ssm_cache[name] = (value, time.monotonic() + ssm_cache_ttl)
+        _ssm_cache.move_to_end(name)
+        while len(_ssm_cache) > ssm_cache_size:
+            _ssm_cache.popitem(last=False)
+
+
+def invalidate_ssm_password(name: str):
+    """
+    removes `name` from the parameter cache, so that the next access fetches it again.
+    """
+    with _ssm_cache_lock:
+        _ssm_cache.pop(name, None)
+
+
+def clear_ssm_cache():
+    with _ssm_cache_lock:
+        _ssm_cache.clear()
+
+
+def _get_parameters(ssm, names: List[str]) -> dict:
+    from botocore.exceptions import ClientError
+
+    for attempt in range(ssm_max_attempts):
+        try:
+            with metrics.current().timer("SSMFetch"), hooks.registry.timer(
+                "ssm_fetch", names=names
+            ):
+                return ssm.get_parameters(Names=names, WithDecryption=True)
+        except ClientError as e:
+            code = e.response.get("Error", {}).get("Code")
+            if code != "ThrottlingException" or attempt == ssm_max_attempts - 1:
+                raise
+            delay = random.uniform(0, 0.1 * 2**attempt)
+            log.info("ssm throttled, retrying in %.2fs", delay)
+            time.sleep(delay)
+
+
+def get_ssm_passwords(ssm, names: List[str]) -> Dict[str, str]:
+    """
+    returns the decrypted values of the parameters `names`, fetching the ones
+    not in the cache with a single GetParameters call.
+    """
+    result = {}
+    missing = []
+    for name in dict.fromkeys(names):
+        value = _cached_ssm_password(name)
+        if value is None:
+            missing.append(name)
+        else:
+            result[name] = value
+
+    from botocore.exceptions import ClientError
+
+    for i in range(0, len(missing), 10):
+        batch = missing[i : i + 10]
+        try:
+            response = _get_parameters(ssm, batch)
+        except ClientError as e:
+            raise ValueError(
+                "Could not obtain password using name {}, {}".format(
+                    ", ".join(batch), e
+                )
+            )
+        if response.get("InvalidParameters"):
+            raise ValueError(
+                "Could not obtain password using name {}, parameter not found".format(
+                    ", ".join(response["InvalidParameters"])
+                )
+            )
+        for parameter in response["Parameters"]:
+            _cache_ssm_password(parameter["Name"], parameter["Value"])
+            result[parameter["Name"]] = parameter["Value"]
+
+    not_found = [name for name in names if name not in result]
+    if not_found:
+        raise ValueError(
+            "Could not obtain password using name {}, parameter not found".format(
+                ", ".join(not_found)
+            )
+        )
+    return result
+
+
 def get_ssm_password(ssm, name) -> str:
-    try:
-        response = ssm.get_parameter(Name=name, WithDecryption=True)
-        return response["Parameter"]["Value"]
-    except ClientError as e:
-        raise ValueError("Could not obtain password using name {}, {}".format(name, e))
+    return get_ssm_passwords(ssm, [name])[name]
 
 
 def _get_password_from_dict(properties: dict, ssm) -> str:
     if "Password" in properties:
         return properties.get("Password")
     else:
-        response = ssm.get_parameter(
-            Name=properties.get("PasswordParameterName"), WithDecryption=True
-        )
-        return response["Parameter"]["Value"]
+        return get_ssm_password(ssm, properties.get("PasswordParameterName"))
@@ -0,0 +1,152 @@
+import logging
+import time
+from threading import Lock
+from typing import Optional
+
+import pymssql
+
+log = logging.getLogger()
+
+# maximum number of seconds a session may be idle in the pool before it is closed instead of reused.
+# kept below the idle timeout of NAT gateways (350s) so a frozen Lambda does not pick up a dead socket.
+max_idle_time = 240.0
+
+# maximum number of idle sessions kept per connection_info.
+max_idle_per_key = 4
+
+_lock = Lock()
+_idle = {}
+stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def _key(connection_info: dict) -> tuple:
+    return tuple(sorted(connection_info.items()))
+
+
+def _describe(connection_info: dict) -> str:
+    return "{}@{}:{}/{}".format(
+        connection_info.get("user"),
+        connection_info.get("host"),
+        connection_info.get("port"),
+        connection_info.get("database"),
+    )
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except Exception as e:
+        log.debug("ignoring error on close of pooled connection, %s", e)
+
+
+def _evict(connection_info: dict, connection, reason: str):
+    stats["evictions"] += 1
+    log.info("evicting connection %s from pool, %s", _describe(connection_info), reason)
+    _close_quietly(connection)
+
+
+def _reset(connection, database: str, autocommit: bool):
+    """
+    rolls back any open transaction, restores the autocommit mode and database, and pings the server.
+    """
+    connection.rollback()
+    connection.autocommit(autocommit)
+    with connection.cursor() as cursor:
+        cursor.execute("USE [{}]; SELECT 1".format(database.replace("]", "]]")))
+        cursor.fetchall()
+
+
+def _park(connection):
+    """
+    moves an idle session to master, so it does not keep its database in use for a DROP DATABASE
+    or a rename. The database of the request is restored by `_reset` on acquire.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("USE [master]")
+
+
+def _take_idle(connection_info: dict, autocommit: bool):
+    key = _key(connection_info)
+    while True:
+        with _lock:
+            sessions = _idle.get(key)
+            if not sessions:
+                return None
+            connection, released_at = sessions.pop()
+
+        idle_time = time.monotonic() - released_at
+        if idle_time > max_idle_time:
+            _evict(connection_info, connection, f"idle for {idle_time:.0f}s")
+            continue
+
+        try:
+            _reset(connection, connection_info.get("database", "master"), autocommit)
+            return connection
+        except Exception as e:
+            _evict(connection_info, connection, f"health check failed, {e}")
+
+
+def acquire(
+    connection_info: dict, autocommit: bool = False, login_timeout: Optional[int] = None
+):
+    """
+    returns a healthy pooled connection for `connection_info`, or a new one if none is available.
+    A new connection waits `login_timeout` seconds for the server, unless `connection_info` sets it.
+    The connection is pooled under `connection_info` either way.
+    """
+    connection = _take_idle(connection_info, autocommit)
+    if connection:
+        stats["hits"] += 1
+        log.info("connection pool hit for %s", _describe(connection_info))
+        return connection
+
+    stats["misses"] += 1
+    log.info("connection pool miss for %s", _describe(connection_info))
+    options = {"charset": "utf8", **connection_info}
+    if login_timeout is not None:
+        options.setdefault("login_timeout", login_timeout)
+    lock_timeout = options.pop("lock_timeout", None)
+    connection = pymssql.connect(**options)
+    if lock_timeout is not None:
+        # session state, which is kept while the connection is pooled under the same key
+        with connection.cursor() as cursor:
+            cursor.execute(f"SET LOCK_TIMEOUT {int(lock_timeout)}")
+    connection.autocommit(autocommit)
+    return connection
+
+
+def release(connection_info: dict, connection, discard: bool = False):
+    """
+    returns `connection` to the pool, or closes it when `discard` is set or the pool is full.
+    """
+    if discard:
+        _evict(connection_info, connection, "discarded after failure")
+        return
+
+    if connection_info.get("database", "master").lower() != "master":
+        try:
+            _park(connection)
+        except Exception as e:
+            _evict(connection_info, connection, f"failed to switch to master, {e}")
+            return
+
+    key = _key(connection_info)
+    with _lock:
+        sessions = _idle.setdefault(key, [])
+        if len(sessions) < max_idle_per_key:
+            sessions.append((connection, time.monotonic()))
+            return
+
+    _close_quietly(connection)
+
+
+def clear():
+    """
+    closes all idle connections in the pool.
+    """
+    with _lock:
+        sessions = [c for s in _idle.values() for c, _ in s]
+        _idle.clear()
+
+    for connection in sessions:
+        _close_quietly(connection)
@@ -0,0 +1,81 @@
+"""
+continues a long running request in a later invocation. The provider stores its progress in the
+request under `AsyncState`, and hands the request to a transport which delivers it back to the
+handler. The response to CloudFormation is only sent by the invocation which completes the request.
+"""
+
+import json
+import logging
+import time
+from typing import Optional
+
+log = logging.getLogger()
+
+# seconds between two polls of the state of the operation
+poll_interval = 5.0
+
+# seconds of execution time to keep in reserve, before continuing in a new invocation
+margin = 5.0
+
+# seconds after which the operation is considered failed. CloudFormation waits for one hour.
+max_duration = 3300.0
+
+
+class LambdaTransport:
+    """
+    continues the request by asynchronously invoking the lambda function itself.
+    """
+
+    def __init__(self):
+        self._client = None
+
+    def send(self, request: dict, context):
+        if self._client is None:
+            import boto3
+
+            self._client = boto3.client("lambda")
+        self._client.invoke(
+            FunctionName=context.invoked_function_arn,
+            InvocationType="Event",
+            Payload=json.dumps(request).encode("utf8"),
+        )
+
+
+class LocalTransport:
+    """
+    collects the continued requests in memory, to be handled by `run`. For testing without AWS.
+    """
+
+    def __init__(self):
+        self.requests = []
+
+    def send(self, request: dict, context):
+        self.requests.append((request, context))
+
+    def run(self, handler):
+        while self.requests:
+            request, context = self.requests.pop(0)
+            handler(request, context)
+
+
+default_transport = LambdaTransport()
+
+
+def remaining_time(context) -> Optional[float]:
+    """
+    returns the seconds left in the current invocation, or None if unknown.
+    """
+    get_remaining_time = getattr(context, "get_remaining_time_in_millis", None)
+    return get_remaining_time() / 1000.0 if get_remaining_time else None
+
+
+def must_continue_later(context) -> bool:
+    """
+    returns True if there is no time left in the current invocation to poll once more.
+    """
+    remaining = remaining_time(context)
+    return remaining is not None and remaining < margin + poll_interval
+
+
+def expired(started: float) -> bool:
+    return time.time() - started > max_duration
@@ -1,12 +1,35 @@
 import logging
+import re
+import time
+from typing import List, NamedTuple, Optional, Tuple
 
 import pymssql
 
-from mssql_resource_provider import connection_info
-from mssql_resource_provider.base import MSSQLResource
+from mssql_resource_provider import connection_info, continuation
+from mssql_resource_provider.base import MSSQLResource, sp_executesql
 
 log = logging.getLogger()
 
+size_schema = {
+    "type": "string",
+    "pattern": r"^[0-9]+ ?(KB|MB|GB|TB)$",
+    "description": "the initial size of the file, eg 512MB",
+}
+
+file_properties = {
+    "Size": size_schema,
+    "FileGrowth": {
+        "type": "string",
+        "pattern": r"^[0-9]+ ?(KB|MB|GB|TB|%)$",
+        "description": "the automatic growth increment of the file, eg 64MB or 10%",
+    },
+    "MaxSize": {
+        "type": "string",
+        "pattern": r"^([0-9]+ ?(KB|MB|GB|TB)|UNLIMITED)$",
+        "description": "the maximum size of the file, eg 10GB or UNLIMITED",
+    },
+}
+
 request_schema = {
     "$schema": "http://json-schema.org/draft-04/schema#",
     "type": "object",
@@ -19,10 +42,284 @@ request_schema = {
             "pattern": r"^[^\[\]]*$",
             "description": "the database name to create",
         },
+        "DataFile": {
+            "type": "object",
+            "additionalProperties": False,
+            "properties": file_properties,
+            "description": "the size of the primary data file",
+        },
+        "LogFile": {
+            "type": "object",
+            "additionalProperties": False,
+            "properties": file_properties,
+            "description": "the size of the log file",
+        },
+        "RecoveryModel": {
+            "type": "string",
+            "enum": ["FULL", "BULK_LOGGED", "SIMPLE"],
+            "description": "the recovery model of the database",
+        },
+        "FileGroups": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["Name"],
+                "additionalProperties": False,
+                "properties": {
+                    "Name": {
+                        "type": "string",
+                        "maxLength": 128,
+                        "pattern": r"^[^\[\]]*$",
+                        "description": "the name of the filegroup",
+                    },
+                    "MemoryOptimized": {
+                        "type": "boolean",
+                        "default": False,
+                        "description": "the filegroup contains MEMORY_OPTIMIZED_DATA",
+                    },
+                    **file_properties,
+                },
+            },
+            "description": "the additional filegroups, each with a single file",
+        },
+        "ForceDisconnect": {
+            "type": "boolean",
+            "default": False,
+            "description": "on delete, roll back and disconnect all sessions using the database",
+        },
+        "Asynchronous": {
+            "type": "boolean",
+            "default": False,
+            "description": "create or rename the database in a SQL Server Agent job, and wait for it across invocations",
+        },
     },
 }
 
 
+def create_database_statement(name: str) -> str:
+    return f"CREATE DATABASE [{name}]"
+
+
+def drop_database_statement(name: str, force_disconnect: bool = False) -> str:
+    if force_disconnect:
+        return f"""
+            IF DB_ID(N'{MSSQLResource.safe(name)}') IS NOT NULL
+                ALTER DATABASE [{name}] SET SINGLE_USER WITH ROLLBACK IMMEDIATE;
+            DROP DATABASE IF EXISTS [{name}]
+            """
+    return f"DROP DATABASE IF EXISTS [{name}]"
+
+
+def rename_database_statement(old_name: str, new_name: str) -> str:
+    return f"EXEC rdsadmin.dbo.rds_modify_db_name N'{MSSQLResource.safe(old_name)}', N'{MSSQLResource.safe(new_name)}'"
+
+
+def start_job_statement(job_name: str, command: str) -> str:
+    """
+    returns the batch which runs `command` in a SQL Server Agent job, without waiting for it to
+    complete. The job deletes itself when it succeeds.
+    """
+    job_name = MSSQLResource.safe(job_name)
+    return f"""
+        EXEC msdb.dbo.sp_add_job @job_name = N'{job_name}', @delete_level = 1;
+        EXEC msdb.dbo.sp_add_jobstep @job_name = N'{job_name}', @step_name = N'execute',
+             @subsystem = N'TSQL', @database_name = N'master',
+             @command = N'{MSSQLResource.safe(command)}';
+        EXEC msdb.dbo.sp_add_jobserver @job_name = N'{job_name}';
+        EXEC msdb.dbo.sp_start_job @job_name = N'{job_name}'
+        """
+
+
+# queries the state of database @name and the error message of the job @job_name, if it failed.
+database_state_statement = sp_executesql(
+    """
+    SELECT (SELECT state_desc FROM sys.databases WHERE name = @name),
+           (SELECT TOP 1 h.message
+            FROM msdb.dbo.sysjobhistory h JOIN msdb.dbo.sysjobs j ON h.job_id = j.job_id
+            WHERE j.name = @job_name AND h.step_id = 1 AND h.run_status = 0
+            ORDER BY h.instance_id DESC)
+    """,
+    name="sysname",
+    job_name="sysname",
+)
+
+
+def delete_job_statement(job_name: str) -> str:
+    job_name = MSSQLResource.safe(job_name)
+    return f"""
+        IF EXISTS (SELECT * FROM msdb.dbo.sysjobs WHERE name = N'{job_name}')
+            EXEC msdb.dbo.sp_delete_job @job_name = N'{job_name}'
+        """
+
+
+class DatabaseFile(NamedTuple):
+    filegroup: Optional[str]
+    filegroup_type: Optional[str]
+    name: Optional[str]
+    type_desc: Optional[str]
+    size: Optional[int]
+    growth: Optional[int]
+    is_percent_growth: Optional[bool]
+    max_size: Optional[int]
+
+
+def size_in_pages(value: str) -> int:
+    number, unit = re.match(r"^([0-9]+) ?(KB|MB|GB|TB)$", value).groups()
+    return int(number) * {"KB": 1, "MB": 1024, "GB": 1024**2, "TB": 1024**3}[unit] // 8
+
+
+def file_options(spec: dict) -> List[str]:
+    return [
+        f"{option} = {spec[key].replace(' ', '')}"
+        for key, option in [
+            ("Size", "SIZE"),
+            ("FileGrowth", "FILEGROWTH"),
+            ("MaxSize", "MAXSIZE"),
+        ]
+        if spec.get(key)
+    ]
+
+
+def modify_file_statements(
+    database: str, spec: dict, current: DatabaseFile
+) -> List[str]:
+    """
+    returns the ALTER DATABASE MODIFY FILE statements for the options in `spec` which differ from the
+    `current` file. A file cannot shrink, so a smaller size is ignored.
+    """
+    options = []
+    size, growth, max_size = (
+        spec.get("Size"),
+        spec.get("FileGrowth"),
+        spec.get("MaxSize"),
+    )
+    if size and size_in_pages(size) > current.size:
+        options.append(f"SIZE = {size.replace(' ', '')}")
+    elif size and size_in_pages(size) < current.size:
+        log.warning("file %s is larger than %s, not shrinking", current.name, size)
+
+    if growth and growth.endswith("%"):
+        if not (current.is_percent_growth and current.growth == int(growth[:-1])):
+            options.append(f"FILEGROWTH = {growth.replace(' ', '')}")
+    elif growth:
+        if current.is_percent_growth or current.growth != size_in_pages(growth):
+            options.append(f"FILEGROWTH = {growth.replace(' ', '')}")
+
+    if max_size == "UNLIMITED":
+        # the maximum size of an unlimited log file is 2TB
+        if current.max_size not in (-1, 268435456):
+            options.append("MAXSIZE = UNLIMITED")
+    elif max_size and current.max_size != size_in_pages(max_size):
+        options.append(f"MAXSIZE = {max_size.replace(' ', '')}")
+
+    return [
+        f"ALTER DATABASE [{database}] MODIFY FILE (NAME = N'{MSSQLResource.safe(current.name)}', {option})"
+        for option in options
+    ]
+
+
+def add_file_statement(database: str, filegroup: dict) -> str:
+    """
+    returns the statement which adds a file to `filegroup` in the default data directory of the
+    server, held in @path. A memory optimized filegroup gets a container directory.
+    """
+    name = f"{database}_{filegroup['Name']}"
+    if filegroup.get("MemoryOptimized"):
+        filename, options = name, ""
+    else:
+        filename, options = f"{name}.ndf", "".join(
+            f", {o}" for o in file_options(filegroup)
+        )
+    prefix = f"ALTER DATABASE [{database}] ADD FILE (NAME = N'{MSSQLResource.safe(name)}', FILENAME = N'"
+    suffix = (
+        f"{MSSQLResource.safe(filename)}'{options}) TO FILEGROUP [{filegroup['Name']}]"
+    )
+    return (
+        f"EXEC (N'{MSSQLResource.safe(prefix)}' + REPLACE(@path, N'''', N'''''') + "
+        f"N'{MSSQLResource.safe(suffix)}')"
+    )
+
+
+def configure_database_statements(
+    database: str, properties: dict, recovery_model: str, files: List[DatabaseFile]
+) -> List[str]:
+    """
+    returns the statements which reconcile the recovery model, the size of the data and log files
+    and the filegroups of `database` with the `properties`. Filegroups which are no longer in the
+    properties are left in place, as they may contain data.
+    """
+    statements = []
+    if properties.get("RecoveryModel", recovery_model) != recovery_model:
+        statements.append(
+            f"ALTER DATABASE [{database}] SET RECOVERY {properties['RecoveryModel']}"
+        )
+
+    data_file = next(
+        (f for f in files if f.filegroup == "PRIMARY" and f.type_desc == "ROWS"), None
+    )
+    log_file = next((f for f in files if f.type_desc == "LOG"), None)
+    for spec, current in [
+        (properties.get("DataFile"), data_file),
+        (properties.get("LogFile"), log_file),
+    ]:
+        if spec and current:
+            statements.extend(modify_file_statements(database, spec, current))
+
+    filegroups = {}
+    for f in files:
+        if f.filegroup and (
+            f.filegroup not in filegroups or not filegroups[f.filegroup].name
+        ):
+            filegroups[f.filegroup] = f
+
+    added = []
+    for filegroup in properties.get("FileGroups", []):
+        current = filegroups.get(filegroup["Name"])
+        if not current:
+            contains = (
+                " CONTAINS MEMORY_OPTIMIZED_DATA"
+                if filegroup.get("MemoryOptimized")
+                else ""
+            )
+            statements.append(
+                f"ALTER DATABASE [{database}] ADD FILEGROUP [{filegroup['Name']}]{contains}"
+            )
+        if not (current and current.name):
+            added.append(add_file_statement(database, filegroup))
+        elif not filegroup.get("MemoryOptimized"):
+            statements.extend(modify_file_statements(database, filegroup, current))
+
+    if added:
+        statements.append(
+            "DECLARE @path nvarchar(max) = CAST(SERVERPROPERTY('InstanceDefaultDataPath') AS nvarchar(max))"
+        )
+        statements.extend(added)
+    return statements
+
+
+# queries the recovery model and the files of database @database, by calling its sp_executesql.
+database_files_statement = sp_executesql(
+    """
+    DECLARE @lookup nvarchar(300) = QUOTENAME(@database) + N'.sys.sp_executesql'
+    EXEC @lookup
+        N'SELECT CAST(DATABASEPROPERTYEX(DB_NAME(), ''Recovery'') AS nvarchar(60)),
+                 fg.name, fg.type, f.name, f.type_desc, f.size, f.growth, f.is_percent_growth, f.max_size
+          FROM sys.filegroups fg
+          FULL JOIN sys.database_files f ON f.data_space_id = fg.data_space_id
+          ORDER BY f.file_id'
+    """,
+    database="sysname",
+)
+
+
+# the properties configuring the files and recovery model of the database
+configuration_properties = ["DataFile", "LogFile", "RecoveryModel", "FileGroups"]
+
+
+# database states from which it will not come online by itself
+failed_states = {"SUSPECT", "EMERGENCY", "RECOVERY_PENDING", "OFFLINE"}
+
+
 class MSSQLDatabase(MSSQLResource):
     def __init__(self):
         super(MSSQLDatabase, self).__init__()
@@ -36,6 +333,18 @@ class MSSQLDatabase(MSSQLResource):
     def old_name(self) -> str:
         return self.get_old("Name")
 
+    @property
+    def async_mode(self) -> bool:
+        return self.get("Asynchronous", False)
+
+    @property
+    def force_disconnect(self) -> bool:
+        return self.get("ForceDisconnect", False)
+
+    @property
+    def job_name(self) -> str:
+        return f"cfn-mssql-{self.request_id}"
+
     @property
     def url(self):
         return "mssql:%s:database:%s" % (
@@ -44,47 +353,168 @@ class MSSQLDatabase(MSSQLResource):
         )
 
     def create(self):
+        if self.async_state or self.async_mode:
+            self.run_job(create_database_statement(self.name))
+            return
+
+        created = False
         try:
             self.connect(autocommit=True)
             with self.connection.cursor() as cursor:
-                cursor.execute(f"CREATE DATABASE [{self.name}]")
+                cursor.execute(create_database_statement(self.name))
+            created = True
+            self.forget_database(self.name)
             self.physical_resource_id = self.url
+            self.configure_database()
             self.set_attribute("Name", self.name)
         except pymssql.Error as error:
-            self.physical_resource_id = "could-not-create"
             self.report_failure(error)
+            if not created or self.drop_created_database():
+                self.physical_resource_id = "could-not-create"
         finally:
             self.close()
 
-    def rename_database(self):
+    def drop_created_database(self) -> bool:
+        """
+        drops the database of a create which failed after CREATE DATABASE. Returns False if it could
+        not be dropped, in which case the physical resource id refers to it so a delete will.
+        """
         try:
-            self.connect(autocommit=True)
             with self.connection.cursor() as cursor:
-                cursor.callproc(
-                    "rdsadmin.dbo.rds_modify_db_name", (self.old_name, self.name)
-                )
-            self.physical_resource_id = self.url
-            self.set_attribute("Name", self.name)
+                cursor.execute(drop_database_statement(self.name))
+            self.forget_database(self.name)
+            # nothing of the failed create is left, so it may be retried
+            self.connection.changed = False
+            return True
         except pymssql.Error as error:
+            log.warning(
+                "failed to drop database %s of a failed create, %s", self.name, error
+            )
+            return False
+
+    def rename_database(self):
+        if self.async_state or self.async_mode:
+            self.run_job(rename_database_statement(self.old_name, self.name))
+            return
+
+        with self.connection.cursor() as cursor:
+            cursor.callproc(
+                "rdsadmin.dbo.rds_modify_db_name", (self.old_name, self.name)
+            )
+        self.configure_database()
+        self.forget_database(self.old_name)
+        self.forget_database(self.name)
+        self.physical_resource_id = self.url
+        self.set_attribute("Name", self.name)
+
+    def get_database_files(self) -> Tuple[Optional[str], List[DatabaseFile]]:
+        """
+        returns the recovery model and the files and filegroups of the database.
+        """
+        with self.connection.cursor(read_only=True) as cursor:
+            cursor.execute(database_files_statement, {"database": self.name})
+            rows = cursor.fetchall()
+        recovery_model = rows[0][0] if rows else None
+        return recovery_model, [DatabaseFile(*row[1:]) for row in rows]
+
+    def configure_database(self):
+        """
+        reconciles the recovery model, files and filegroups of the database with the properties.
+        """
+        if not any(self.get(name) for name in configuration_properties):
+            return
+
+        recovery_model, files = self.get_database_files()
+        statements = configure_database_statements(
+            self.name, self.properties, recovery_model, files
+        )
+        if statements:
+            log.info("configure database %s", self.name)
+            with self.connection.cursor() as cursor:
+                cursor.execute(";\n".join(statements))
+
+    def run_job(self, command: str):
+        """
+        starts `command` in a SQL Server Agent job and polls until the database is online. If the
+        invocation runs out of time, the request is continued in a new invocation.
+        """
+        state = self.async_state or {"Job": self.job_name, "Started": time.time()}
+        try:
+            if not self.connection:
+                self.connect(autocommit=True)
+            if not self.async_state:
+                log.info("starting job %s: %s", state["Job"], command)
+                with self.connection.cursor() as cursor:
+                    cursor.execute(start_job_statement(state["Job"], command))
+
+            while True:
+                with self.connection.cursor() as cursor:
+                    cursor.execute(
+                        database_state_statement,
+                        {"name": self.name, "job_name": state["Job"]},
+                    )
+                    state_desc, error = cursor.fetchone()
+
+                if state_desc == "ONLINE":
+                    self.configure_database()
+                    self.forget_database(self.old_name or self.name)
+                    self.forget_database(self.name)
+                    self.physical_resource_id = self.url
+                    self.set_attribute("Name", self.name)
+                    return
+
+                if state_desc in failed_states:
+                    error = f"database {self.name} is {state_desc}"
+                elif not error and continuation.expired(state["Started"]):
+                    error = f"database {self.name} did not come online in time"
+                if error:
+                    with self.connection.cursor() as cursor:
+                        cursor.execute(delete_job_statement(state["Job"]))
+                    if self.request_type == "Create":
+                        self.physical_resource_id = "could-not-create"
+                    self.fail(error[0:200])
+                    return
+
+                if continuation.must_continue_later(self.context):
+                    self.continue_later(state)
+                    return
+
+                time.sleep(continuation.poll_interval)
+        except pymssql.Error as error:
+            if self.request_type == "Create":
+                self.physical_resource_id = "could-not-create"
             self.report_failure(error)
         finally:
             self.close()
 
     def database_exists(self, name: str) -> bool:
-        try:
-            self.connect(autocommit=True)
-            return self.get_database_id(self.name)
-        finally:
-            self.close()
+        return self.get_database_id(name) is not None
 
     def update(self):
-        if self.name != self.old_name:
-            if not self.database_exists(self.name):
+        renamed = self.name != self.old_name
+        if not (
+            self.async_state
+            or renamed
+            or any(self.get(name) for name in configuration_properties)
+        ):
+            self.success("nothing to update here")
+            return
+
+        try:
+            self.connect(autocommit=True)
+            if self.async_state:
                 self.rename_database()
+            elif renamed:
+                if not self.database_exists(self.name):
+                    self.rename_database()
+                else:
+                    self.fail(f"database {self.name} already exists")
             else:
-                self.fail(f"database {self.name} already exists")
-        else:
-            self.success("nothing to update here")
+                self.configure_database()
+        except pymssql.Error as error:
+            self.report_failure(error)
+        finally:
+            self.close()
 
     def delete(self):
         if self.physical_resource_id == "could-not-create":
@@ -94,15 +524,21 @@ class MSSQLDatabase(MSSQLResource):
         try:
             self.connect(autocommit=True)
             with self.connection.cursor() as cursor:
-                cursor.execute(f"DROP DATABASE IF EXISTS [{self.name}]")
+                cursor.execute(
+                    drop_database_statement(self.name, self.force_disconnect)
+                )
+            self.forget_database(self.name)
         except pymssql.Error as error:
             self.report_failure(error)
         finally:
             self.close()
 
 
-provider = MSSQLDatabase()
+provider = None
 
 
 def handler(request, context):
+    global provider
+    if provider is None:
+        provider = MSSQLDatabase()
     return provider.handle(request, context)
@@ -0,0 +1,355 @@
+"""
+audits the databases, logins, users and grants on a server against a list of resource properties.
+The catalog is read in a few set-based queries, independent of the number of resources:
+
+    {
+      "Server": {"URL": "mssql://sa@db:1433/master", "PasswordParameterName": "/db/sa"},
+      "Resources": [
+        {"Type": "Custom::MSSQLLogin", "Properties": {"LoginName": "app", "PasswordParameterName": "/app"}},
+        {"Type": "Custom::MSSQLUser", "Properties": {"UserName": "app", "LoginName": "app", "Server": {...}}}
+      ]
+    }
+
+`Resources` may also be the Resources section of a template with resolved properties. The response
+lists the differences:
+
+    {"Resources": 2, "Drift": [{"ResourceType": "Custom::MSSQLLogin", "Name": "app", "Property": "Password",
+                                "Expected": "match", "Actual": "mismatch"}]}
+"""
+
+import logging
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+from xml.sax.saxutils import quoteattr
+
+from mssql_resource_provider import connection_info, connection_pool
+from mssql_resource_provider.base import MSSQLResource, sp_executesql
+from mssql_resource_provider.connection_info import _get_password_from_dict
+
+log = logging.getLogger()
+
+
+class Catalog(NamedTuple):
+    databases: Set[str]
+    # login name -> default database
+    logins: Dict[str, str]
+    # login name -> whether the password matches
+    passwords: Dict[str, bool]
+    # (database, user name) -> (login name, default schema)
+    users: Dict[Tuple[str, str], Tuple[Optional[str], Optional[str]]]
+    # (database, user name) -> granted permissions
+    permissions: Dict[Tuple[str, str], Set[str]]
+
+
+class Expected(NamedTuple):
+    databases: List[dict]
+    logins: List[dict]
+    users: List[dict]
+    grants: List[dict]
+
+
+def _key(*names: str) -> tuple:
+    # the default collation of SQL Server is case insensitive
+    return tuple(n.lower() for n in names)
+
+
+def _database_of(properties: dict, default: str) -> str:
+    url = properties.get("Server", {}).get("URL")
+    return (
+        connection_info.from_url(url)["database"] if isinstance(url, str) else default
+    )
+
+
+def _permissions(properties: dict) -> List[str]:
+    permissions = properties.get("Permissions") or [properties.get("Permission")]
+    return sorted({" ".join(p.upper().split()) for p in permissions if p})
+
+
+def _usernames(properties: dict) -> List[str]:
+    return properties.get("UserNames") or [properties.get("UserName")]
+
+
+def resource_list(resources) -> List[dict]:
+    """
+    returns the resources as a list, with the logical resource id of a template Resources section.
+    """
+    if isinstance(resources, dict):
+        return [{"LogicalResourceId": k, **v} for k, v in resources.items()]
+    return list(resources)
+
+
+def expectations(resources: List[dict], database: str) -> Expected:
+    """
+    returns the databases, logins, users and grants described by the `resources`, with their
+    default values. `database` is the default database of users and grants.
+    """
+    expected = Expected([], [], [], [])
+    for resource in resources:
+        resource_type = resource.get("Type", resource.get("ResourceType"))
+        properties = resource.get("Properties", {})
+        source = {
+            "ResourceType": resource_type,
+            "LogicalResourceId": resource.get("LogicalResourceId"),
+        }
+        if resource_type == "Custom::MSSQLDatabase":
+            expected.databases.append({**source, "Name": properties["Name"]})
+        elif resource_type == "Custom::MSSQLLogin":
+            expected.logins.append(
+                {**source, "DefaultDatabase": "master", **properties}
+            )
+        elif resource_type == "Custom::MSSQLUser":
+            expected.users.append(
+                {
+                    **source,
+                    "DefaultSchema": "dbo",
+                    **properties,
+                    "Database": _database_of(properties, database),
+                }
+            )
+        elif resource_type == "Custom::MSSQLDatabaseGrant":
+            for username in _usernames(properties):
+                expected.grants.append(
+                    {
+                        **source,
+                        "Database": properties["Database"],
+                        "UserName": username,
+                        "Permissions": _permissions(properties),
+                    }
+                )
+        elif resource_type == "Custom::MSSQLDatabaseBundle":
+            name = properties["Name"]
+            expected.databases.append({**source, "Name": name})
+            for l in properties.get("Logins", []):
+                expected.logins.append({**source, "DefaultDatabase": name, **l})
+            for u in properties.get("Users", []):
+                expected.users.append(
+                    {**source, "DefaultSchema": "dbo", **u, "Database": name}
+                )
+            for g in properties.get("Grants", []):
+                for username in g["UserNames"]:
+                    expected.grants.append(
+                        {
+                            **source,
+                            "Database": name,
+                            "UserName": username,
+                            "Permissions": _permissions(g),
+                        }
+                    )
+        else:
+            log.warning("ignoring resource of type %s", resource_type)
+    return expected
+
+
+def logins_statement() -> str:
+    return """
+        SELECT name, default_database_name
+        FROM sys.server_principals
+        WHERE type IN ('S', 'U', 'G')
+        """
+
+
+# the logins are passed as an xml list of <l n="name" p="password"/> elements, so the passwords are
+# parameter values and never part of the statement text.
+passwords_statement = sp_executesql(
+    """
+    SELECT v.name, PWDCOMPARE(v.password, l.password_hash)
+    FROM (
+        SELECT e.value('@n', 'nvarchar(128)') AS name, e.value('@p', 'nvarchar(128)') AS password
+        FROM @passwords.nodes('/l') AS t(e)
+    ) AS v
+    JOIN sys.sql_logins l ON l.name = v.name
+    """,
+    passwords="xml",
+)
+
+
+def passwords_parameter(passwords: List[Tuple[str, str]]) -> str:
+    return "".join(
+        f"<l n={quoteattr(name)} p={quoteattr(password)}/>"
+        for name, password in passwords
+    )
+
+
+def users_select(database: str) -> str:
+    return f"""
+        SELECT N'{MSSQLResource.safe(database)}', p.name, l.name, p.default_schema_name
+        FROM [{database}].sys.database_principals p
+        LEFT JOIN sys.server_principals l ON l.sid = p.sid
+        WHERE p.type IN ('S', 'U', 'G')
+        """
+
+
+def permissions_select(database: str) -> str:
+    return f"""
+        SELECT N'{MSSQLResource.safe(database)}', p.name, e.permission_name
+        FROM [{database}].sys.database_permissions e
+        JOIN [{database}].sys.database_principals p ON p.principal_id = e.grantee_principal_id
+        WHERE e.class = 0 AND e.state IN ('G', 'W')
+        """
+
+
+def union_all(selects: List[str]) -> str:
+    return "\nUNION ALL\n".join(selects)
+
+
+def _query(connection, statement: str, parameters: dict = None) -> list:
+    with connection.cursor() as cursor:
+        if parameters:
+            cursor.execute(statement, parameters)
+        else:
+            cursor.execute(statement)
+        return cursor.fetchall()
+
+
+def read_catalog(connection, expected: Expected, passwords: Dict[str, str]) -> Catalog:
+    """
+    reads the state of the catalog required to audit the `expected` resources, comparing the
+    `passwords` of the logins on the server.
+    """
+    databases = {
+        _key(row[0])[0]: row[0]
+        for row in _query(connection, "SELECT name FROM sys.databases")
+    }
+    logins = {
+        _key(name)[0]: default_database
+        for name, default_database in _query(connection, logins_statement())
+    }
+
+    matches = {}
+    if passwords:
+        for name, match in _query(
+            connection,
+            passwords_statement,
+            {"passwords": passwords_parameter(list(passwords.items()))},
+        ):
+            matches[_key(name)[0]] = match == 1
+
+    referenced = sorted(
+        {
+            databases[_key(r["Database"])[0]]
+            for r in expected.users + expected.grants
+            if _key(r["Database"])[0] in databases
+        }
+    )
+    users, permissions = {}, {}
+    if referenced:
+        for database, name, login_name, default_schema in _query(
+            connection, union_all([users_select(d) for d in referenced])
+        ):
+            users[_key(database, name)] = (login_name, default_schema)
+        for database, name, permission in _query(
+            connection, union_all([permissions_select(d) for d in referenced])
+        ):
+            permissions.setdefault(_key(database, name), set()).add(permission)
+
+    return Catalog(set(databases), logins, matches, users, permissions)
+
+
+def _drift(resource: dict, name: str, property: str, expected, actual) -> dict:
+    return {
+        "ResourceType": resource["ResourceType"],
+        "LogicalResourceId": resource.get("LogicalResourceId"),
+        "Name": name,
+        "Property": property,
+        "Expected": expected,
+        "Actual": actual,
+    }
+
+
+def diff(catalog: Catalog, expected: Expected) -> List[dict]:
+    """
+    returns the differences between the `expected` resources and the `catalog`.
+    """
+    drift = []
+    for d in expected.databases:
+        if _key(d["Name"])[0] not in catalog.databases:
+            drift.append(_drift(d, d["Name"], "Name", d["Name"], None))
+
+    for l in expected.logins:
+        name = l["LoginName"]
+        key = _key(name)[0]
+        if key not in catalog.logins:
+            drift.append(_drift(l, name, "LoginName", name, None))
+            continue
+        if _key(catalog.logins[key] or "") != _key(l["DefaultDatabase"]):
+            drift.append(
+                _drift(
+                    l,
+                    name,
+                    "DefaultDatabase",
+                    l["DefaultDatabase"],
+                    catalog.logins[key],
+                )
+            )
+        if key in catalog.passwords and not catalog.passwords[key]:
+            drift.append(_drift(l, name, "Password", "match", "mismatch"))
+
+    for u in expected.users:
+        name = u["UserName"]
+        if _key(u["Database"])[0] not in catalog.databases:
+            drift.append(_drift(u, name, "Database", u["Database"], None))
+            continue
+        actual = catalog.users.get(_key(u["Database"], name))
+        if not actual:
+            drift.append(_drift(u, name, "UserName", name, None))
+            continue
+        login_name, default_schema = actual
+        if _key(login_name or "") != _key(u["LoginName"]):
+            drift.append(_drift(u, name, "LoginName", u["LoginName"], login_name))
+        if _key(default_schema or "") != _key(u["DefaultSchema"]):
+            drift.append(
+                _drift(u, name, "DefaultSchema", u["DefaultSchema"], default_schema)
+            )
+
+    for g in expected.grants:
+        granted = catalog.permissions.get(_key(g["Database"], g["UserName"]), set())
+        missing = [p for p in g["Permissions"] if p not in granted]
+        if missing:
+            drift.append(
+                _drift(
+                    g,
+                    g["UserName"],
+                    "Permissions",
+                    g["Permissions"],
+                    sorted(granted.intersection(g["Permissions"])),
+                )
+            )
+    return drift
+
+
+def audit(request: dict, context) -> dict:
+    """
+    audits the `Resources` in the request against the catalog of the `Server`.
+    """
+    ssm = connection_info.default_ssm_client
+    server = request["Server"]
+    resources = resource_list(request.get("Resources", []))
+    info = connection_info.from_url(server["URL"], _get_password_from_dict(server, ssm))
+    expected = expectations(resources, info["database"])
+
+    names = [
+        l["PasswordParameterName"]
+        for l in expected.logins
+        if "Password" not in l and l.get("PasswordParameterName")
+    ]
+    parameters = connection_info.get_ssm_passwords(ssm, names) if names else {}
+    passwords = {
+        l["LoginName"]: (
+            l["Password"] if "Password" in l else parameters[l["PasswordParameterName"]]
+        )
+        for l in expected.logins
+        if "Password" in l or l.get("PasswordParameterName")
+    }
+
+    connection = connection_pool.acquire(info, autocommit=True)
+    discard = False
+    try:
+        catalog = read_catalog(connection, expected, passwords)
+    except Exception:
+        discard = True
+        raise
+    finally:
+        connection_pool.release(info, connection, discard)
+
+    drift = diff(catalog, expected)
+    log.info("audited %d resources, found %d differences", len(resources), len(drift))
+    return {"Resources": len(resources), "Drift": drift}
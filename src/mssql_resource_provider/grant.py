@@ -1,4 +1,5 @@
 import logging
+from typing import Dict, List
 
 import pymssql
 
@@ -10,7 +11,21 @@ log = logging.getLogger()
 request_schema = {
     "$schema": "http://json-schema.org/draft-04/schema#",
     "type": "object",
-    "required": ["Server", "Permission", "UserName", "Database"],
+    "required": ["Server", "Database"],
+    "allOf": [
+        {
+            "oneOf": [
+                {"required": ["Permission"]},
+                {"required": ["Permissions"]},
+            ]
+        },
+        {
+            "oneOf": [
+                {"required": ["UserName"]},
+                {"required": ["UserNames"]},
+            ]
+        },
+    ],
     "properties": {
         "Server": connection_info.request_schema,
         "Permission": {
@@ -19,12 +34,32 @@ request_schema = {
             "pattern": r"^[A-Za-z ]+$",
             "description": "to grant on the database",
         },
+        "Permissions": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "string",
+                "maxLength": 128,
+                "pattern": r"^[A-Za-z ]+$",
+            },
+            "description": "to grant on the database",
+        },
         "UserName": {
             "type": "string",
             "maxLength": 128,
             "pattern": r"^[^\[\]]*$",
             "description": "to grant the permission to",
         },
+        "UserNames": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "string",
+                "maxLength": 128,
+                "pattern": r"^[^\[\]]*$",
+            },
+            "description": "to grant the permissions to",
+        },
         "Database": {
             "type": "string",
             "maxLength": 128,
@@ -35,6 +70,78 @@ request_schema = {
 }
 
 
+def _permissions(properties: dict) -> List[str]:
+    if "Permissions" in properties:
+        names = properties["Permissions"]
+    elif "Permission" in properties:
+        names = [properties["Permission"]]
+    else:
+        names = []
+    return sorted(set(" ".join(n.upper().split()) for n in names))
+
+
+def _usernames(properties: dict) -> List[str]:
+    if "UserNames" in properties:
+        names = properties["UserNames"]
+    elif "UserName" in properties:
+        names = [properties["UserName"]]
+    else:
+        names = []
+    return list(dict.fromkeys(names))
+
+
+def _group_by_permissions(grants: Dict[str, List[str]]) -> Dict[tuple, List[str]]:
+    """
+    groups the users by the permissions to grant or revoke, so that each distinct set of permissions
+    requires a single statement.
+    """
+    result = {}
+    for username, permissions in grants.items():
+        if permissions:
+            result.setdefault(tuple(permissions), []).append(username)
+    return result
+
+
+def grant_statements(database: str, grants: Dict[str, List[str]]) -> List[str]:
+    """
+    returns the GRANT statements to grant each user in `grants` its permissions on `database`.
+    """
+    return [
+        "GRANT {} ON DATABASE::[{}] TO {}".format(
+            ", ".join(permissions),
+            database,
+            ", ".join(f"[{u}]" for u in usernames),
+        )
+        for permissions, usernames in _group_by_permissions(grants).items()
+    ]
+
+
+def revoke_statements(database: str, revokes: Dict[str, List[str]]) -> List[str]:
+    """
+    returns the REVOKE statements to revoke each user in `revokes` its permissions on `database`,
+    skipping users which no longer exist.
+    """
+    return [
+        "IF DATABASE_PRINCIPAL_ID(N'{}') IS NOT NULL REVOKE {} ON DATABASE::[{}] FROM [{}]".format(
+            MSSQLResource.safe(username),
+            ", ".join(permissions),
+            database,
+            username,
+        )
+        for permissions, usernames in _group_by_permissions(revokes).items()
+        for username in usernames
+    ]
+
+
+def grant_delta(old: Dict[str, set], new: Dict[str, set]) -> tuple:
+    """
+    returns the permissions per user to grant and to revoke to get from `old` to `new`.
+    """
+    grants = {u: sorted(p - old.get(u, set())) for u, p in new.items()}
+    revokes = {u: sorted(p - new.get(u, set())) for u, p in old.items()}
+    return grants, revokes
+
+
 class MSSQLDatabaseGrant(MSSQLResource):
     def __init__(self):
         super(MSSQLDatabaseGrant, self).__init__()
@@ -50,6 +157,14 @@ class MSSQLDatabaseGrant(MSSQLResource):
         result = self.get_old("Permission")
         return result.upper().strip() if result else ""
 
+    @property
+    def permissions(self) -> List[str]:
+        return _permissions(self.properties)
+
+    @property
+    def old_permissions(self) -> List[str]:
+        return _permissions(self.old_properties)
+
     @property
     def username(self) -> str:
         return self.get("UserName")
@@ -58,6 +173,14 @@ class MSSQLDatabaseGrant(MSSQLResource):
     def old_username(self) -> str:
         return self.get_old("UserName")
 
+    @property
+    def usernames(self) -> List[str]:
+        return _usernames(self.properties)
+
+    @property
+    def old_usernames(self) -> List[str]:
+        return _usernames(self.old_properties)
+
     @property
     def database(self) -> str:
         return self.get("Database")
@@ -68,20 +191,33 @@ class MSSQLDatabaseGrant(MSSQLResource):
 
     @property
     def url(self):
+        identities = self.lookup_identities(self.database, self.usernames)
         return "mssql:%s:grant:%s:%s:%s" % (
             self.logical_resource_id,
-            self.permission,
-            self.get_user_id(self.database, self.username),
-            self.get_database_id(self.database),
+            ",".join(self.permissions),
+            ",".join(str(identities[u].principal_id) for u in self.usernames),
+            identities[self.usernames[0]].database_id,
         )
 
+    def grant_statements(self, grants: Dict[str, List[str]]) -> List[str]:
+        return grant_statements(self.database, grants)
+
+    def revoke_statements(self, revokes: Dict[str, List[str]]) -> List[str]:
+        return revoke_statements(self.database, revokes)
+
+    def execute_batch(self, statements: List[str]):
+        if not statements:
+            return
+        log.info("%s", "; ".join(statements))
+        with self.connection.cursor() as cursor:
+            cursor.execute(";\n".join(statements))
+
     def grant(self):
         try:
             self.connect(autocommit=True)
-            with self.connection.cursor() as cursor:
-                cursor.execute(
-                    f"GRANT {self.permission} ON DATABASE::[{self.database}] TO [{self.username}]"
-                )
+            self.execute_batch(
+                self.grant_statements({u: self.permissions for u in self.usernames})
+            )
             self.physical_resource_id = self.url
         except pymssql.Error as error:
             self.physical_resource_id = "could-not-create"
@@ -89,13 +225,30 @@ class MSSQLDatabaseGrant(MSSQLResource):
         finally:
             self.close()
 
+    def apply_delta(self):
+        """
+        grants the permissions which are new, and revokes the ones which were removed.
+        """
+        grants, revokes = grant_delta(
+            {u: set(self.old_permissions) for u in self.old_usernames},
+            {u: set(self.permissions) for u in self.usernames},
+        )
+        try:
+            self.connect(autocommit=True)
+            self.execute_batch(
+                self.revoke_statements(revokes) + self.grant_statements(grants)
+            )
+        except pymssql.Error as error:
+            self.report_failure(error)
+        finally:
+            self.close()
+
     def revoke(self):
         try:
             self.connect(autocommit=True)
-            with self.connection.cursor() as cursor:
-                cursor.execute(
-                    f"REVOKE {self.permission} ON DATABASE::[{self.database}] FROM [{self.username}]"
-                )
+            self.execute_batch(
+                self.revoke_statements({u: self.permissions for u in self.usernames})
+            )
         except pymssql.Error as error:
             self.report_failure(error)
         finally:
@@ -105,7 +258,10 @@ class MSSQLDatabaseGrant(MSSQLResource):
         self.grant()
 
     def update(self):
-        self.grant()
+        if self.old_database and self.old_database != self.database:
+            self.grant()
+        else:
+            self.apply_delta()
 
     def delete(self):
         if self.physical_resource_id == "could-not-create":
@@ -115,8 +271,11 @@ class MSSQLDatabaseGrant(MSSQLResource):
         self.revoke()
 
 
-provider = MSSQLDatabaseGrant()
+provider = None
 
 
 def handler(request, context):
+    global provider
+    if provider is None:
+        provider = MSSQLDatabaseGrant()
     return provider.handle(request, context)
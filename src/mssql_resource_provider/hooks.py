@@ -0,0 +1,164 @@
+"""
+calls back registered functions on the SQL execution events of the providers, to add logging,
+sampling or tracing without changing the providers. The callbacks of an event are called with
+its fields as keyword arguments:
+
+    connect           host, database, elapsed, error
+    before_statement  sql
+    after_statement   sql, elapsed, error
+    commit            elapsed, error
+    rollback          elapsed, error
+    ssm_fetch         names, elapsed, error
+
+The elapsed time is in seconds, and the error is the exception raised or None. Unless `redact` is
+False, the string literals in the sql are replaced by '***', as they may contain passwords. Events
+without callbacks are skipped after a single check, and a failing callback is logged and ignored.
+
+The slow statement logger and the trace exporter are registered at import, if the environment
+variable SLOW_STATEMENT_THRESHOLD (in seconds) or TRACE_FILE is set.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial
+from typing import Callable, Dict, List, Optional
+
+log = logging.getLogger()
+
+events = (
+    "connect",
+    "before_statement",
+    "after_statement",
+    "commit",
+    "rollback",
+    "ssm_fetch",
+)
+
+_literal = re.compile(r"'(?:[^']|'')*'")
+
+
+class Hooks:
+    def __init__(self, redact: bool = True):
+        self.redact = redact
+        self.callbacks: Dict[str, List[Callable]] = {event: [] for event in events}
+
+    def register(self, event: str, callback: Callable) -> Callable:
+        if event not in self.callbacks:
+            raise ValueError(
+                f"unknown event {event}, expected one of {', '.join(events)}"
+            )
+        self.callbacks[event].append(callback)
+        return callback
+
+    def unregister(self, event: str, callback: Callable):
+        if callback in self.callbacks.get(event, []):
+            self.callbacks[event].remove(callback)
+
+    def clear(self):
+        for callbacks in self.callbacks.values():
+            callbacks.clear()
+
+    def sql(self, operation: str) -> str:
+        return _literal.sub("'***'", operation) if self.redact else operation
+
+    @contextmanager
+    def timer(self, event: str, **fields):
+        """
+        fires `event` with the elapsed time and error of the block, if it has callbacks.
+        """
+        if not self.callbacks[event]:
+            yield
+            return
+        started = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.fire(
+                event, elapsed=time.perf_counter() - started, error=error, **fields
+            )
+
+    def fire(self, event: str, **fields):
+        for callback in self.callbacks[event]:
+            try:
+                callback(**fields)
+            except Exception as e:
+                log.warning("%s hook %r failed, %s", event, callback, e)
+
+
+class SlowStatementLogger:
+    """
+    logs a warning for every statement which takes `threshold` seconds or longer.
+    """
+
+    def __init__(self, threshold: float = 1.0):
+        self.threshold = threshold
+
+    def __call__(self, sql: str, elapsed: float, error: Optional[Exception]):
+        if elapsed >= self.threshold:
+            log.warning("slow statement took %.3fs: %s", elapsed, " ".join(sql.split()))
+
+    def register(self, hooks: Hooks):
+        hooks.register("after_statement", self)
+
+
+class TraceExporter:
+    """
+    appends a span for every event to the json file `path` in the Trace Event Format, which can be
+    opened in chrome://tracing or Perfetto. The closing bracket of the array is optional in this
+    format, so the file remains valid while spans are being appended.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def register(self, hooks: Hooks):
+        for event in events:
+            if event != "before_statement":
+                hooks.register(event, partial(self.export, event))
+
+    def export(self, event: str, elapsed: float, **fields):
+        span = {
+            "name": event,
+            "ph": "X",
+            "ts": int((time.time() - elapsed) * 1000000),
+            "dur": int(elapsed * 1000000),
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": {k: str(v) for k, v in fields.items() if v is not None},
+        }
+        with self.lock, open(self.path, "a") as file:
+            if file.tell() == 0:
+                file.write("[\n")
+            file.write(json.dumps(span) + ",\n")
+
+
+def from_environment(hooks: Hooks):
+    """
+    registers the slow statement logger and trace exporter configured in the environment.
+    """
+    threshold = os.getenv("SLOW_STATEMENT_THRESHOLD")
+    if threshold:
+        try:
+            SlowStatementLogger(float(threshold)).register(hooks)
+        except ValueError:
+            log.warning(
+                "ignoring SLOW_STATEMENT_THRESHOLD, %s is not a number", threshold
+            )
+    path = os.getenv("TRACE_FILE")
+    if path:
+        TraceExporter(path).register(hooks)
+
+
+# the hooks of all providers
+registry = Hooks()
+from_environment(registry)
@@ -1,14 +1,32 @@
+import copy
 import logging
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
 
 import pymssql
 
-from mssql_resource_provider import connection_info
-from mssql_resource_provider.base import MSSQLResource
+from mssql_resource_provider import connection_info, metrics
+from mssql_resource_provider.base import MSSQLResource, sp_executesql
 from mssql_resource_provider.connection_info import _get_password_from_dict
 
 log = logging.getLogger()
 
+server_schema = copy.deepcopy(connection_info.request_schema)
+server_schema["properties"]["URL"] = {
+    "oneOf": [
+        connection_info.request_schema["properties"]["URL"],
+        {
+            "type": "array",
+            "minItems": 1,
+            "items": connection_info.request_schema["properties"]["URL"],
+        },
+    ],
+    "description": "database connection url, or a list of urls of servers with the same credentials",
+}
+
+# maximum number of servers on which the login is created, updated or dropped concurrently
+max_workers = 8
+
 request_schema = {
     "$schema": "http://json-schema.org/draft-04/schema#",
     "type": "object",
@@ -17,7 +35,7 @@ request_schema = {
         {"required": ["Server", "LoginName", "PasswordParameterName"]},
     ],
     "properties": {
-        "Server": connection_info.request_schema,
+        "Server": server_schema,
         "LoginName": {
             "type": "string",
             "pattern": r"^[^\[\]]*$",
@@ -35,6 +53,11 @@ request_schema = {
             "minLength": 1,
             "description": "the name of the password in the Parameter Store.",
         },
+        "ForceDisconnect": {
+            "type": "boolean",
+            "default": False,
+            "description": "on delete, kill all sessions of the login",
+        },
         "PasswordHash": {
             "type": "string",
             "description": "to force an update of the password",
@@ -43,10 +66,95 @@ request_schema = {
 }
 
 
+def create_login_statement(
+    login_name: str, password: str, default_database: str, sid: bytes = None
+) -> str:
+    sid_clause = f"SID = 0x{sid.hex()}," if sid else ""
+    return f"""
+       CREATE LOGIN [{login_name}]
+       WITH PASSWORD = '{MSSQLResource.safe(password)}',
+            {sid_clause}
+            DEFAULT_DATABASE = [{default_database}]
+       """
+
+
+def alter_login_statement(
+    login_name: str,
+    password: Optional[str],
+    default_database: Optional[str],
+    new_name: str = None,
+) -> str:
+    """
+    returns the ALTER LOGIN statement changing only the non-empty clauses, or an empty string if
+    there is nothing to change.
+    """
+    clauses = []
+    if password is not None:
+        clauses.append(f"PASSWORD = '{MSSQLResource.safe(password)}'")
+    if new_name and new_name != login_name:
+        clauses.append(f"NAME = [{new_name}]")
+    if default_database is not None:
+        clauses.append(f"DEFAULT_DATABASE = [{default_database}]")
+    if not clauses:
+        return ""
+    return f"ALTER LOGIN [{login_name}] WITH " + ", ".join(clauses)
+
+
+# queries the default database of the login, whether @password is the current password and the
+# identity of the login, without changing anything.
+login_state_statement = sp_executesql(
+    """
+    SELECT default_database_name, PWDCOMPARE(@password, password_hash), principal_id, sid
+    FROM sys.sql_logins
+    WHERE name = @login_name
+    """,
+    login_name="sysname",
+    password="nvarchar(128)",
+)
+
+
+def drop_login_statement(login_name: str) -> str:
+    return f"DROP LOGIN [{login_name}]"
+
+
+def force_drop_logins_statement(login_names: List[str]) -> str:
+    """
+    returns the batch which kills all sessions of the logins and drops those which exist.
+    """
+    names = ", ".join(f"N'{MSSQLResource.safe(n)}'" for n in login_names)
+    drops = ";\n".join(
+        f"IF SUSER_ID(N'{MSSQLResource.safe(n)}') IS NOT NULL {drop_login_statement(n)}"
+        for n in login_names
+    )
+    return f"""
+        DECLARE @kill nvarchar(max) = N'';
+        SELECT @kill = @kill + N'KILL ' + CAST(session_id AS nvarchar(10)) + N'; '
+        FROM sys.dm_exec_sessions
+        WHERE login_name IN ({names}) AND session_id <> @@SPID;
+        EXEC (@kill);
+        {drops}
+        """
+
+
 class MSSQLLogin(MSSQLResource):
     def __init__(self):
         super(MSSQLLogin, self).__init__()
         self.request_schema = request_schema
+        # the sid to create the login with, to keep it identical on all servers
+        self.sid = None
+
+    def set_request(self, request, context):
+        super(MSSQLLogin, self).set_request(request, context)
+        self.sid = None
+
+    @property
+    def server_urls(self) -> List[str]:
+        url = self.get("Server", {}).get("URL", "")
+        return url if isinstance(url, list) else [url]
+
+    @property
+    def server_url(self):
+        return self.server_urls[0]
 
     @property
     def password(self) -> str:
@@ -64,6 +172,10 @@ class MSSQLLogin(MSSQLResource):
     def default_database(self):
         return self.get("DefaultDatabase")
 
+    @property
+    def force_disconnect(self) -> bool:
+        return self.get("ForceDisconnect", False)
+
     @property
     def url(self):
         return "mssql:{}:login:{}".format(
@@ -72,95 +184,171 @@ class MSSQLLogin(MSSQLResource):
         )
 
     def get_principal_id(self) -> Optional[str]:
-        rows = []
-        try:
-            with self.connection.cursor() as cursor:
-                cursor.execute(
-                    f"SELECT principal_id FROM master.sys.server_principals WHERE name = '{MSSQLResource.safe(self.login_name)}'"
-                )
-                rows = cursor.fetchone()
-        except pymssql.OperationalError:
-            pass
-
-        return rows[0] if rows else None
+        return self.lookup_identity(login_name=self.login_name).principal_id
 
     def drop_login(self):
         log.info("drop login %s", self.login_name)
         with self.connection.cursor() as cursor:
-            cursor.execute(f"DROP LOGIN [{self.login_name}]")
+            cursor.execute(drop_login_statement(self.login_name))
+        self.forget_principal(None, self.login_name)
+
+    def force_drop_login(self):
+        log.info("disconnect and drop login %s", self.login_name)
+        with self.connection.cursor() as cursor:
+            cursor.execute(force_drop_logins_statement([self.login_name]))
+        self.forget_principal(None, self.login_name)
 
     def update_login(self):
         log.info("update login %s", self.login_name)
+        password = self.password
         with self.connection.cursor() as cursor:
-            if self.old_login_name != self.login_name:
-                cursor.execute(
-                    f"""
-                   ALTER LOGIN [{self.old_login_name}]
-                   WITH PASSWORD = '{MSSQLResource.safe(self.password)}',
-                        NAME = [{self.login_name}],
-                        DEFAULT_DATABASE = [{self.default_database}]
-                   """
-                )
+            cursor.execute(
+                login_state_statement,
+                {"login_name": self.old_login_name, "password": password},
+            )
+            state = cursor.fetchone()
+
+        if state:
+            default_database, password_matches, principal_id, sid = state
+            if password_matches == 1:
+                password = None
+            if (default_database or "").lower() == self.default_database.lower():
+                default_database = None
             else:
-                cursor.execute(
-                    f"""
-                   ALTER LOGIN [{self.login_name}]
-                   WITH PASSWORD = '{MSSQLResource.safe(self.password)}',
-                        DEFAULT_DATABASE = [{self.default_database}]
-                   """
-                )
+                default_database = self.default_database
+            if self.old_login_name == self.login_name:
+                self.remember_principal(None, self.login_name, principal_id, sid)
+        elif self.sid:
+            # the login was added to a server of an existing resource
+            self.create_login()
+            return
+        else:
+            default_database = self.default_database
 
-            self.physical_resource_id = self.url
-            self.set_attribute("LoginName", self.login_name)
+        statement = alter_login_statement(
+            self.old_login_name, password, default_database, self.login_name
+        )
+        if statement:
+            with self.connection.cursor() as cursor:
+                cursor.execute(statement)
+            if self.old_login_name != self.login_name:
+                self.forget_principal(None, self.old_login_name)
+                self.forget_principal(None, self.login_name)
+        else:
+            log.info("login %s is up to date", self.login_name)
+
+        self.physical_resource_id = self.url
+        self.set_attribute("LoginName", self.login_name)
 
     def create_login(self):
         log.info("create login %s", self.login_name)
         with self.connection.cursor() as cursor:
-            sql = f"""
-               CREATE LOGIN [{self.login_name}]
-               WITH PASSWORD = '{MSSQLResource.safe(self.password)}',
-                    DEFAULT_DATABASE = [{self.default_database}]
-               """
-            cursor.execute(sql)
+            cursor.execute(
+                create_login_statement(
+                    self.login_name, self.password, self.default_database, self.sid
+                )
+            )
+            self.forget_principal(None, self.login_name)
 
             self.physical_resource_id = self.url
             self.set_attribute("LoginName", self.login_name)
 
+    def on_server(self, url: str, request_metrics) -> Optional[str]:
+        """
+        executes the request on the server `url` only, and returns the reason of the failure or None.
+        """
+        metrics.bind(request_metrics)
+        request = copy.deepcopy(self.request)
+        request["ResourceProperties"]["Server"]["URL"] = url
+        provider = MSSQLLogin()
+        provider.ssm = self.ssm
+        provider.set_request(request, self.context)
+        provider.sid = self.sid
+        try:
+            provider.connection_info = connection_info.from_url(
+                url, self.server_password
+            )
+            {
+                "Create": provider.create,
+                "Update": provider.update,
+                "Delete": provider.delete,
+            }[self.request_type]()
+        except Exception as e:
+            provider.fail(str(e))
+        if provider.status == "SUCCESS":
+            return None
+        return "%s: %s" % (provider.connection_info.get("host", url), provider.reason)
+
+    def fan_out(self):
+        """
+        executes the request on the other servers concurrently, with the sid of the login on the
+        first server. The request fails if it failed on any of them.
+        """
+        urls = self.server_urls[1:]
+        if not urls or self.status != "SUCCESS":
+            return
+
+        # the metrics are bound to the thread of the request, not to the workers
+        request_metrics = metrics.current()
+        with ThreadPoolExecutor(max_workers=min(len(urls), max_workers)) as executor:
+            failures = [
+                f
+                for f in executor.map(
+                    lambda url: self.on_server(url, request_metrics), urls
+                )
+                if f
+            ]
+        if failures:
+            self.fail("; ".join(failures)[0:200])
+
     def create(self):
         try:
             self.connect()
             self.create_login()
+            self.sid = self.lookup_identity(login_name=self.login_name).sid
         except pymssql.Error as error:
             self.physical_resource_id = "could-not-create"
             self.report_failure(error)
         finally:
             self.close()
+        self.fan_out()
 
     def update(self):
         try:
             self.connect()
             self.update_login()
+            self.sid = self.lookup_identity(login_name=self.login_name).sid
         except pymssql.Error as error:
             self.report_failure(error)
         finally:
             self.close()
+        self.fan_out()
 
     def delete(self):
         if self.physical_resource_id == "could-not-create":
             self.success("login was never created")
 
         try:
-            self.connect()
-            if self.get_principal_id():
-                self.drop_login()
+            if self.force_disconnect:
+                # KILL is not allowed in a transaction
+                self.connect(autocommit=True)
+                self.force_drop_login()
+            else:
+                self.connect()
+                if self.get_principal_id():
+                    self.drop_login()
         except pymssql.Error as error:
             self.report_failure(error)
         finally:
             self.close()
+        self.fan_out()
 
 
-provider = MSSQLLogin()
+provider = None
 
 
 def handler(request, context):
+    global provider
+    if provider is None:
+        provider = MSSQLLogin()
     return provider.handle(request, context)
@@ -0,0 +1,201 @@
+"""
+collects the SQL round trips and latencies of a single request, and emits them as one CloudWatch
+Embedded Metric Format log line at the end of the request.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+from mssql_resource_provider.hooks import Hooks
+
+# set METRICS_NAMESPACE to an empty string to disable the metrics.
+namespace = os.getenv("METRICS_NAMESPACE", "CFNCustomMSSQLResourceProvider")
+
+_current = threading.local()
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings: Dict[str, List[float]] = {}
+        self.counts: Dict[str, int] = {}
+        # the fan-out threads of a request record in the same metrics
+        self.lock = threading.Lock()
+
+    def record(self, name: str, seconds: float):
+        with self.lock:
+            self.timings.setdefault(name, []).append(round(seconds * 1000, 3))
+
+    def count(self, name: str, value: int = 1):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    @contextmanager
+    def timer(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def as_emf(self, dimensions: Dict[str, str]) -> dict:
+        """
+        returns the metrics as an Embedded Metric Format document with `dimensions`.
+        """
+        self.record("RequestDuration", time.perf_counter() - self.started)
+        with self.lock:
+            timings = {n: list(t) for n, t in self.timings.items()}
+            counts = dict(self.counts)
+        metrics = [{"Name": n, "Unit": "Milliseconds"} for n in timings] + [
+            {"Name": n, "Unit": "Count"} for n in counts
+        ]
+        return {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [
+                    {
+                        "Namespace": namespace,
+                        "Dimensions": [list(dimensions.keys())],
+                        "Metrics": metrics,
+                    }
+                ],
+            },
+            **dimensions,
+            **timings,
+            **counts,
+        }
+
+    def emit(self, dimensions: Dict[str, str]):
+        if not namespace:
+            return
+        # printed instead of logged, as the log formatter prefix would break the EMF parsing.
+        sys.stdout.write(json.dumps(self.as_emf(dimensions)) + "\n")
+        sys.stdout.flush()
+
+
+def start() -> RequestMetrics:
+    """
+    starts collecting the metrics of a new request in the current thread.
+    """
+    _current.metrics = RequestMetrics()
+    return _current.metrics
+
+
+def bind(metrics: RequestMetrics):
+    """
+    collects the metrics of the current thread in `metrics`, for a thread working on a request.
+    """
+    _current.metrics = metrics
+
+
+def current() -> RequestMetrics:
+    """
+    returns the metrics of the request in the current thread.
+    """
+    metrics = getattr(_current, "metrics", None)
+    if metrics is None:
+        metrics = start()
+    return metrics
+
+
+class InstrumentedCursor:
+    def __init__(
+        self, cursor, metrics: RequestMetrics, hooks: Hooks, connection=None
+    ):
+        self.cursor = cursor
+        self.metrics = metrics
+        self.hooks = hooks
+        # the connection to mark as changed by a statement, None for a read only cursor
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.cursor.close()
+
+    def execute(self, operation, *args, **kwargs):
+        return self._call(
+            "Execute", operation, self.cursor.execute, operation, *args, **kwargs
+        )
+
+    def callproc(self, name, *args, **kwargs):
+        return self._call("CallProc", name, self.cursor.callproc, name, *args, **kwargs)
+
+    def _call(self, timer: str, sql: str, function, *args, **kwargs):
+        result = self._timed(timer, sql, function, *args, **kwargs)
+        if self.connection and self.connection.autocommit:
+            self.connection.changed = True
+        return result
+
+    def _timed(self, timer: str, sql: str, function, *args, **kwargs):
+        self.metrics.count("Statements")
+        callbacks = self.hooks.callbacks
+        if not (callbacks["before_statement"] or callbacks["after_statement"]):
+            with self.metrics.timer(timer):
+                return function(*args, **kwargs)
+
+        sql = self.hooks.sql(sql)
+        self.hooks.fire("before_statement", sql=sql)
+        with self.hooks.timer("after_statement", sql=sql), self.metrics.timer(timer):
+            return function(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+
+class InstrumentedConnection:
+    """
+    wraps a pymssql connection, timing every statement, commit and rollback and firing the
+    hooks of these events. On an `autocommit` connection, it records whether a statement of a
+    cursor which is not read only changed the server, as these changes cannot be rolled back.
+    """
+
+    def __init__(
+        self,
+        connection,
+        metrics: RequestMetrics,
+        hooks: Hooks = None,
+        autocommit: bool = False,
+    ):
+        self.raw = connection
+        self.metrics = metrics
+        self.hooks = hooks if hooks else Hooks()
+        self.autocommit = autocommit
+        self.changed = False
+
+    def cursor(self, *args, read_only: bool = False, **kwargs):
+        return InstrumentedCursor(
+            self.raw.cursor(*args, **kwargs),
+            self.metrics,
+            self.hooks,
+            None if read_only else self,
+        )
+
+    def commit(self):
+        with self.metrics.timer("Commit"), self.hooks.timer("commit"):
+            self.raw.commit()
+
+    def rollback(self):
+        with self.metrics.timer("Rollback"), self.hooks.timer("rollback"):
+            self.raw.rollback()
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+
+def unwrap(connection):
+    """
+    returns the pymssql connection wrapped by `connection`.
+    """
+    return (
+        connection.raw if isinstance(connection, InstrumentedConnection) else connection
+    )
@@ -0,0 +1,65 @@
+"""
+classifies SQL Server errors by their number, and computes the jittered backoff before a request
+which failed with a transient error is retried.
+"""
+
+import random
+from typing import Optional
+
+# the SQL Server and DB-Library error numbers of errors which are likely to succeed on retry
+transient_errors = {
+    1205: "deadlock victim",
+    1222: "lock request time out",
+    1807: "could not obtain exclusive lock on database model",
+    4060: "cannot open database",
+    40197: "service error processing the request",
+    40501: "service is busy",
+    40613: "database is not currently available",
+    49918: "not enough resources to process the request",
+    20003: "adaptive server connection timed out",
+    20004: "read from the server failed",
+    20006: "write to the server failed",
+    20009: "unable to connect, server unavailable",
+    20047: "dbprocess is dead or not enabled",
+}
+
+max_attempts = 4
+
+# seconds of the first backoff, doubled on every attempt up to max_delay
+base_delay = 0.5
+max_delay = 8.0
+
+# seconds of execution time required to make another attempt worthwhile
+min_remaining_time = 10.0
+
+
+def error_number(error: Optional[Exception]) -> Optional[int]:
+    """
+    returns the error number of a pymssql error, or None. pymssql raises errors with the arguments
+    (number, message), or with the single argument ((number, message),).
+    """
+    args = getattr(error, "args", None)
+    if args and isinstance(args[0], tuple):
+        args = args[0]
+    if args and isinstance(args[0], int):
+        return args[0]
+    return None
+
+
+def is_transient(error: Optional[Exception]) -> bool:
+    return error_number(error) in transient_errors
+
+
+def backoff(
+    error: Optional[Exception], attempt: int, remaining_time: Optional[float]
+) -> Optional[float]:
+    """
+    returns the seconds to wait before retrying after `error` on `attempt`, or None if the error is
+    not transient, the attempts are exhausted or there is not enough time left in the invocation.
+    """
+    if not is_transient(error) or attempt + 1 >= max_attempts:
+        return None
+    delay = random.uniform(0, min(max_delay, base_delay * 2**attempt))
+    if remaining_time is not None and remaining_time - delay < min_remaining_time:
+        return None
+    return delay
@@ -0,0 +1,234 @@
+"""
+runs the providers as a long running worker outside of Lambda, for instance on ECS. Every request is
+handled by a new provider on a bounded thread pool, while the connection pool, the password cache
+and the hooks are shared by all requests. The requests are posted as json to a local HTTP endpoint:
+
+    python -m mssql_resource_provider.service --port 8080
+
+A request is answered with 202 Accepted, as the response is sent to the ResponseURL of the request.
+When all workers are busy and `max_pending` requests are waiting, or the service is shutting down,
+the request is rejected with 503 Service Unavailable, so the sender can retry later. On SIGTERM or
+SIGINT, the service stops accepting requests and waits up to `shutdown_timeout` seconds for the
+accepted requests, including their continuations, to complete.
+"""
+
+import argparse
+import importlib
+import json
+import logging
+import os
+import signal
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from mssql_resource_provider import handlers
+
+log = logging.getLogger()
+
+# the provider class in each of the modules of mssql_resource_provider.handlers
+provider_classes = {
+    "Custom::MSSQLLogin": "MSSQLLogin",
+    "Custom::MSSQLUser": "MSSQLUser",
+    "Custom::MSSQLDatabase": "MSSQLDatabase",
+    "Custom::MSSQLDatabaseGrant": "MSSQLDatabaseGrant",
+    "Custom::MSSQLDatabaseBundle": "MSSQLDatabaseBundle",
+}
+
+max_workers = int(os.getenv("SERVICE_WORKERS", "8"))
+
+# number of accepted requests waiting for a worker
+max_pending = int(os.getenv("SERVICE_MAX_PENDING", "32"))
+
+# seconds a request may run before it continues as a new request, like the timeout of the Lambda
+request_timeout = 900.0
+
+shutdown_timeout = 60.0
+
+
+def new_provider(resource_type: str):
+    """
+    returns a new provider for `resource_type`, as the providers keep the request state.
+    """
+    if resource_type not in handlers:
+        resource_type = "Custom::MSSQLLogin"
+    module = importlib.import_module(handlers[resource_type])
+    return getattr(module, provider_classes[resource_type])()
+
+
+class Context:
+    """
+    the Lambda context of a request handled by the service, with its deadline.
+    """
+
+    def __init__(self, timeout: float):
+        self.deadline = time.monotonic() + timeout
+        self.aws_request_id = str(uuid.uuid4())
+        self.invoked_function_arn = None
+
+    def get_remaining_time_in_millis(self) -> int:
+        return int(max(0.0, self.deadline - time.monotonic()) * 1000)
+
+
+class ServiceTransport:
+    """
+    continues a request in the service itself. The continuation takes over the slot of the request.
+    """
+
+    def __init__(self, service: "Service"):
+        self.service = service
+
+    def send(self, request: dict, context):
+        self.service.continue_request(request)
+
+
+class Service:
+    def __init__(
+        self,
+        workers: int = None,
+        pending: int = None,
+        timeout: float = None,
+    ):
+        self.workers = workers if workers else max_workers
+        self.timeout = timeout if timeout else request_timeout
+        self.executor = ThreadPoolExecutor(
+            self.workers, thread_name_prefix="mssql-provider"
+        )
+        self.slots = threading.BoundedSemaphore(
+            self.workers + (max_pending if pending is None else pending)
+        )
+        self.transport = ServiceTransport(self)
+        self.accepting = True
+        self.active = 0
+        self.idle = threading.Condition()
+        # whether the request of the current worker was continued
+        self._continued = threading.local()
+
+    def submit(self, request: dict, block: bool = False) -> Future:
+        """
+        schedules `request`, or raises a ValueError if the service is full or shutting down.
+        """
+        if not self.accepting:
+            raise ValueError("the service is shutting down")
+        if not self.slots.acquire(blocking=block):
+            raise ValueError("the service is busy, try again later")
+        return self._schedule(request)
+
+    def continue_request(self, request: dict):
+        self._schedule(request, acquired=False)
+        # the slot of the request is released by its continuation
+        self._continued.value = True
+
+    def _schedule(self, request: dict, acquired: bool = True) -> Future:
+        with self.idle:
+            self.active += 1
+        try:
+            return self.executor.submit(self._run, request)
+        except RuntimeError:
+            self._done(release=acquired)
+            raise ValueError("the service is shutting down")
+
+    def _run(self, request: dict) -> dict:
+        self._continued.value = False
+        try:
+            provider = new_provider(request.get("ResourceType", ""))
+            provider.transport = self.transport
+            return provider.handle(request, Context(self.timeout))
+        except Exception as e:
+            log.error("request %s failed, %s", request.get("RequestId"), e)
+            raise
+        finally:
+            self._done(release=not self._continued.value)
+
+    def _done(self, release: bool = True):
+        if release:
+            self.slots.release()
+        with self.idle:
+            self.active -= 1
+            self.idle.notify_all()
+
+    def shutdown(self, timeout: float = None) -> bool:
+        """
+        stops accepting requests and waits for the accepted requests to complete. Returns False if
+        some requests were still running after `timeout` seconds.
+        """
+        self.accepting = False
+        timeout = shutdown_timeout if timeout is None else timeout
+        with self.idle:
+            completed = self.idle.wait_for(lambda: self.active == 0, timeout)
+        if not completed:
+            log.warning("shutting down with %d requests in progress", self.active)
+        self.executor.shutdown(wait=completed, cancel_futures=True)
+        return completed
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    service: Service = None
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length))
+            if not isinstance(request, dict):
+                raise ValueError("expected a json object")
+        except ValueError as e:
+            self.reply(400, f"invalid request, {e}")
+            return
+
+        try:
+            self.service.submit(request)
+        except ValueError as e:
+            self.reply(503, str(e), {"Retry-After": "5"})
+            return
+        self.reply(202, "accepted")
+
+    def reply(self, status: int, message: str, headers: Optional[dict] = None):
+        body = json.dumps({"Message": message}).encode("utf8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        log.info("%s %s", self.address_string(), format % args)
+
+
+def serve(port: int, service: Service = None, host: str = "127.0.0.1"):
+    """
+    handles the requests posted to http://`host`:`port`/ until SIGTERM or SIGINT.
+    """
+    service = service if service else Service()
+    handler = type("Handler", (RequestHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+
+    def stop(signum, frame):
+        log.info("received signal %d, shutting down", signum)
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    log.info("accepting requests on %s:%d", host, port)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="run the MSSQL resource providers")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    serve(args.port, host=args.host)
+
+
+if __name__ == "__main__":
+    main()
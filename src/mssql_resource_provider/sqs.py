@@ -0,0 +1,118 @@
+"""
+handles a batch of custom resource requests delivered by SQS, for instance through an SNS topic which
+is the ServiceToken of the resources. The requests are grouped by the server they connect to. The
+groups are handled concurrently, and the requests of a group one after the other, so they share a
+single pooled connection.
+
+The messages of the requests which could not be handled, or whose response could not be sent to
+CloudFormation, are returned as batch item failures to be delivered again. This requires
+`ReportBatchItemFailures` in the FunctionResponseTypes of the event source mapping.
+"""
+
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import mssql_resource_provider
+from mssql_resource_provider import (
+    cfn_response,
+    connection_info,
+    continuation,
+    retry,
+    service,
+)
+
+log = logging.getLogger()
+
+# maximum number of servers handled concurrently
+max_workers = 8
+
+# seconds left in the invocation required to start handling another request: the time a request
+# needs to be worth a retry, and a single attempt to put its response.
+min_remaining_time = (
+    retry.min_remaining_time
+    + cfn_response.connect_timeout
+    + cfn_response.read_timeout
+)
+
+
+def unwrap(record: dict) -> dict:
+    """
+    returns the custom resource request in the body of the SQS `record`, or in the SNS notification
+    in the body.
+    """
+    body = json.loads(record["body"])
+    if isinstance(body, dict) and body.get("Type") == "Notification":
+        body = json.loads(body["Message"])
+    if not isinstance(body, dict) or "RequestType" not in body:
+        raise ValueError("not a custom resource request")
+    return body
+
+
+def server_of(request: dict) -> Optional[Tuple]:
+    """
+    returns the connection information of the server of `request` without the password, or None.
+    """
+    url = request.get("ResourceProperties", {}).get("Server", {}).get("URL")
+    if isinstance(url, list):
+        url = url[0] if url else None
+    try:
+        info = connection_info.from_url(url) if isinstance(url, str) else {}
+    except ValueError:
+        return None
+    info.pop("password", None)
+    return tuple(sorted(info.items())) if info else None
+
+
+def handle_group(messages: List[Tuple[str, dict]], context) -> List[str]:
+    """
+    handles the requests in `messages` one by one, and returns the message ids of the failures.
+    """
+    failures = []
+    for message_id, request in messages:
+        remaining = continuation.remaining_time(context)
+        if remaining is not None and remaining < min_remaining_time:
+            log.warning("no time left to handle message %s", message_id)
+            failures.append(message_id)
+            continue
+        try:
+            provider = service.new_provider(request.get("ResourceType", ""))
+            provider.handle(request, context)
+        except Exception as e:
+            log.error("failed to handle message %s, %s", message_id, e)
+            failures.append(message_id)
+    return failures
+
+
+def handler(event: dict, context) -> dict:
+    if "RequestType" in event:
+        # a long running request, continued by invoking the function itself
+        return mssql_resource_provider.handler(event, context)
+
+    groups: Dict[Optional[Tuple], List[Tuple[str, dict]]] = {}
+    failures = []
+    for record in event.get("Records", []):
+        message_id = record.get("messageId")
+        try:
+            request = unwrap(record)
+        except (KeyError, ValueError) as e:
+            log.error("failed to read message %s, %s", message_id, e)
+            failures.append(message_id)
+            continue
+        groups.setdefault(server_of(request), []).append((message_id, request))
+
+    if groups:
+        with ThreadPoolExecutor(max_workers=min(len(groups), max_workers)) as executor:
+            for group in executor.map(
+                lambda messages: handle_group(messages, context), groups.values()
+            ):
+                failures.extend(group)
+
+    log.info(
+        "handled %d messages for %d servers, %d failed",
+        len(event.get("Records", [])),
+        len(groups),
+        len(failures),
+    )
+    return {"batchItemFailures": [{"itemIdentifier": f} for f in failures]}
@@ -37,6 +37,33 @@ request_schema = {
 }
 
 
+def create_user_statement(username: str, login_name: str, default_schema: str) -> str:
+    return f"""
+        CREATE USER [{username}] 
+        FOR 
+           LOGIN [{login_name}]
+        WITH
+           DEFAULT_SCHEMA = [{default_schema}]
+        """
+
+
+def alter_user_statement(
+    username: str, login_name: str, default_schema: str, new_name: str = None
+) -> str:
+    name_clause = f"NAME = [{new_name}]," if new_name and new_name != username else ""
+    return f"""
+        ALTER USER [{username}] 
+        WITH 
+           {name_clause}
+           LOGIN = [{login_name}],
+           DEFAULT_SCHEMA = [{default_schema}]
+        """
+
+
+def drop_user_statement(username: str) -> str:
+    return f"DROP USER IF EXISTS [{username}]"
+
+
 class MSSQLUser(MSSQLResource):
     def __init__(self):
         super(MSSQLUser, self).__init__()
@@ -64,10 +91,11 @@ class MSSQLUser(MSSQLResource):
 
     @property
     def url(self):
+        identity = self.lookup_identity(self.database, self.username)
         return "mssql:%s:database:%s:user:%s" % (
             self.logical_resource_id,
-            self.get_database_id(self.database),
-            self.get_user_id(self.database, self.username),
+            identity.database_id,
+            identity.principal_id,
         )
 
     @property
@@ -76,30 +104,23 @@ class MSSQLUser(MSSQLResource):
 
     def drop_user(self):
         with self.connection.cursor() as cursor:
-            cursor.execute(f"DROP USER IF EXISTS [{self.username}]")
+            cursor.execute(drop_user_statement(self.username))
+        self.forget_principal(self.database, self.username)
 
     def update_user(self):
         log.info("update user %s", self.username)
         with self.connection.cursor() as cursor:
-            if self.username != self.old_username:
-                cursor.execute(
-                    f"""
-                ALTER USER [{self.old_username}] 
-                WITH 
-                   NAME = [{self.username}], 
-                   LOGIN = [{self.login_name}],
-                   DEFAULT_SCHEMA = [{self.default_schema}]
-                """
-                )
-            else:
-                cursor.execute(
-                    f"""
-                    ALTER USER [{self.username}] 
-                    WITH 
-                       LOGIN = [{self.login_name}],
-                       DEFAULT_SCHEMA = [{self.default_schema}]
-                    """
+            cursor.execute(
+                alter_user_statement(
+                    self.old_username,
+                    self.login_name,
+                    self.default_schema,
+                    self.username,
                 )
+            )
+            if self.username != self.old_username:
+                self.forget_principal(self.database, self.old_username)
+                self.forget_principal(self.database, self.username)
 
             self.physical_resource_id = self.url
             self.set_attribute("UserName", self.username)
@@ -108,14 +129,11 @@ class MSSQLUser(MSSQLResource):
         log.info("create user %s", self.login_name)
         with self.connection.cursor() as cursor:
             cursor.execute(
-                f"""
-                CREATE USER [{self.username}] 
-                FOR 
-                   LOGIN [{self.login_name}]
-                WITH
-                   DEFAULT_SCHEMA = [{self.default_schema}]
-                """
+                create_user_statement(
+                    self.username, self.login_name, self.default_schema
+                )
             )
+            self.forget_principal(self.database, self.username)
 
             self.physical_resource_id = self.url
             self.set_attribute("UserName", self.username)
@@ -136,7 +154,7 @@ class MSSQLUser(MSSQLResource):
             if self.allow_update:
                 self.update_user()
             else:
-                self.create()
+                self.create_user()
         except pymssql.Error as error:
             self.report_failure(error)
         finally:
@@ -155,8 +173,11 @@ class MSSQLUser(MSSQLResource):
             self.close()
 
 
-provider = MSSQLUser()
+provider = None
 
 
 def handler(request, context):
+    global provider
+    if provider is None:
+        provider = MSSQLUser()
     return provider.handle(request, context)
@@ -0,0 +1,90 @@
+"""
+validates requests against the json schemas of the providers, with the validators built once per
+process instead of on every request. When fastjsonschema is installed, a compiled validator is
+tried first; the jsonschema validator is only run to report the error, so that the error messages
+are identical to those of cfn_resource_provider.
+"""
+import logging
+from threading import Lock
+
+from cfn_resource_provider import default_injecting_validator
+from jsonschema import exceptions, validators
+
+try:
+    import fastjsonschema
+except ImportError:  # pragma: no cover
+    fastjsonschema = None
+
+log = logging.getLogger()
+
+_lock = Lock()
+_validators = {}
+_checked_validators = {}
+_compiled = {}
+
+
+def _cached(cache: dict, schema: dict, factory):
+    entry = cache.get(id(schema))
+    if entry is None or entry[0] is not schema:
+        with _lock:
+            entry = cache.get(id(schema))
+            if entry is None or entry[0] is not schema:
+                entry = (schema, factory(schema))
+                cache[id(schema)] = entry
+    return entry[1]
+
+
+def _compile(schema: dict):
+    try:
+        return fastjsonschema.compile(schema, use_default=True)
+    except Exception as e:
+        log.debug("could not compile schema, %s", e)
+        return None
+
+
+def get_validator(schema: dict):
+    """
+    returns the default injecting validator for `schema`, built once.
+    """
+    return _cached(_validators, schema, default_injecting_validator.validator)
+
+
+def get_compiled_validator(schema: dict):
+    """
+    returns the compiled validator for `schema` or None, if fastjsonschema is not available.
+    """
+    if fastjsonschema is None:
+        return None
+    return _cached(_compiled, schema, _compile)
+
+
+def validate(instance, schema: dict):
+    """
+    validates `instance` against `schema`, inserting default values when required. Same as
+    cfn_resource_provider.default_injecting_validator.validate.
+    """
+    compiled = get_compiled_validator(schema)
+    if compiled:
+        try:
+            compiled(instance)
+            return
+        except fastjsonschema.JsonSchemaException:
+            pass
+
+    get_validator(schema).validate(instance)
+
+
+def _checked_validator(schema: dict):
+    cls = validators.validator_for(schema)
+    cls.check_schema(schema)
+    return cls(schema)
+
+
+def validate_best_match(instance, schema: dict):
+    """
+    validates `instance` against `schema`, reporting the best matching error. Same as jsonschema.validate.
+    """
+    validator = _cached(_checked_validators, schema, _checked_validator)
+    error = exceptions.best_match(validator.iter_errors(instance))
+    if error is not None:
+        raise error
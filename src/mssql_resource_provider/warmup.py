@@ -0,0 +1,67 @@
+"""
+opens the connections to the database servers during the init phase of the Lambda, which is free
+with provisioned concurrency. The servers are read from the environment variable WARMUP_SERVERS,
+a json list of objects with the same properties as the `Server` of a resource:
+
+    [{"URL": "mssql://sa@db.example.com:1433/master", "PasswordParameterName": "/db/sa"}]
+
+Failures are logged and ignored: the request will connect as usual. A server which does not answer
+within `login_timeout` seconds is skipped, so it cannot exceed the time limit of the init phase,
+unless the URL sets a login_timeout of its own.
+"""
+
+import json
+import logging
+import os
+import socket
+from typing import List
+
+from mssql_resource_provider import connection_info, connection_pool
+
+log = logging.getLogger()
+
+# seconds to wait for a server to accept the login, well within the 10 second init phase
+login_timeout = 3
+
+
+def warm_up(servers: List[dict], ssm=None):
+    """
+    resolves the host names, fetches the passwords and opens a pooled session for each of `servers`.
+    """
+    ssm = ssm if ssm else connection_info.default_ssm_client
+    names = [
+        s["PasswordParameterName"] for s in servers if s.get("PasswordParameterName")
+    ]
+    try:
+        if names:
+            connection_info.get_ssm_passwords(ssm, names)
+    except Exception as e:
+        log.warning("warm up failed to fetch the passwords, %s", e)
+        return
+
+    for server in servers:
+        try:
+            info = connection_info.from_url(
+                server["URL"], connection_info._get_password_from_dict(server, ssm)
+            )
+            socket.getaddrinfo(info["host"], info["port"], type=socket.SOCK_STREAM)
+            connection = connection_pool.acquire(info, login_timeout=login_timeout)
+            connection_pool.release(info, connection)
+            log.info("warmed up connection to %s", info["host"])
+        except Exception as e:
+            log.warning("warm up of %s failed, %s", server.get("URL"), e)
+
+
+def from_environment():
+    """
+    warms up the servers in the environment variable WARMUP_SERVERS, if set.
+    """
+    value = os.getenv("WARMUP_SERVERS")
+    if not value:
+        return
+    try:
+        servers = json.loads(value)
+    except ValueError as e:
+        log.warning("ignoring WARMUP_SERVERS, %s", e)
+        return
+    warm_up(servers if isinstance(servers, list) else [servers])
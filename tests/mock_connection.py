@@ -0,0 +1,14 @@
+from unittest.mock import MagicMock
+
+
+def mock_connect(provider) -> MagicMock:
+    """
+    replaces the connect and close of `provider` by a mock connection, and returns it. The cursor
+    of the statements is `connection.cursor.return_value.__enter__.return_value`.
+    """
+    connection = MagicMock()
+    provider.connect = MagicMock(
+        side_effect=lambda autocommit=False: setattr(provider, "connection", connection)
+    )
+    provider.close = MagicMock()
+    return connection
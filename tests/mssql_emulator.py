@@ -0,0 +1,1261 @@
+"""
+an in-process emulation of a SQL Server on RDS behind the pymssql interface, to run the provider
+tests without a server. It models the catalog views sys.databases, sys.server_principals,
+sys.sql_logins, sys.database_principals and sys.database_permissions, and executes exactly the
+DDL of the providers, including rdsadmin.dbo.rds_modify_db_name, and the simple queries of the
+tests. Any other statement fails with a syntax error.
+
+The parameterized catalog lookups of the providers are not executed: they are recognized by their
+exact statement text and answered from the model, see `Server.lookups`. Their T-SQL only runs
+against a real server, in test_catalog_lookups.py with MSSQL_LIVE set.
+
+A test module runs against the emulator with:
+
+    import mssql_emulator
+
+    def setUpModule():
+        mssql_emulator.start()
+
+    def tearDownModule():
+        mssql_emulator.stop()
+
+Set the environment variable MSSQL_LIVE to run the tests against the server on localhost:1444.
+"""
+
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from itertools import count
+from typing import Callable, Dict, Iterator, List, Optional
+from unittest.mock import patch
+from xml.sax.saxutils import unescape
+
+import pymssql
+from pymssql import _mssql
+
+from mssql_resource_provider import (
+    base,
+    connection_info,
+    connection_pool,
+    database,
+    login,
+)
+from mssql_resource_provider.base import MSSQLResource
+
+sa_password = "P@ssW0rd"
+
+default_data_path = "/var/opt/mssql/data/"
+
+# the names of identifiers and string literals in the patterns of the statements
+IDENT = r"(?:\[(?:[^\]]|\]\])+\]|[A-Za-z_#][\w@#$]*)"
+STRING = r"N?'(?:[^']|'')*'"
+
+
+def error(number: int, message: str, error_type=pymssql.OperationalError):
+    """
+    returns the error as raised by pymssql, with the single argument (number, message).
+    """
+    return error_type((number, message.encode("utf8")))
+
+
+def syntax_error(statement: str):
+    return error(
+        102,
+        f"Incorrect syntax near '{statement[:40]}', not supported by the emulator.",
+        pymssql.ProgrammingError,
+    )
+
+
+def identifier(token: str) -> str:
+    if token.startswith("["):
+        return token[1:-1].replace("]]", "]")
+    return token
+
+
+def string(token: str) -> str:
+    return token[token.index("'") + 1 : -1].replace("''", "'")
+
+
+def same(a, b) -> bool:
+    """
+    compares like the case insensitive default collation.
+    """
+    if isinstance(a, str) and isinstance(b, str):
+        return a.casefold() == b.casefold()
+    return a == b
+
+
+def statement(pattern: str):
+    """
+    compiles the statement `pattern`, in which a space matches any whitespace and an optional space
+    matches optional whitespace.
+    """
+    pattern = pattern.replace(" ?", r"\s*").replace(" ", r"\s+")
+    return re.compile(pattern, re.IGNORECASE | re.DOTALL)
+
+
+def split(sql: str, separator: str = ";") -> List[str]:
+    """
+    splits `sql` on the `separator` outside of literals, identifiers, parentheses and blocks.
+    """
+    parts, start, depth, i = [], 0, 0, 0
+    while i < len(sql):
+        c = sql[i]
+        if c == "'":
+            i = sql.index("'", i + 1)
+            while sql[i + 1 : i + 2] == "'":
+                i = sql.index("'", i + 2)
+        elif c == "[":
+            i = sql.index("]", i + 1)
+            while sql[i + 1 : i + 2] == "]":
+                i = sql.index("]", i + 2)
+        elif c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+        elif c.isalpha() and (
+            i == 0 or not (sql[i - 1].isalnum() or sql[i - 1] in "_@#.")
+        ):
+            word = re.match(r"\w+", sql[i:]).group(0).upper()
+            if word == "BEGIN":
+                depth += 1
+            elif word == "END":
+                depth -= 1
+            i += len(word)
+            continue
+        elif c == separator and depth == 0:
+            parts.append(sql[start:i])
+            start = i + 1
+        i += 1
+    parts.append(sql[start:])
+    return [p.strip() for p in parts if p.strip()]
+
+
+def split_top_level(sql: str, pattern: str) -> List[str]:
+    """
+    splits `sql` on the keyword `pattern` outside of literals and parentheses.
+    """
+    marker = "\x00"
+    masked, depth, i = list(sql), 0, 0
+    while i < len(sql):
+        c = sql[i]
+        if c == "'":
+            end = sql.index("'", i + 1)
+            while sql[end + 1 : end + 2] == "'":
+                end = sql.index("'", end + 2)
+            masked[i : end + 1] = marker * (end + 1 - i)
+            i = end
+        elif c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+        elif depth > 0:
+            masked[i] = marker
+        i += 1
+    parts, start = [], 0
+    for match in statement(pattern).finditer("".join(masked)):
+        parts.append(sql[start : match.start()])
+        start = match.end()
+    parts.append(sql[start:])
+    return [p.strip() for p in parts]
+
+
+def pages(value: str) -> int:
+    return database.size_in_pages(value.upper())
+
+
+@dataclass
+class Login:
+    name: str
+    principal_id: int
+    sid: bytes
+    password: str
+    default_database: str = "master"
+
+
+@dataclass
+class User:
+    name: str
+    principal_id: int
+    sid: Optional[bytes]
+    default_schema: Optional[str] = "dbo"
+    type: str = "S"
+
+
+@dataclass
+class File:
+    name: str
+    type_desc: str
+    filegroup: Optional[str]
+    size: int = 1024
+    growth: int = 8192
+    is_percent_growth: bool = False
+    max_size: int = -1
+
+
+class Names(dict):
+    """
+    the objects with a `name`, by their case insensitive name.
+    """
+
+    def get(self, name, default=None):
+        return super().get(name.casefold(), default) if name else default
+
+    def add(self, item):
+        self[item.name.casefold()] = item
+
+    def remove(self, name: str):
+        return self.pop(name.casefold())
+
+
+@dataclass
+class Database:
+    name: str
+    database_id: int
+    state_desc: str = "ONLINE"
+    recovery_model: str = "FULL"
+    users: Names = field(default_factory=Names)
+    permissions: set = field(default_factory=set)
+    filegroups: Dict[str, str] = field(default_factory=dict)
+    files: List[File] = field(default_factory=list)
+    principal_ids: Iterator[int] = field(default_factory=lambda: count(5))
+
+    def __post_init__(self):
+        for principal_id, name, sid, kind in [
+            (1, "dbo", b"\x01", "S"),
+            (2, "guest", b"\x00", "S"),
+            (3, "INFORMATION_SCHEMA", None, "S"),
+            (4, "sys", None, "S"),
+        ]:
+            self.users.add(User(name, principal_id, sid, None, kind))
+        self.filegroups["PRIMARY"] = "FG"
+        self.files.extend(
+            [
+                File(self.name, "ROWS", "PRIMARY"),
+                File(f"{self.name}_log", "LOG", None, 1024, 10, True, 268435456),
+            ]
+        )
+
+
+class Server:
+    """
+    the state of the emulated server, shared by all its connections.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.database_ids = count(1)
+        self.principal_ids = count(256)
+        self.spids = count(51)
+        self.databases = Names()
+        self.logins = Names()
+        self.sessions: List["Connection"] = []
+        for name in ["master", "tempdb", "model", "msdb", "rdsadmin"]:
+            self.databases.add(Database(name, next(self.database_ids)))
+        self.logins.add(Login("sa", 1, b"\x01", sa_password))
+        # the lookups answered by statement text, without running their T-SQL
+        self.lookups = {
+            base.identity_statement: self.identity,
+            base.identities_statement: self.identities,
+            login.login_state_statement: self.login_state,
+            database.database_state_statement: self.database_state,
+            database.database_files_statement: self.database_files,
+        }
+
+    def connect(
+        self,
+        server: str = ".",
+        user: str = None,
+        password: str = None,
+        database: str = "",
+        autocommit: bool = False,
+        **kwargs,
+    ) -> "Connection":
+        with self.lock:
+            account = self.logins.get(user)
+            if not account or account.password != password:
+                raise pymssql.OperationalError(
+                    (18456, f"Login failed for user '{user}'.".encode("utf8"))
+                )
+            name = database if database else account.default_database
+            current = self.databases.get(name)
+            if not current or not (
+                account.principal_id == 1
+                or current.name in ["master", "tempdb", "msdb"]
+                or any(u.sid == account.sid for u in current.users.values())
+            ):
+                raise pymssql.OperationalError(
+                    (
+                        4060,
+                        f'Cannot open database "{name}" requested by the login. '
+                        "The login failed.".encode("utf8"),
+                    )
+                )
+            connection = Connection(self, account, current, autocommit)
+            self.sessions.append(connection)
+            return connection
+
+    def connect_mssql(self, **kwargs) -> "MSSQLConnection":
+        return MSSQLConnection(self.connect(autocommit=True, **kwargs))
+
+    def identity(self, session, database, username, login_name) -> list:
+        current = self.databases.get(database)
+        principal = None
+        if current and username:
+            principal = current.users.get(username)
+        elif login_name:
+            principal = self.logins.get(login_name)
+        return [
+            (
+                current.database_id if current else None,
+                principal.principal_id if principal else None,
+                principal.sid if principal else None,
+            )
+        ]
+
+    def identities(self, session, database, names) -> list:
+        current = self.databases.get(database)
+        rows = []
+        for name in map(unescape, re.findall(r"<n>(.*?)</n>", names)):
+            user = current.users.get(name) if current else None
+            rows.append(
+                (
+                    name,
+                    current.database_id if current else None,
+                    user.principal_id if user else None,
+                    user.sid if user else None,
+                )
+            )
+        return rows
+
+    def login_state(self, session, login_name, password) -> list:
+        account = self.logins.get(login_name)
+        if not account:
+            return []
+        return [
+            (
+                account.default_database,
+                int(account.password == password),
+                account.principal_id,
+                account.sid,
+            )
+        ]
+
+    def database_state(self, session, name, job_name) -> list:
+        current = self.databases.get(name)
+        return [(current.state_desc if current else None, None)]
+
+    def database_files(self, session, database) -> list:
+        current = self.require_database(database)
+        used = {f.filegroup for f in current.files}
+        rows = [
+            (current.recovery_model, name, kind, None, None, None, None, None, None)
+            for name, kind in current.filegroups.items()
+            if name not in used
+        ]
+        for f in current.files:
+            rows.append(
+                (
+                    current.recovery_model,
+                    f.filegroup,
+                    current.filegroups.get(f.filegroup),
+                    f.name,
+                    f.type_desc,
+                    f.size,
+                    f.growth,
+                    f.is_percent_growth,
+                    f.max_size,
+                )
+            )
+        return rows
+
+    def require_not_in_use(self, current: Database, number: int, message: str):
+        """
+        raises the error `number` if a session is using the database `current`.
+        """
+        if any(s.database is current for s in self.sessions):
+            raise error(number, message)
+
+    def require_database(self, name: str) -> Database:
+        current = self.databases.get(name)
+        if not current:
+            raise error(
+                911,
+                f"Database '{name}' does not exist. Make sure that the name is entered correctly.",
+            )
+        return current
+
+    def views(self, session: "Connection", name: str) -> List[dict]:
+        """
+        returns the rows of the catalog view `name`, qualified with a database or not.
+        """
+        parts = [identifier(p) for p in re.findall(IDENT, name)]
+        view = ".".join(parts[-2:]).lower()
+        current = (
+            self.require_database(parts[0]) if len(parts) == 3 else session.database
+        )
+        if view == "sys.databases":
+            return [
+                {
+                    "name": d.name,
+                    "database_id": d.database_id,
+                    "state_desc": d.state_desc,
+                    "recovery_model_desc": d.recovery_model,
+                }
+                for d in self.databases.values()
+            ]
+        if view in ["sys.server_principals", "sys.sql_logins"]:
+            return [
+                {
+                    "name": l.name,
+                    "principal_id": l.principal_id,
+                    "sid": l.sid,
+                    "type": "S",
+                    "type_desc": "SQL_LOGIN",
+                    "default_database_name": l.default_database,
+                }
+                for l in self.logins.values()
+            ]
+        if view == "sys.database_principals":
+            return [
+                {
+                    "name": u.name,
+                    "principal_id": u.principal_id,
+                    "sid": u.sid,
+                    "type": u.type,
+                    "default_schema_name": u.default_schema,
+                }
+                for u in current.users.values()
+            ]
+        if view == "sys.database_permissions":
+            return [
+                {
+                    "class": 0,
+                    "class_desc": "DATABASE",
+                    "major_id": 0,
+                    "grantee_principal_id": principal_id,
+                    "grantor_principal_id": 1,
+                    "permission_name": permission,
+                    "state": "G",
+                    "state_desc": "GRANT",
+                }
+                for principal_id, permission in sorted(current.permissions)
+            ]
+        if view == "sys.dm_exec_sessions":
+            return [
+                {
+                    "session_id": s.spid,
+                    "login_name": s.login.name,
+                    "database_id": s.database.database_id,
+                }
+                for s in self.sessions
+            ]
+        raise error(208, f"Invalid object name '{name}'.", pymssql.ProgrammingError)
+
+
+class Connection:
+    """
+    a session on the emulated server, with the interface of a pymssql connection. In a transaction,
+    every change records its undo, which is applied on rollback.
+    """
+
+    def __init__(self, server: Server, account: Login, current: Database, autocommit):
+        self.server = server
+        self.login = account
+        self.database = current
+        self._autocommit = autocommit
+        self.spid = next(server.spids)
+        self.variables = {}
+        self.journal: List[Callable] = []
+        self.killed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def autocommit(self, status: bool):
+        if status:
+            self.commit()
+        self._autocommit = status
+
+    def cursor(self, *args, **kwargs) -> "Cursor":
+        return Cursor(self)
+
+    def commit(self):
+        self.journal = []
+
+    def rollback(self):
+        with self.server.lock:
+            for undo in reversed(self.journal):
+                undo()
+            self.journal = []
+
+    def close(self):
+        with self.server.lock:
+            self.rollback()
+            if self in self.server.sessions:
+                self.server.sessions.remove(self)
+
+    def change(self, do: Callable, undo: Callable):
+        do()
+        if not self._autocommit:
+            self.journal.append(undo)
+
+    def check_alive(self):
+        if self.killed or self not in self.server.sessions:
+            raise error(20047, "DBPROCESS is dead or not enabled")
+
+    def not_in_transaction(self, statement: str):
+        if not self._autocommit:
+            raise error(
+                226,
+                f"{statement} statement not allowed within multi-statement transaction.",
+            )
+
+    def execute(self, operation: str, params=None) -> list:
+        with self.server.lock:
+            self.check_alive()
+            lookup = self.server.lookups.get(operation)
+            if lookup:
+                return lookup(self, **params)
+            if params is not None:
+                operation = _mssql.substitute_params(operation, params).decode("utf8")
+            return self.run_batch(operation)
+
+    def callproc(self, name: str, params: tuple) -> list:
+        with self.server.lock:
+            self.check_alive()
+            return self.run_procedure(name, list(params))
+
+    def run_batch(self, sql: str) -> list:
+        if statement(r"\s*CREATE (OR ALTER )?PROC").match(sql):
+            # procedures are not emulated, rdsadmin.dbo.rds_modify_db_name is built in
+            return []
+        result = None
+        for part in split(sql):
+            rows = self.run(part)
+            if result is None:
+                result = rows
+        return result or []
+
+    def run(self, sql: str) -> Optional[list]:
+        for pattern, handler in statements:
+            match = pattern.fullmatch(sql)
+            if match:
+                return handler(self, **match.groupdict())
+        raise syntax_error(sql)
+
+    def value(self, expression: str, row: dict = None):
+        """
+        returns the value of the `expression`, in which column names refer to the `row`.
+        """
+        expression = expression.strip()
+        terms = split_top_level(expression, r" ?\+ ?")
+        if len(terms) > 1:
+            values = [self.value(t, row) for t in terms]
+            if any(v is None for v in values):
+                return None
+            return "".join(str(v) for v in values)
+
+        if re.fullmatch(STRING, expression):
+            return string(expression)
+        if re.fullmatch(r"-?[0-9]+", expression):
+            return int(expression)
+        if re.fullmatch(r"0x[0-9A-Fa-f]*", expression):
+            return bytes.fromhex(expression[2:])
+        if expression.upper() == "NULL":
+            return None
+        if expression.upper() == "@@SPID":
+            return self.spid
+        if expression.startswith("@"):
+            return self.variables[expression[1:].lower()]
+        if expression.startswith("("):
+            rows = self.select(expression[1:-1].strip()[len("SELECT") :])
+            return rows[0][0] if rows else None
+
+        call = re.fullmatch(r"(\w+)\s*\((.*)\)", expression, re.DOTALL)
+        if call:
+            return self.function(call.group(1).upper(), call.group(2), row)
+
+        if row is not None:
+            column = identifier(re.findall(IDENT, expression)[-1]).lower()
+            if column in row:
+                return row[column]
+        raise syntax_error(expression)
+
+    def function(self, name: str, arguments: str, row: dict):
+        if name == "CAST":
+            value, _ = split_top_level(arguments, " AS ")
+            value = self.value(value, row)
+            return None if value is None else str(value)
+        args = [self.value(a, row) for a in split(arguments, ",")]
+        server = self.server
+        if name == "DB_ID":
+            current = server.databases.get(args[0]) if args else self.database
+            return current.database_id if current else None
+        if name == "DB_NAME":
+            return self.database.name
+        if name == "SUSER_ID":
+            account = server.logins.get(args[0])
+            return account.principal_id if account else None
+        if name == "DATABASE_PRINCIPAL_ID":
+            user = self.database.users.get(args[0])
+            return user.principal_id if user else None
+        if name == "USER_NAME":
+            users = [
+                u for u in self.database.users.values() if u.principal_id == args[0]
+            ]
+            return users[0].name if users else None
+        if name == "QUOTENAME":
+            return "[" + args[0].replace("]", "]]") + "]"
+        if name == "REPLACE":
+            return args[0].replace(args[1], args[2])
+        if name == "SERVERPROPERTY" and args[0] == "InstanceDefaultDataPath":
+            return default_data_path
+        raise syntax_error(f"{name}(")
+
+    def condition(self, expression: str, row: dict = None) -> bool:
+        """
+        evaluates the search condition `expression` with AND, =, <>, IN, IS NULL and EXISTS.
+        """
+        terms = split_top_level(expression, r" AND ")
+        if len(terms) > 1:
+            return all(self.condition(t, row) for t in terms)
+
+        match = statement(r"(NOT )?EXISTS ?\((.*)\)").fullmatch(expression)
+        if match:
+            rows = self.select(match.group(2).strip()[len("SELECT") :])
+            return bool(rows) != bool(match.group(1))
+
+        match = statement(r"(.*?) IS (NOT )?NULL").fullmatch(expression)
+        if match:
+            return (self.value(match.group(1), row) is None) != bool(match.group(2))
+
+        match = statement(r"(.*?) IN ?\((.*)\)").fullmatch(expression)
+        if match:
+            value = self.value(match.group(1), row)
+            return any(
+                same(value, self.value(v, row)) for v in split(match.group(2), ",")
+            )
+
+        for operator in ["<>", "="]:
+            parts = split_top_level(expression, rf" ?{operator} ?")
+            if len(parts) == 2:
+                left, right = self.value(parts[0], row), self.value(parts[1], row)
+                if left is None or right is None:
+                    return False
+                return same(left, right) != (operator == "<>")
+        raise syntax_error(expression)
+
+    def select(self, body: str) -> list:
+        """
+        runs `SELECT body` on at most a single catalog view, with or without variable assignments.
+        """
+        match = statement(
+            r"\s*(?P<items>.*?)(?: FROM (?P<view>[\w.\[\]]+)(?: (?!WHERE\b)\w+)?)?(?: WHERE (?P<where>.*))?\s*"
+        ).fullmatch(body)
+        if not match:
+            raise syntax_error(body)
+
+        rows = [None]
+        if match.group("view"):
+            rows = self.server.views(self, match.group("view"))
+        if match.group("where"):
+            rows = [r for r in rows if self.condition(match.group("where"), r)]
+
+        items = split(match.group("items"), ",")
+        assignments = [re.match(r"@(\w+)\s*=(?!=)\s*(.*)", i, re.DOTALL) for i in items]
+        if all(assignments):
+            for row in rows:
+                for assignment in assignments:
+                    name, expression = assignment.groups()
+                    self.variables[name.lower()] = self.value(expression, row)
+            return None
+
+        if items == ["*"]:
+            return [tuple(row.values()) for row in rows]
+        return [tuple(self.value(i, row) for i in items) for row in rows]
+
+    def run_procedure(self, name: str, args: list) -> list:
+        if name.lower() != "rdsadmin.dbo.rds_modify_db_name":
+            raise error(2812, f"Could not find stored procedure '{name}'.")
+        old_name, new_name = args
+        current = self.server.require_database(old_name)
+        if self.server.databases.get(new_name):
+            raise error(
+                1801,
+                f"Database '{new_name}' already exists. Choose a different database name.",
+            )
+        self.server.require_not_in_use(
+            current,
+            5030,
+            "The database could not be exclusively locked to perform the operation.",
+        )
+
+        def rename(old, new):
+            self.server.databases.remove(old)
+            current.name = new
+            self.server.databases.add(current)
+
+        self.change(
+            lambda: rename(current.name, new_name),
+            lambda: rename(new_name, old_name),
+        )
+        return []
+
+    def kill(self, session: "Connection"):
+        session.rollback()
+        session.killed = True
+        self.server.sessions.remove(session)
+
+
+def options(clauses: str) -> Dict[str, str]:
+    """
+    returns the `NAME = value` clauses of a WITH, by their upper case name.
+    """
+    result = {}
+    for clause in split(clauses, ","):
+        name, value = re.fullmatch(r"(\w+)\s*=\s*(.*)", clause, re.DOTALL).groups()
+        result[name.upper()] = value.strip()
+    return result
+
+
+def no_op(session: Connection, **kwargs):
+    return None
+
+
+def use(session: Connection, database):
+    session.database = session.server.require_database(identifier(database))
+
+
+def select(session: Connection, body):
+    return session.select(body)
+
+
+def if_statement(session: Connection, body):
+    match = statement(
+        r"((?:NOT )?EXISTS ?\(.*?\)) ((?:BEGIN|CREATE|DROP|ALTER).*)"
+    ).fullmatch(body) or statement(r"(.*? IS (?:NOT )?NULL) (.*)").fullmatch(body)
+    if not match:
+        raise syntax_error(body)
+    condition, then = match.groups()
+    if session.condition(condition):
+        block = statement(r"BEGIN (.*) END").fullmatch(then)
+        return session.run_batch(block.group(1)) if block else session.run(then)
+    return None
+
+
+def declare(session: Connection, declarations):
+    for declaration in split(declarations, ","):
+        match = re.fullmatch(
+            r"@(\w+)\s+[\w()]+(?:\s*=\s*(.*))?", declaration, re.DOTALL
+        )
+        if not match:
+            raise syntax_error(declaration)
+        name, expression = match.groups()
+        session.variables[name.lower()] = (
+            session.value(expression) if expression else None
+        )
+
+
+def execute_dynamic(session: Connection, expression):
+    return session.run_batch(session.value(expression))
+
+
+def execute_procedure(session: Connection, procedure, arguments):
+    return session.run_procedure(
+        procedure, [session.value(a) for a in split(arguments, ",")]
+    )
+
+
+def kill(session: Connection, spid):
+    for other in list(session.server.sessions):
+        if other.spid == int(spid):
+            session.kill(other)
+
+
+def create_database(session: Connection, name):
+    session.not_in_transaction("CREATE DATABASE")
+    name = identifier(name)
+    server = session.server
+    if server.databases.get(name):
+        raise error(
+            1801, f"Database '{name}' already exists. Choose a different database name."
+        )
+    server.databases.add(Database(name, next(server.database_ids)))
+
+
+def drop_database(session: Connection, if_exists, name):
+    session.not_in_transaction("DROP DATABASE")
+    name = identifier(name)
+    server = session.server
+    if not server.databases.get(name):
+        if if_exists:
+            return
+        raise error(
+            3701,
+            f"Cannot drop the database '{name}', because it does not exist or you do not have permission.",
+        )
+    server.require_not_in_use(
+        server.databases.get(name),
+        3702,
+        f'Cannot drop database "{name}" because it is currently in use.',
+    )
+    server.databases.remove(name)
+
+
+def set_single_user(session: Connection, name):
+    session.not_in_transaction("ALTER DATABASE")
+    current = session.server.require_database(identifier(name))
+    for other in list(session.server.sessions):
+        if other is not session and other.database is current:
+            session.kill(other)
+
+
+def set_recovery(session: Connection, name, model):
+    session.not_in_transaction("ALTER DATABASE")
+    current = session.server.require_database(identifier(name))
+    current.recovery_model = model.upper()
+
+
+def file_option(f: File, option: str, value: str):
+    value = value.upper()
+    if option == "SIZE":
+        f.size = pages(value)
+    elif option == "FILEGROWTH":
+        f.is_percent_growth = value.endswith("%")
+        f.growth = int(value[:-1]) if f.is_percent_growth else pages(value)
+    elif option == "MAXSIZE":
+        f.max_size = -1 if value == "UNLIMITED" else pages(value)
+
+
+def modify_file(session: Connection, name, file, option, value):
+    session.not_in_transaction("ALTER DATABASE")
+    current = session.server.require_database(identifier(name))
+    file = string(file)
+    files = [f for f in current.files if same(f.name, file)]
+    if not files:
+        raise error(5041, f"MODIFY FILE failed. File '{file}' does not exist.")
+    file_option(files[0], option.upper(), value)
+
+
+def add_filegroup(session: Connection, name, filegroup, memory_optimized):
+    session.not_in_transaction("ALTER DATABASE")
+    current = session.server.require_database(identifier(name))
+    filegroup = identifier(filegroup)
+    if filegroup in current.filegroups:
+        raise error(1828, f"The filegroup name '{filegroup}' already exists.")
+    current.filegroups[filegroup] = "FX" if memory_optimized else "FG"
+
+
+def add_file(session: Connection, name, file, filename, file_options, filegroup):
+    session.not_in_transaction("ALTER DATABASE")
+    current = session.server.require_database(identifier(name))
+    filegroup = identifier(filegroup)
+    if filegroup not in current.filegroups:
+        raise error(1826, f"User-defined filegroup '{filegroup}' does not exist.")
+    f = File(string(file), "ROWS", filegroup)
+    for option, value in options(file_options or "").items():
+        file_option(f, option, value)
+    current.files.append(f)
+
+
+def create_login(session: Connection, name, clauses):
+    server = session.server
+    name = identifier(name)
+    clauses = options(clauses)
+    if server.logins.get(name):
+        raise error(15025, f"The server principal '{name}' already exists.")
+    sid = session.value(clauses["SID"]) if "SID" in clauses else os.urandom(16)
+    if any(l.sid == sid for l in server.logins.values()):
+        raise error(15433, "Supplied parameter sid is in use.")
+    account = Login(
+        name,
+        next(server.principal_ids),
+        sid,
+        session.value(clauses["PASSWORD"]),
+        identifier(clauses.get("DEFAULT_DATABASE", "master")),
+    )
+    session.change(
+        lambda: server.logins.add(account), lambda: server.logins.remove(name)
+    )
+
+
+def alter_login(session: Connection, name, clauses):
+    server = session.server
+    account = server.logins.get(identifier(name))
+    if not account:
+        raise error(
+            15151,
+            f"Cannot alter the login '{identifier(name)}', because it does not exist or you do not have permission.",
+        )
+    clauses = options(clauses)
+    new_name = identifier(clauses.get("NAME", account.name))
+    if not same(new_name, account.name) and server.logins.get(new_name):
+        raise error(15025, f"The server principal '{new_name}' already exists.")
+
+    old = (account.name, account.password, account.default_database)
+    new = (
+        new_name,
+        (
+            session.value(clauses["PASSWORD"])
+            if "PASSWORD" in clauses
+            else account.password
+        ),
+        identifier(clauses.get("DEFAULT_DATABASE", account.default_database)),
+    )
+
+    def update(values):
+        server.logins.remove(account.name)
+        account.name, account.password, account.default_database = values
+        server.logins.add(account)
+
+    session.change(lambda: update(new), lambda: update(old))
+
+
+def drop_login(session: Connection, name):
+    server = session.server
+    name = identifier(name)
+    account = server.logins.get(name)
+    if not account:
+        raise error(
+            15151,
+            f"Cannot drop the login '{name}', because it does not exist or you do not have permission.",
+        )
+    if any(s.login is account for s in server.sessions):
+        raise error(
+            15434, f"Could not drop login '{name}' as the user is currently logged in."
+        )
+    session.change(
+        lambda: server.logins.remove(account.name),
+        lambda: server.logins.add(account),
+    )
+
+
+def create_user(session: Connection, name, login_name, clauses):
+    current = session.database
+    name = identifier(name)
+    login_name = identifier(login_name) if login_name else name
+    clauses = options(clauses or "")
+    if current.users.get(name):
+        raise error(
+            15023,
+            f"User, group, or role '{name}' already exists in the current database.",
+        )
+    account = session.server.logins.get(login_name)
+    if not account:
+        raise error(
+            15007, f"'{login_name}' is not a valid login or you do not have permission."
+        )
+    if any(u.sid == account.sid for u in current.users.values()):
+        raise error(
+            15063, "The login already has an account under a different user name."
+        )
+    user = User(
+        name,
+        next(current.principal_ids),
+        account.sid,
+        identifier(clauses.get("DEFAULT_SCHEMA", "[dbo]")),
+    )
+    session.change(lambda: current.users.add(user), lambda: current.users.remove(name))
+
+
+def alter_user(session: Connection, name, clauses):
+    current = session.database
+    user = current.users.get(identifier(name))
+    if not user:
+        raise error(
+            15151,
+            f"Cannot alter the user '{identifier(name)}', because it does not exist or you do not have permission.",
+        )
+    clauses = options(clauses)
+    new_name = identifier(clauses.get("NAME", user.name))
+    if not same(new_name, user.name) and current.users.get(new_name):
+        raise error(
+            15023,
+            f"User, group, or role '{new_name}' already exists in the current database.",
+        )
+    sid = user.sid
+    if "LOGIN" in clauses:
+        account = session.server.logins.get(identifier(clauses["LOGIN"]))
+        if not account:
+            raise error(
+                15007,
+                f"'{identifier(clauses['LOGIN'])}' is not a valid login or you do not have permission.",
+            )
+        sid = account.sid
+
+    old = (user.name, user.sid, user.default_schema)
+    new = (
+        new_name,
+        sid,
+        identifier(clauses.get("DEFAULT_SCHEMA", f"[{user.default_schema}]")),
+    )
+
+    def update(values):
+        current.users.remove(user.name)
+        user.name, user.sid, user.default_schema = values
+        current.users.add(user)
+
+    session.change(lambda: update(new), lambda: update(old))
+
+
+def drop_user(session: Connection, if_exists, name):
+    current = session.database
+    name = identifier(name)
+    user = current.users.get(name)
+    if not user:
+        if if_exists:
+            return
+        raise error(
+            15151,
+            f"Cannot drop the user '{name}', because it does not exist or you do not have permission.",
+        )
+    granted = {p for p in current.permissions if p[0] == user.principal_id}
+
+    def drop():
+        current.users.remove(user.name)
+        current.permissions.difference_update(granted)
+
+    def undo():
+        current.users.add(user)
+        current.permissions.update(granted)
+
+    session.change(drop, undo)
+
+
+def permission_changes(session: Connection, permissions, name, principals):
+    current = session.server.require_database(identifier(name))
+    changes = set()
+    for principal in split(principals, ","):
+        user = current.users.get(identifier(principal))
+        if not user:
+            raise error(
+                15151,
+                f"Cannot find the user '{identifier(principal)}', because it does not exist or you do not have permission.",
+            )
+        for permission in split(permissions, ","):
+            changes.add((user.principal_id, " ".join(permission.upper().split())))
+    return current, changes
+
+
+def grant(session: Connection, permissions, name, principals):
+    current, changes = permission_changes(session, permissions, name, principals)
+    added = changes - current.permissions
+    session.change(
+        lambda: current.permissions.update(added),
+        lambda: current.permissions.difference_update(added),
+    )
+
+
+def revoke(session: Connection, permissions, name, principals):
+    current, changes = permission_changes(session, permissions, name, principals)
+    removed = changes & current.permissions
+    session.change(
+        lambda: current.permissions.difference_update(removed),
+        lambda: current.permissions.update(removed),
+    )
+
+
+statements = [
+    (statement(r"SET (NOCOUNT|LOCK_TIMEOUT) \S+"), no_op),
+    (statement(rf"USE (?P<database>{IDENT})"), use),
+    (statement(r"SELECT(?P<body>\s.*)"), select),
+    (statement(r"IF (?P<body>.*)"), if_statement),
+    (statement(r"DECLARE (?P<declarations>.*)"), declare),
+    (statement(r"EXEC(?:UTE)? ?\((?P<expression>.*)\)"), execute_dynamic),
+    (
+        statement(r"EXEC(?:UTE)? (?P<procedure>[\w.]+)(?P<arguments>\s.*)"),
+        execute_procedure,
+    ),
+    (statement(r"KILL (?P<spid>[0-9]+)"), kill),
+    (statement(rf"CREATE DATABASE (?P<name>{IDENT})"), create_database),
+    (
+        statement(rf"DROP DATABASE (?P<if_exists>IF EXISTS )?(?P<name>{IDENT})"),
+        drop_database,
+    ),
+    (
+        statement(
+            rf"ALTER DATABASE (?P<name>{IDENT}) SET SINGLE_USER WITH ROLLBACK IMMEDIATE"
+        ),
+        set_single_user,
+    ),
+    (
+        statement(rf"ALTER DATABASE (?P<name>{IDENT}) SET RECOVERY (?P<model>\w+)"),
+        set_recovery,
+    ),
+    (
+        statement(
+            rf"ALTER DATABASE (?P<name>{IDENT}) MODIFY FILE ?\(NAME = (?P<file>{STRING}), ?(?P<option>\w+) = (?P<value>[^)]+)\)"
+        ),
+        modify_file,
+    ),
+    (
+        statement(
+            rf"ALTER DATABASE (?P<name>{IDENT}) ADD FILEGROUP (?P<filegroup>{IDENT})(?P<memory_optimized> CONTAINS MEMORY_OPTIMIZED_DATA)?"
+        ),
+        add_filegroup,
+    ),
+    (
+        statement(
+            rf"ALTER DATABASE (?P<name>{IDENT}) ADD FILE ?\(NAME = (?P<file>{STRING}), ?FILENAME = (?P<filename>{STRING})(?:, ?(?P<file_options>[^)]*))?\) TO FILEGROUP (?P<filegroup>{IDENT})"
+        ),
+        add_file,
+    ),
+    (statement(rf"CREATE LOGIN (?P<name>{IDENT}) WITH (?P<clauses>.*)"), create_login),
+    (statement(rf"ALTER LOGIN (?P<name>{IDENT}) WITH (?P<clauses>.*)"), alter_login),
+    (statement(rf"DROP LOGIN (?P<name>{IDENT})"), drop_login),
+    (
+        statement(
+            rf"CREATE USER (?P<name>{IDENT})(?: (?:FOR|FROM) LOGIN (?P<login_name>{IDENT}))?(?: WITH (?P<clauses>.*))?"
+        ),
+        create_user,
+    ),
+    (statement(rf"ALTER USER (?P<name>{IDENT}) WITH (?P<clauses>.*)"), alter_user),
+    (
+        statement(rf"DROP USER (?P<if_exists>IF EXISTS )?(?P<name>{IDENT})"),
+        drop_user,
+    ),
+    (
+        statement(
+            rf"GRANT (?P<permissions>[\w ,]+?) ON DATABASE::(?P<name>{IDENT}) TO (?P<principals>.*)"
+        ),
+        grant,
+    ),
+    (
+        statement(
+            rf"REVOKE (?P<permissions>[\w ,]+?) ON DATABASE::(?P<name>{IDENT}) FROM (?P<principals>.*)"
+        ),
+        revoke,
+    ),
+]
+
+
+class Cursor:
+    def __init__(self, connection: Connection):
+        self.connection = connection
+        self.rows = []
+        self.rowcount = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def execute(self, operation: str, params=None):
+        self.rows = list(self.connection.execute(operation, params))
+        self.rowcount = len(self.rows)
+
+    def callproc(self, name: str, params=()):
+        self.rows = self.connection.callproc(name, params)
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def close(self):
+        self.rows = []
+
+
+class MSSQLConnection:
+    """
+    the interface of a pymssql._mssql connection.
+    """
+
+    def __init__(self, connection: Connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def execute_non_query(self, sql: str, params=None):
+        self.connection.execute(sql, params)
+
+    def execute_scalar(self, sql: str, params=None):
+        rows = self.connection.execute(sql, params)
+        return rows[0][0] if rows else None
+
+    def close(self):
+        self.connection.close()
+
+
+class ParameterStore:
+    """
+    the SSM parameters used by the tests, with the interface of the boto3 ssm client.
+    """
+
+    def __init__(self):
+        self.parameters = {}
+
+    def put_parameter(self, Name, Value, **kwargs):
+        self.parameters[Name] = Value
+
+    def delete_parameter(self, Name):
+        self.parameters.pop(Name, None)
+
+    def get_parameters(self, Names, WithDecryption=False):
+        return {
+            "Parameters": [
+                {"Name": n, "Value": self.parameters[n]}
+                for n in Names
+                if n in self.parameters
+            ],
+            "InvalidParameters": [n for n in Names if n not in self.parameters],
+        }
+
+
+_patches = []
+
+
+def start() -> Optional[Server]:
+    """
+    directs pymssql, _mssql and the ssm clients to a new emulated server, and discards the
+    responses to CloudFormation. Does nothing if MSSQL_LIVE is set.
+    """
+    if os.getenv("MSSQL_LIVE"):
+        return None
+    import boto3
+
+    server = Server()
+    store = ParameterStore()
+    client = boto3.client
+    _patches.extend(
+        [
+            patch.object(pymssql, "connect", server.connect),
+            patch.object(_mssql, "connect", server.connect_mssql),
+            patch.object(MSSQLResource, "send_response", lambda self: None),
+            patch.object(connection_info.default_ssm_client, "_client", store),
+            patch.object(
+                boto3,
+                "client",
+                lambda name, *args, **kwargs: (
+                    store if name == "ssm" else client(name, *args, **kwargs)
+                ),
+            ),
+        ]
+    )
+    for p in _patches:
+        p.start()
+    connection_pool.clear()
+    connection_info.clear_ssm_cache()
+    return server
+
+
+def stop():
+    while _patches:
+        _patches.pop().stop()
+    connection_pool.clear()
+    connection_info.clear_ssm_cache()
@@ -0,0 +1,107 @@
+import os
+import uuid
+from unittest import TestCase
+
+import pymssql
+
+import mssql_emulator
+from mssql_resource_provider import base, database, drift, login, user
+from mssql_resource_provider.connection_info import from_url
+
+server = {"URL": "mssql://localhost:1444", "Password": "P@ssW0rd"}
+
+
+def setUpModule():
+    mssql_emulator.start()
+
+
+def tearDownModule():
+    mssql_emulator.stop()
+
+
+class CatalogLookupsTestCase(TestCase):
+    """
+    runs the parameterized catalog lookups of the providers. The emulator answers these by the
+    statement text, so with MSSQL_LIVE set, this is where their T-SQL and the quoting of the nested
+    sp_executesql calls are checked against a real server.
+    """
+
+    def setUp(self) -> None:
+        self.name = "lookup_%s" % uuid.uuid4().hex[:12]
+        self.password = "It's-S3cr3t!"
+        self.connection = pymssql.connect(
+            **from_url(server["URL"], server["Password"]), autocommit=True
+        )
+        self.addCleanup(self.connection.close)
+        self.execute(database.create_database_statement(self.name))
+        self.addCleanup(self.execute, database.drop_database_statement(self.name))
+        self.execute(login.create_login_statement(self.name, self.password, "master"))
+        self.addCleanup(self.execute, login.drop_login_statement(self.name))
+        self.execute(
+            f"USE [{self.name}];\n"
+            + user.create_user_statement(self.name, self.name, "dbo")
+            + ";\nUSE [master]"
+        )
+
+    def execute(self, statement: str):
+        with self.connection.cursor() as cursor:
+            cursor.execute(statement)
+
+    def query(self, statement: str, parameters: dict) -> list:
+        with self.connection.cursor() as cursor:
+            cursor.execute(statement, parameters)
+            return cursor.fetchall()
+
+    def test_identity(self):
+        [(database_id, principal_id, sid)] = self.query(
+            base.identity_statement,
+            {"database": self.name, "username": self.name, "login_name": None},
+        )
+        assert database_id and principal_id and sid
+
+        [(_, login_id, login_sid)] = self.query(
+            base.identity_statement,
+            {"database": None, "username": None, "login_name": self.name},
+        )
+        assert login_id and login_sid == sid
+
+    def test_identities(self):
+        rows = self.query(
+            base.identities_statement,
+            {"database": self.name, "names": f"<n>{self.name}</n><n>missing</n>"},
+        )
+        identities = {name: principal_id for name, _, principal_id, _ in rows}
+        assert identities[self.name] and identities["missing"] is None
+
+    def test_login_state(self):
+        [(default_database, match, principal_id, sid)] = self.query(
+            login.login_state_statement,
+            {"login_name": self.name, "password": self.password},
+        )
+        assert default_database == "master" and match == 1 and principal_id and sid
+
+    def test_database_state(self):
+        [(state_desc, error)] = self.query(
+            database.database_state_statement,
+            {"name": self.name, "job_name": f"cfn-mssql-{self.name}"},
+        )
+        assert state_desc == "ONLINE" and error is None
+
+    def test_database_files(self):
+        rows = self.query(database.database_files_statement, {"database": self.name})
+        files = [database.DatabaseFile(*row[1:]) for row in rows]
+        assert rows[0][0] in ["FULL", "SIMPLE"]
+        assert {f.type_desc for f in files} == {"ROWS", "LOG"}
+
+    def test_passwords(self):
+        if not os.getenv("MSSQL_LIVE"):
+            self.skipTest("the drift audit is not emulated")
+        rows = self.query(
+            drift.passwords_statement,
+            {
+                "passwords": drift.passwords_parameter(
+                    [(self.name, self.password), ("sa", "wrong")]
+                )
+            },
+        )
+        assert dict(rows) == {self.name: 1, "sa": 0}
@@ -0,0 +1,78 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from mssql_resource_provider import cfn_response, metrics
+
+
+class ResponseURL(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    statuses = []
+    received = []
+
+    def do_PUT(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        ResponseURL.received.append((self.client_address, json.loads(body)))
+        status = ResponseURL.statuses.pop(0) if ResponseURL.statuses else 200
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class CFNResponseTestCase(TestCase):
+    def setUp(self) -> None:
+        ResponseURL.statuses = []
+        ResponseURL.received = []
+        server = ThreadingHTTPServer(("127.0.0.1", 0), ResponseURL)
+        threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.url = "http://127.0.0.1:%d/" % server.server_port
+        self.metrics = metrics.RequestMetrics()
+        patcher = patch.object(cfn_response, "base_delay", 0.001)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_keep_alive(self):
+        cfn_response.put(self.url, {"Status": "SUCCESS"}, None, self.metrics)
+        cfn_response.put(self.url, {"Status": "FAILED"}, None, self.metrics)
+
+        assert [r for _, r in ResponseURL.received] == [
+            {"Status": "SUCCESS"},
+            {"Status": "FAILED"},
+        ]
+        # both responses were sent over the same connection
+        assert ResponseURL.received[0][0] == ResponseURL.received[1][0]
+        assert len(self.metrics.timings["ResponsePut"]) == 2
+
+    def test_retry(self):
+        ResponseURL.statuses = [503, 500]
+        context = MagicMock()
+        context.get_remaining_time_in_millis.return_value = 60000
+        cfn_response.put(self.url, {"Status": "SUCCESS"}, context, self.metrics)
+        assert len(ResponseURL.received) == 3
+        assert self.metrics.counts["ResponseRetries"] == 2
+
+    def test_no_retry(self):
+        ResponseURL.statuses = [403]
+        with self.assertRaises(Exception):
+            cfn_response.put(self.url, {"Status": "SUCCESS"}, None, self.metrics)
+        assert len(ResponseURL.received) == 1
+
+    def test_deadline(self):
+        ResponseURL.statuses = [503, 503]
+        context = MagicMock()
+        context.get_remaining_time_in_millis.return_value = 5000
+        with self.assertRaises(Exception):
+            cfn_response.put(self.url, {"Status": "SUCCESS"}, context, self.metrics)
+        assert len(ResponseURL.received) == 1
+
+        ResponseURL.statuses = [503] * cfn_response.max_attempts
+        with self.assertRaises(Exception):
+            cfn_response.put(self.url, {"Status": "SUCCESS"}, None, self.metrics)
+        assert len(ResponseURL.received) == 1 + cfn_response.max_attempts
@@ -0,0 +1,74 @@
+import doctest
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from botocore.exceptions import ClientError
+
+from mssql_resource_provider import connection_info
+from mssql_resource_provider.connection_info import (
+    get_ssm_password,
+    get_ssm_passwords,
+    invalidate_ssm_password,
+)
+
+
+def parameters(*names):
+    return {
+        "Parameters": [{"Name": name, "Value": f"{name}-value"} for name in names],
+        "InvalidParameters": [],
+    }
+
+
+class SSMPasswordCacheTestCase(TestCase):
+    def setUp(self) -> None:
+        connection_info.clear_ssm_cache()
+        self.ssm = MagicMock()
+
+    def test_batched_and_cached(self):
+        self.ssm.get_parameters.return_value = parameters("server", "login")
+        result = get_ssm_passwords(self.ssm, ["server", "login"])
+        assert result == {"server": "server-value", "login": "login-value"}
+        self.ssm.get_parameters.assert_called_once_with(
+            Names=["server", "login"], WithDecryption=True
+        )
+
+        assert get_ssm_password(self.ssm, "login") == "login-value"
+        assert self.ssm.get_parameters.call_count == 1
+
+    def test_invalidate(self):
+        self.ssm.get_parameters.return_value = parameters("server")
+        get_ssm_password(self.ssm, "server")
+        invalidate_ssm_password("server")
+        get_ssm_password(self.ssm, "server")
+        assert self.ssm.get_parameters.call_count == 2
+
+    def test_expiry(self):
+        self.ssm.get_parameters.return_value = parameters("server")
+        with patch.object(connection_info, "ssm_cache_ttl", -1):
+            get_ssm_password(self.ssm, "server")
+        get_ssm_password(self.ssm, "server")
+        assert self.ssm.get_parameters.call_count == 2
+
+    def test_not_found(self):
+        self.ssm.get_parameters.return_value = {
+            "Parameters": [],
+            "InvalidParameters": ["server"],
+        }
+        with self.assertRaises(ValueError):
+            get_ssm_password(self.ssm, "server")
+
+    @patch("time.sleep")
+    def test_throttling(self, sleep):
+        throttled = ClientError(
+            {"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"}},
+            "GetParameters",
+        )
+        self.ssm.get_parameters.side_effect = [throttled, parameters("server")]
+        assert get_ssm_password(self.ssm, "server") == "server-value"
+        assert sleep.call_count == 1
+
+
+class FromUrlTestCase(TestCase):
+    def test_doctests(self):
+        failures, _ = doctest.testmod(connection_info)
+        assert failures == 0
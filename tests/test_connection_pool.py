@@ -0,0 +1,100 @@
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from mssql_resource_provider import connection_pool
+from mssql_resource_provider.connection_info import from_url
+
+
+class ConnectionPoolTestCase(TestCase):
+    def setUp(self) -> None:
+        connection_pool.clear()
+        self.connection_info = from_url("mssql://localhost:1444", "P@ssW0rd")
+
+    def tearDown(self) -> None:
+        connection_pool.clear()
+
+    @patch("pymssql.connect")
+    def test_reuse(self, connect):
+        connect.side_effect = lambda **kwargs: MagicMock()
+
+        first = connection_pool.acquire(self.connection_info)
+        connect.assert_called_once_with(charset="utf8", **self.connection_info)
+        connection_pool.release(self.connection_info, first)
+
+        second = connection_pool.acquire(self.connection_info, autocommit=True)
+        assert second is first
+        assert connect.call_count == 1
+        second.rollback.assert_called_once()
+        second.autocommit.assert_called_with(True)
+
+        other = connection_pool.acquire(from_url("mssql://localhost:1444", "other"))
+        assert other is not first
+        assert connect.call_count == 2
+
+    @patch("pymssql.connect")
+    def test_park_in_master(self, connect):
+        connect.side_effect = lambda **kwargs: MagicMock()
+        connection_info = from_url("mssql://localhost:1444/appdb", "P@ssW0rd")
+
+        first = connection_pool.acquire(connection_info)
+        cursor = first.cursor.return_value.__enter__.return_value
+        connection_pool.release(connection_info, first)
+        cursor.execute.assert_called_once_with("USE [master]")
+
+        second = connection_pool.acquire(connection_info)
+        assert second is first
+        cursor.execute.assert_called_with("USE [appdb]; SELECT 1")
+
+        cursor.execute.side_effect = Exception("connection reset")
+        connection_pool.release(connection_info, second)
+        second.close.assert_called_once()
+        assert connection_pool.acquire(connection_info) is not first
+
+    @patch("pymssql.connect")
+    def test_evict_on_failed_health_check(self, connect):
+        connect.side_effect = lambda **kwargs: MagicMock()
+
+        first = connection_pool.acquire(self.connection_info)
+        connection_pool.release(self.connection_info, first)
+        first.cursor.return_value.__enter__.return_value.execute.side_effect = (
+            Exception("connection reset")
+        )
+
+        second = connection_pool.acquire(self.connection_info)
+        assert second is not first
+        first.close.assert_called_once()
+
+    @patch("pymssql.connect")
+    def test_evict_idle(self, connect):
+        connect.side_effect = lambda **kwargs: MagicMock()
+
+        first = connection_pool.acquire(self.connection_info)
+        connection_pool.release(self.connection_info, first)
+        with patch.object(connection_pool, "max_idle_time", -1):
+            second = connection_pool.acquire(self.connection_info)
+        assert second is not first
+        first.close.assert_called_once()
+
+    @patch("pymssql.connect")
+    def test_discard(self, connect):
+        connect.side_effect = lambda **kwargs: MagicMock()
+
+        first = connection_pool.acquire(self.connection_info)
+        connection_pool.release(self.connection_info, first, discard=True)
+        first.close.assert_called_once()
+
+        second = connection_pool.acquire(self.connection_info)
+        assert second is not first
+
+    @patch("pymssql.connect")
+    def test_lock_timeout(self, connect):
+        connect.side_effect = lambda **kwargs: MagicMock()
+        connection_info = from_url(
+            "mssql://localhost:1444?login_timeout=5&lock_timeout=2000", "P@ssW0rd"
+        )
+
+        connection = connection_pool.acquire(connection_info)
+        assert "lock_timeout" not in connect.call_args.kwargs
+        assert connect.call_args.kwargs["login_timeout"] == 5
+        cursor = connection.cursor.return_value.__enter__.return_value
+        cursor.execute.assert_called_once_with("SET LOCK_TIMEOUT 2000")
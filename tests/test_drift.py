@@ -0,0 +1,126 @@
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from mssql_resource_provider import connection_pool, drift
+
+server = {"URL": "mssql://sa@localhost:1444/master", "Password": "P@ssW0rd"}
+
+
+def answer(sql: str) -> list:
+    if "FROM sys.databases" in sql:
+        return [("master",), ("app",)]
+    if "PWDCOMPARE" in sql:
+        return [("app", 1), ("report", 0)]
+    if "FROM sys.server_principals" in sql:
+        return [("sa", "master"), ("app", "app"), ("report", "master")]
+    if "database_permissions" in sql:
+        return [("app", "app", "CONNECT"), ("app", "app", "SELECT")]
+    if "database_principals" in sql:
+        return [("app", "dbo", None, None), ("app", "APP", "app", "dbo")]
+    return []
+
+
+class DriftAuditTestCase(TestCase):
+    def setUp(self) -> None:
+        connection_pool.clear()
+        self.connection = MagicMock()
+        self.cursor = self.connection.cursor.return_value.__enter__.return_value
+        self.cursor.execute.side_effect = lambda sql, *args: setattr(
+            self.cursor.fetchall, "return_value", answer(sql)
+        )
+
+    def tearDown(self) -> None:
+        connection_pool.clear()
+
+    def test_audit(self):
+        request = {
+            "Server": server,
+            "Resources": {
+                "App": {"Type": "Custom::MSSQLDatabase", "Properties": {"Name": "app"}},
+                "Archive": {
+                    "Type": "Custom::MSSQLDatabase",
+                    "Properties": {"Name": "archive"},
+                },
+                "AppLogin": {
+                    "Type": "Custom::MSSQLLogin",
+                    "Properties": {
+                        "LoginName": "app",
+                        "Password": "s3cr3t",
+                        "DefaultDatabase": "app",
+                    },
+                },
+                "ReportLogin": {
+                    "Type": "Custom::MSSQLLogin",
+                    "Properties": {"LoginName": "report", "Password": "changed"},
+                },
+                "AppUser": {
+                    "Type": "Custom::MSSQLUser",
+                    "Properties": {
+                        "UserName": "app",
+                        "LoginName": "app",
+                        "DefaultSchema": "app",
+                        "Server": {"URL": "mssql://localhost/app"},
+                    },
+                },
+                "AppGrant": {
+                    "Type": "Custom::MSSQLDatabaseGrant",
+                    "Properties": {
+                        "Database": "app",
+                        "UserName": "app",
+                        "Permissions": ["select", "insert"],
+                    },
+                },
+            },
+        }
+        with patch("pymssql.connect", return_value=self.connection):
+            result = drift.audit(request, {})
+
+        assert result["Resources"] == 6
+        differences = {
+            (d["LogicalResourceId"], d["Property"]): d for d in result["Drift"]
+        }
+        assert set(differences) == {
+            ("Archive", "Name"),
+            ("ReportLogin", "Password"),
+            ("AppUser", "DefaultSchema"),
+            ("AppGrant", "Permissions"),
+        }
+        assert differences[("AppUser", "DefaultSchema")]["Actual"] == "dbo"
+        assert differences[("AppGrant", "Permissions")]["Expected"] == [
+            "INSERT",
+            "SELECT",
+        ]
+        assert differences[("AppGrant", "Permissions")]["Actual"] == ["SELECT"]
+
+        # a fixed number of queries, independent of the number of resources
+        assert self.cursor.execute.call_count == 5
+        sql = self.cursor.execute.call_args_list[3][0][0]
+        assert "[app].sys.database_principals" in sql
+
+        # the passwords are passed as a parameter
+        sql, parameters = self.cursor.execute.call_args_list[2][0]
+        assert "s3cr3t" not in sql
+        assert parameters == {
+            "passwords": '<l n="app" p="s3cr3t"/><l n="report" p="changed"/>'
+        }
+
+    def test_bundle(self):
+        expected = drift.expectations(
+            [
+                {
+                    "Type": "Custom::MSSQLDatabaseBundle",
+                    "Properties": {
+                        "Name": "app",
+                        "Logins": [{"LoginName": "app", "Password": "s3cr3t"}],
+                        "Users": [{"UserName": "app", "LoginName": "app"}],
+                        "Grants": [{"Permissions": ["CONNECT"], "UserNames": ["app"]}],
+                    },
+                }
+            ],
+            "master",
+        )
+        assert [d["Name"] for d in expected.databases] == ["app"]
+        assert expected.logins[0]["DefaultDatabase"] == "app"
+        assert expected.users[0]["Database"] == "app"
+        assert expected.users[0]["DefaultSchema"] == "dbo"
+        assert expected.grants[0]["Permissions"] == ["CONNECT"]
@@ -0,0 +1,115 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+import pymssql
+
+from mssql_resource_provider import connection_info, hooks, metrics
+
+
+class HooksTestCase(TestCase):
+    def setUp(self) -> None:
+        self.hooks = hooks.Hooks()
+        self.raw = MagicMock()
+        self.connection = metrics.InstrumentedConnection(
+            self.raw, metrics.start(), self.hooks
+        )
+
+    def test_statement_events(self):
+        before, after = MagicMock(), MagicMock()
+        self.hooks.register("before_statement", before)
+        self.hooks.register("after_statement", after)
+        self.raw.cursor.return_value.execute.side_effect = [
+            None,
+            pymssql.OperationalError(1205, b"deadlock victim"),
+            None,
+        ]
+
+        with self.connection.cursor() as cursor:
+            cursor.execute("CREATE LOGIN [app] WITH PASSWORD = 'it''s secret'")
+            with self.assertRaises(pymssql.OperationalError):
+                cursor.execute("SELECT 1")
+
+        sql = "CREATE LOGIN [app] WITH PASSWORD = '***'"
+        before.assert_any_call(sql=sql)
+        assert after.call_count == 2
+        first, second = [c[1] for c in after.call_args_list]
+        assert first["sql"] == sql and first["error"] is None
+        assert first["elapsed"] >= 0
+        assert isinstance(second["error"], pymssql.OperationalError)
+
+        self.hooks.redact = False
+        with self.connection.cursor() as cursor:
+            cursor.execute("SELECT N'app'")
+        before.assert_called_with(sql="SELECT N'app'")
+
+    def test_commit_rollback(self):
+        commit, rollback = MagicMock(), MagicMock()
+        self.hooks.register("commit", commit)
+        self.hooks.register("rollback", rollback)
+        self.connection.commit()
+        self.connection.rollback()
+        assert commit.call_args[1]["error"] is None
+        assert rollback.call_count == 1
+
+    def test_no_callbacks(self):
+        with patch.object(hooks.Hooks, "fire") as fire, patch.object(
+            hooks.Hooks, "sql"
+        ) as sql:
+            with self.connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            self.connection.commit()
+        fire.assert_not_called()
+        sql.assert_not_called()
+
+    def test_failing_callback(self):
+        self.hooks.register("after_statement", MagicMock(side_effect=KeyError("x")))
+        with self.connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        self.raw.cursor.return_value.execute.assert_called_once_with("SELECT 1")
+
+        with self.assertRaises(ValueError):
+            self.hooks.register("statement", MagicMock())
+
+    def test_slow_statement_logger(self):
+        hooks.SlowStatementLogger(threshold=0.5).register(self.hooks)
+        with self.assertLogs(level="WARNING") as logs:
+            self.hooks.fire(
+                "after_statement", sql="SELECT\n 1", elapsed=0.75, error=None
+            )
+            self.hooks.fire("after_statement", sql="SELECT 2", elapsed=0.25, error=None)
+        assert logs.output == ["WARNING:root:slow statement took 0.750s: SELECT 1"]
+
+    def test_trace_exporter(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "trace.json")
+            with patch.dict("os.environ", {"TRACE_FILE": path}):
+                hooks.from_environment(self.hooks)
+            with self.connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            self.connection.commit()
+            with open(path) as file:
+                spans = json.loads(file.read().rstrip(",\n") + "]")
+
+        assert [s["name"] for s in spans] == ["after_statement", "commit"]
+        assert spans[0]["ph"] == "X"
+        assert spans[0]["args"] == {"sql": "SELECT 1"}
+        assert spans[0]["dur"] >= 0
+
+    def test_ssm_fetch(self):
+        connection_info.clear_ssm_cache()
+        ssm = MagicMock()
+        ssm.get_parameters.return_value = {
+            "Parameters": [{"Name": "/db/sa", "Value": "P@ssW0rd"}],
+            "InvalidParameters": [],
+        }
+        fetch = MagicMock()
+        hooks.registry.register("ssm_fetch", fetch)
+        try:
+            connection_info.get_ssm_password(ssm, "/db/sa")
+        finally:
+            hooks.registry.unregister("ssm_fetch", fetch)
+            connection_info.clear_ssm_cache()
+        assert fetch.call_args[1]["names"] == ["/db/sa"]
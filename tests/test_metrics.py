@@ -0,0 +1,81 @@
+import json
+from io import StringIO
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from mssql_resource_provider import metrics
+
+
+class MetricsTestCase(TestCase):
+    def test_instrumented_connection(self):
+        request_metrics = metrics.start()
+        raw = MagicMock()
+        connection = metrics.InstrumentedConnection(raw, request_metrics)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+            cursor.callproc("rdsadmin.dbo.rds_modify_db_name", ("a", "b"))
+            cursor.fetchone()
+        connection.commit()
+
+        raw.cursor.return_value.execute.assert_called_once_with("SELECT 1")
+        raw.cursor.return_value.fetchone.assert_called_once()
+        raw.cursor.return_value.close.assert_called_once()
+        raw.commit.assert_called_once()
+        assert metrics.unwrap(connection) is raw
+        assert request_metrics.counts == {"Statements": 2}
+        assert set(request_metrics.timings) == {"Execute", "CallProc", "Commit"}
+
+    def test_changed(self):
+        raw = MagicMock()
+        connection = metrics.InstrumentedConnection(raw, metrics.start())
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE LOGIN [app] WITH PASSWORD = 'secret'")
+        assert not connection.changed
+
+        connection = metrics.InstrumentedConnection(
+            raw, metrics.start(), autocommit=True
+        )
+        with connection.cursor(read_only=True) as cursor:
+            cursor.execute("SELECT 1")
+        assert not connection.changed
+        raw.cursor.return_value.execute.side_effect = Exception("lock timeout")
+        with connection.cursor() as cursor:
+            with self.assertRaises(Exception):
+                cursor.execute("CREATE DATABASE [app]")
+        assert not connection.changed
+        raw.cursor.return_value.execute.side_effect = None
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE DATABASE [app]")
+        assert connection.changed
+
+    def test_emf(self):
+        request_metrics = metrics.start()
+        with request_metrics.timer("Connect"):
+            pass
+        request_metrics.count("Statements", 3)
+
+        with patch("sys.stdout", new_callable=StringIO) as stdout:
+            request_metrics.emit(
+                {
+                    "ResourceType": "Custom::MSSQLLogin",
+                    "RequestType": "Create",
+                    "ServerHost": "localhost",
+                }
+            )
+        document = json.loads(stdout.getvalue())
+        directive = document["_aws"]["CloudWatchMetrics"][0]
+        assert directive["Dimensions"] == [
+            ["ResourceType", "RequestType", "ServerHost"]
+        ]
+        assert {"Name": "Statements", "Unit": "Count"} in directive["Metrics"]
+        assert {"Name": "Connect", "Unit": "Milliseconds"} in directive["Metrics"]
+        assert document["Statements"] == 3
+        assert len(document["Connect"]) == 1
+        assert document["ServerHost"] == "localhost"
+
+    def test_disabled(self):
+        with patch.object(metrics, "namespace", ""), patch(
+            "sys.stdout", new_callable=StringIO
+        ) as stdout:
+            metrics.start().emit({"ResourceType": "Custom::MSSQLLogin"})
+        assert stdout.getvalue() == ""
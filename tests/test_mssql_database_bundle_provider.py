@@ -0,0 +1,178 @@
+import uuid
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+import pymssql
+
+from mssql_resource_provider import connection_info
+from mssql_resource_provider.bundle import MSSQLDatabaseBundle
+from mock_connection import mock_connect
+
+server = {"URL": "mssql://localhost:1444", "Password": "P@ssW0rd"}
+
+
+def request(request_type: str, properties: dict, old_properties: dict = {}) -> dict:
+    return {
+        "RequestType": request_type,
+        "ResponseURL": "https://httpbin.org/put",
+        "StackId": "arn:aws:cloudformation:us-west-2:EXAMPLE/stack-name/guid",
+        "RequestId": "request-%s" % str(uuid.uuid4()),
+        "ResourceType": "Custom::MSSQLDatabaseBundle",
+        "LogicalResourceId": "Bundle",
+        "PhysicalResourceId": "mssql:Bundle:bundle:5",
+        "ResourceProperties": properties,
+        "OldResourceProperties": old_properties,
+    }
+
+
+class MSSQLDatabaseBundleTestCase(TestCase):
+    def setUp(self) -> None:
+        self.provider = MSSQLDatabaseBundle()
+        self.provider.send_response = lambda: None
+        self.connection = mock_connect(self.provider)
+        self.cursor = self.connection.cursor.return_value.__enter__.return_value
+        self.cursor.fetchone.return_value = (5, None, None)
+
+    @property
+    def statements(self) -> list:
+        result = []
+        for call in self.cursor.execute.call_args_list:
+            if len(call[0]) == 1:
+                result.extend(" ".join(s.split()) for s in call[0][0].split(";\n"))
+        return result
+
+    def test_create(self):
+        response = self.provider.handle(
+            request(
+                "Create",
+                {
+                    "Name": "app",
+                    "Server": server,
+                    "Logins": [{"LoginName": "app", "Password": "secret"}],
+                    "Users": [{"UserName": "app", "LoginName": "app"}],
+                    "Grants": [
+                        {"Permissions": ["select", "insert"], "UserNames": ["app"]}
+                    ],
+                },
+            ),
+            {},
+        )
+        assert response["Status"] == "SUCCESS", response["Reason"]
+        assert response["PhysicalResourceId"] == "mssql:Bundle:bundle:5"
+        assert self.provider.connect.call_count == 1
+        assert self.statements == [
+            "CREATE DATABASE [app]",
+            "CREATE LOGIN [app] WITH PASSWORD = 'secret', DEFAULT_DATABASE = [app]",
+            "USE [app]",
+            "CREATE USER [app] FOR LOGIN [app] WITH DEFAULT_SCHEMA = [dbo]",
+            "GRANT INSERT, SELECT ON DATABASE::[app] TO [app]",
+            "USE [master]",
+        ]
+
+    def test_create_failed(self):
+        def execute(sql, *args):
+            if "CREATE LOGIN [taken]" in sql or (failing_drop and "DROP" in sql):
+                raise pymssql.ProgrammingError(15025, b"The principal already exists.")
+
+        failing_drop = False
+        self.cursor.execute.side_effect = execute
+        event = request(
+            "Create",
+            {
+                "Name": "app",
+                "Server": server,
+                "Logins": [
+                    {"LoginName": "app", "Password": "secret"},
+                    {"LoginName": "taken", "Password": "secret"},
+                ],
+            },
+        )
+        del event["PhysicalResourceId"]
+        response = self.provider.handle(event, {})
+        assert response["Status"] == "FAILED"
+        assert response["PhysicalResourceId"] == "could-not-create"
+        # the login which already existed is left alone
+        assert self.statements[-3:] == [
+            "USE [master]",
+            "DROP LOGIN [app]",
+            "DROP DATABASE IF EXISTS [app]",
+        ]
+
+        # the database could not be dropped, so it is left to the delete of the rollback
+        failing_drop = True
+        response = self.provider.handle(event, {})
+        assert response["Status"] == "FAILED"
+        assert response["PhysicalResourceId"] == "mssql:Bundle:bundle:5"
+
+    def test_rotated_password(self):
+        connection_info._cache_ssm_password("/app/password", "stale")
+        self.addCleanup(connection_info.clear_ssm_cache)
+        self.provider.ssm = MagicMock()
+        self.provider.ssm.get_parameters.return_value = {
+            "Parameters": [{"Name": "/app/password", "Value": "rotated"}],
+            "InvalidParameters": [],
+        }
+        response = self.provider.handle(
+            request(
+                "Create",
+                {
+                    "Name": "app",
+                    "Server": server,
+                    "Logins": [
+                        {"LoginName": "app", "PasswordParameterName": "/app/password"}
+                    ],
+                },
+            ),
+            {},
+        )
+        assert response["Status"] == "SUCCESS", response["Reason"]
+        assert (
+            "CREATE LOGIN [app] WITH PASSWORD = 'rotated', DEFAULT_DATABASE = [app]"
+            in self.statements
+        )
+
+    def test_update(self):
+        old = {
+            "Name": "app",
+            "Server": server,
+            "Logins": [
+                {"LoginName": "app", "Password": "secret"},
+                {"LoginName": "old", "Password": "secret"},
+            ],
+            "Users": [
+                {"UserName": "app", "LoginName": "app"},
+                {"UserName": "old", "LoginName": "old"},
+            ],
+            "Grants": [
+                {"Permissions": ["SELECT", "DELETE"], "UserNames": ["app", "old"]}
+            ],
+        }
+        new = {
+            "Name": "app",
+            "Server": server,
+            "Logins": [
+                {"LoginName": "app", "Password": "secret"},
+                {"LoginName": "new", "Password": "secret"},
+            ],
+            "Users": [
+                {"UserName": "app", "LoginName": "app", "DefaultSchema": "app"},
+                {"UserName": "new", "LoginName": "new"},
+            ],
+            "Grants": [{"Permissions": ["SELECT"], "UserNames": ["app", "new"]}],
+        }
+        response = self.provider.handle(request("Update", new, old), {})
+        assert response["Status"] == "SUCCESS", response["Reason"]
+        assert self.statements == [
+            "USE [app]",
+            "IF DATABASE_PRINCIPAL_ID(N'app') IS NOT NULL REVOKE DELETE ON DATABASE::[app] FROM [app]",
+            "IF DATABASE_PRINCIPAL_ID(N'old') IS NOT NULL REVOKE DELETE, SELECT ON DATABASE::[app] FROM [old]",
+            "DROP USER IF EXISTS [old]",
+            "USE [master]",
+            "DROP LOGIN [old]",
+            "CREATE LOGIN [new] WITH PASSWORD = 'secret', DEFAULT_DATABASE = [app]",
+            "USE [app]",
+            "CREATE USER [new] FOR LOGIN [new] WITH DEFAULT_SCHEMA = [dbo]",
+            "ALTER USER [app] WITH LOGIN = [app], DEFAULT_SCHEMA = [app]",
+            "GRANT SELECT ON DATABASE::[app] TO [new]",
+            "USE [master]",
+        ]
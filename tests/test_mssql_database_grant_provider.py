@@ -1,15 +1,27 @@
 import logging
 import random
 import string
+import uuid
+from unittest import TestCase
 
 import pymssql
 
 from cfn_resource_provider_test import CloudformationCustomProviderTestCase, Request
 from mssql_resource_provider.grant import MSSQLDatabaseGrant
+import mssql_emulator
+from mock_connection import mock_connect
 
 logging.basicConfig(level=logging.INFO)
 
 
+def setUpModule():
+    mssql_emulator.start()
+
+
+def tearDownModule():
+    mssql_emulator.stop()
+
+
 def random_name():
     chars = string.ascii_letters
     return "".join(random.choice(chars) for i in range(20))
@@ -153,7 +165,94 @@ class MSSQLDatabaseGrantTestCase(CloudformationCustomProviderTestCase):
         request.set_property("Permission", "SELECT")
         response = self.handle(request)
         self.assertEqual("SUCCESS", response["Status"], response["Reason"])
-        self.assertNotEqual(physical_resource_id, response["PhysicalResourceId"])
+        # the delta is applied in place, so the grant is not replaced
+        self.assertEqual(physical_resource_id, response["PhysicalResourceId"])
 
         self.assert_permission("GRANT", "CONNECT", self.username, self.database)
         self.assert_permission("GRANT", "SELECT", self.username, self.database)
+
+    def test_batch(self):
+        other = random_name()
+        self.new_login_and_user(self.database, other)
+        try:
+            request = Request(
+                "Custom::MSSQLDatabaseGrant",
+                "Create",
+                None,
+                {
+                    "Permissions": ["CONNECT", "SELECT", "INSERT"],
+                    "UserNames": [self.username, other],
+                    "Database": self.database,
+                    "Server": {
+                        "URL": f"mssql://localhost:1444/{self.database}",
+                        "Password": "P@ssW0rd",
+                    },
+                },
+            )
+            response = self.handle(request)
+            self.assertEqual("SUCCESS", response["Status"], response["Reason"])
+            physical_resource_id = response["PhysicalResourceId"]
+            self.assertRegex(
+                physical_resource_id,
+                r"^mssql:TestResource:grant:CONNECT,INSERT,SELECT:[0-9]+,[0-9]+:[0-9]+$",
+            )
+            for name in [self.username, other]:
+                self.assert_permission("GRANT", "INSERT", name, self.database)
+
+            request.request_type = "Update"
+            request.physical_resource_id = physical_resource_id
+            request.set_property("Permissions", ["CONNECT", "SELECT", "DELETE"])
+            request.set_property("UserNames", [self.username])
+            response = self.handle(request)
+            self.assertEqual("SUCCESS", response["Status"], response["Reason"])
+            self.assertEqual(physical_resource_id, response["PhysicalResourceId"])
+            self.assert_permission("GRANT", "DELETE", self.username, self.database)
+
+            request.request_type = "Delete"
+            response = self.handle(request)
+            self.assertEqual("SUCCESS", response["Status"], response["Reason"])
+        finally:
+            self.drop_login_and_user(self.database, other)
+
+
+class MSSQLDatabaseGrantDeltaTestCase(TestCase):
+    def setUp(self) -> None:
+        self.provider = MSSQLDatabaseGrant()
+        self.provider.set_request(
+            {
+                "RequestType": "Update",
+                "ResponseURL": "https://httpbin.org/put",
+                "StackId": "arn:aws:cloudformation:us-west-2:EXAMPLE/stack-name/guid",
+                "RequestId": "request-%s" % str(uuid.uuid4()),
+                "ResourceType": "Custom::MSSQLDatabaseGrant",
+                "LogicalResourceId": "Grant",
+                "PhysicalResourceId": "mssql:Grant:grant:SELECT:5,6:7",
+                "ResourceProperties": {
+                    "Permissions": ["select", "insert"],
+                    "UserNames": ["a", "c"],
+                    "Database": "app",
+                    "Server": {"URL": "mssql://localhost/app", "Password": "P@ssW0rd"},
+                },
+                "OldResourceProperties": {
+                    "Permissions": ["SELECT", "DELETE"],
+                    "UserNames": ["a", "b"],
+                    "Database": "app",
+                    "Server": {"URL": "mssql://localhost/app", "Password": "P@ssW0rd"},
+                },
+            },
+            {},
+        )
+        self.connection = mock_connect(self.provider)
+
+    def test_delta(self):
+        self.provider.update()
+        cursor = self.connection.cursor.return_value.__enter__.return_value
+        assert cursor.execute.call_count == 1
+        statements = cursor.execute.call_args[0][0].split(";\n")
+        assert statements == [
+            "IF DATABASE_PRINCIPAL_ID(N'a') IS NOT NULL REVOKE DELETE ON DATABASE::[app] FROM [a]",
+            "IF DATABASE_PRINCIPAL_ID(N'b') IS NOT NULL REVOKE DELETE, SELECT ON DATABASE::[app] FROM [b]",
+            "GRANT INSERT ON DATABASE::[app] TO [a]",
+            "GRANT INSERT, SELECT ON DATABASE::[app] TO [c]",
+        ]
+        assert self.provider.physical_resource_id == "mssql:Grant:grant:SELECT:5,6:7"
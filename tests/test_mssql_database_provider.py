@@ -5,16 +5,34 @@ import string
 import textwrap
 import uuid
 from unittest import TestCase
+from unittest.mock import MagicMock, patch
 
 import pymssql
 from pymssql import _mssql
 
-from mssql_resource_provider import handler
+from mssql_resource_provider import continuation, handler
+from mssql_resource_provider.database import (
+    DatabaseFile,
+    MSSQLDatabase,
+    add_file_statement,
+    configure_database_statements,
+    drop_database_statement,
+)
 from mssql_resource_provider.connection_info import from_url
+import mssql_emulator
+from mock_connection import mock_connect
 
 logging.basicConfig(level=logging.INFO)
 
 
+def setUpModule():
+    mssql_emulator.start()
+
+
+def tearDownModule():
+    mssql_emulator.stop()
+
+
 def random_name():
     chars = string.ascii_letters
     return "".join(random.choice(chars) for i in range(20))
@@ -133,6 +151,53 @@ class MSSQLDatabaseTestCase(TestCase):
 
         assert not event.database_exists()
 
+    def test_create_configuration_failed(self):
+        failure = pymssql.ProgrammingError((5009, b"One or more files not found."))
+        name = random_name()
+        event = Event("Create", name)
+        with patch.object(MSSQLDatabase, "configure_database", side_effect=failure):
+            response = handler(event, {})
+        assert response["Status"] == "FAILED", response["Reason"]
+        assert response["PhysicalResourceId"] == "could-not-create"
+        assert not event.database_exists()
+
+        # the database could not be dropped, so it is dropped by the delete of the rollback
+        with patch.object(
+            MSSQLDatabase, "configure_database", side_effect=failure
+        ), patch.object(MSSQLDatabase, "drop_created_database", return_value=False):
+            response = handler(event, {})
+        assert response["Status"] == "FAILED", response["Reason"]
+        physical_resource_id = response["PhysicalResourceId"]
+        assert re.match(r"^mssql:[^:]+:database:[0-9]+$", physical_resource_id)
+        assert event.database_exists()
+
+        response = handler(Event("Delete", name, physical_resource_id), {})
+        assert response["Status"] == "SUCCESS", response["Reason"]
+        assert not event.database_exists()
+
+    @patch("time.sleep")
+    def test_retry_after_create(self, sleep):
+        locked = pymssql.OperationalError(1222, b"Lock request time out period.")
+        name = random_name()
+        event = Event("Create", name)
+        # the created database is dropped after the failure, so the create is retried
+        with patch.object(
+            MSSQLDatabase, "configure_database", side_effect=[locked, None]
+        ):
+            response = handler(event, {})
+        assert response["Status"] == "SUCCESS", response["Reason"]
+        sleep.assert_called_once()
+        assert event.database_exists()
+
+        # the database is renamed outside of a transaction, so the update is not retried
+        event = Event("Update", f"new-{name}", response["PhysicalResourceId"])
+        event["OldResourceProperties"] = {"Name": name}
+        with patch.object(MSSQLDatabase, "configure_database", side_effect=locked):
+            response = handler(event, {})
+        assert response["Status"] == "FAILED", response["Reason"]
+        assert "1222" in response["Reason"]
+        sleep.assert_called_once()
+
     def test_rename(self):
         name = random_name()
         new_name = f"new-{name}"
@@ -149,3 +214,130 @@ class MSSQLDatabaseTestCase(TestCase):
         new_physical_resource_id = response["PhysicalResourceId"]
 
         assert physical_resource_id == new_physical_resource_id
+
+
+class Context:
+    invoked_function_arn = "arn:aws:lambda:eu-central-1:123456789012:function:mssql"
+
+    def __init__(self, remaining: float):
+        self.remaining = remaining
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining * 1000
+
+
+class MSSQLDatabaseAsynchronousTestCase(TestCase):
+    def setUp(self) -> None:
+        self.provider = MSSQLDatabase()
+        self.provider.transport = continuation.LocalTransport()
+        self.provider.send_response = MagicMock()
+        self.connection = mock_connect(self.provider)
+        self.cursor = self.connection.cursor.return_value.__enter__.return_value
+
+    def statements(self):
+        return [c[0][0] for c in self.cursor.execute.call_args_list]
+
+    def test_create(self):
+        request = Event("Create", "app")
+        request["ResourceProperties"]["Asynchronous"] = "true"
+
+        self.cursor.fetchone.return_value = (None, None)
+        response = self.provider.handle(request, Context(remaining=3))
+        assert response["Status"] == "SUCCESS", response["Reason"]
+        self.provider.send_response.assert_not_called()
+        assert len(self.provider.transport.requests) == 1
+
+        continued, context = self.provider.transport.requests[0]
+        context.remaining = 30
+        job_name = continued["AsyncState"]["Job"]
+        assert f"sp_start_job @job_name = N'{job_name}'" in self.statements()[0]
+        assert "@command = N'CREATE DATABASE [app]'" in self.statements()[0]
+
+        self.cursor.reset_mock()
+        self.cursor.fetchone.side_effect = [
+            (None, None),
+            ("ONLINE", None),
+            (5, None, None),
+        ]
+        with patch("time.sleep") as sleep:
+            self.provider.transport.run(self.provider.handle)
+        sleep.assert_called_once_with(continuation.poll_interval)
+        assert not any("sp_start_job" in s for s in self.statements())
+
+        self.provider.send_response.assert_called_once()
+        assert self.provider.status == "SUCCESS", self.provider.reason
+        assert self.provider.physical_resource_id == "mssql:Whatever:database:5"
+
+    def test_create_failed(self):
+        request = Event("Create", "app")
+        request["ResourceProperties"]["Asynchronous"] = True
+        self.cursor.fetchone.return_value = (None, "CREATE DATABASE failed.")
+
+        response = self.provider.handle(request, Context(remaining=30))
+        assert response["Status"] == "FAILED"
+        assert response["Reason"] == "CREATE DATABASE failed."
+        assert response["PhysicalResourceId"] == "could-not-create"
+        assert "sp_delete_job" in self.statements()[-1]
+        self.provider.send_response.assert_called_once()
+
+
+class ConfigureDatabaseTestCase(TestCase):
+    files = [
+        DatabaseFile("PRIMARY", "FG", "app", "ROWS", 1024, 8192, False, -1),
+        DatabaseFile(None, None, "app_log", "LOG", 1024, 10, True, 268435456),
+        DatabaseFile("archive", "FG", "app_archive", "ROWS", 8192, 8192, False, -1),
+    ]
+
+    def test_nothing_changed(self):
+        properties = {
+            "DataFile": {"Size": "8MB", "FileGrowth": "64MB", "MaxSize": "UNLIMITED"},
+            "LogFile": {"FileGrowth": "10%", "MaxSize": "UNLIMITED"},
+            "RecoveryModel": "FULL",
+            "FileGroups": [{"Name": "archive", "Size": "64MB"}],
+        }
+        assert (
+            configure_database_statements("app", properties, "FULL", self.files) == []
+        )
+
+    def test_reconcile(self):
+        properties = {
+            "DataFile": {"Size": "512MB", "FileGrowth": "64MB", "MaxSize": "10GB"},
+            "LogFile": {"Size": "4MB", "FileGrowth": "128MB"},
+            "RecoveryModel": "SIMPLE",
+            "FileGroups": [
+                {"Name": "archive", "Size": "64MB"},
+                {"Name": "imoltp", "MemoryOptimized": True},
+            ],
+        }
+        statements = configure_database_statements(
+            "app", properties, "FULL", self.files
+        )
+        assert statements[:6] == [
+            "ALTER DATABASE [app] SET RECOVERY SIMPLE",
+            "ALTER DATABASE [app] MODIFY FILE (NAME = N'app', SIZE = 512MB)",
+            "ALTER DATABASE [app] MODIFY FILE (NAME = N'app', MAXSIZE = 10GB)",
+            "ALTER DATABASE [app] MODIFY FILE (NAME = N'app_log', FILEGROWTH = 128MB)",
+            "ALTER DATABASE [app] ADD FILEGROUP [imoltp] CONTAINS MEMORY_OPTIMIZED_DATA",
+            "DECLARE @path nvarchar(max) = CAST(SERVERPROPERTY('InstanceDefaultDataPath') AS nvarchar(max))",
+        ]
+        assert statements[6] == (
+            "EXEC (N'ALTER DATABASE [app] ADD FILE (NAME = N''app_imoltp'', FILENAME = N''' "
+            "+ REPLACE(@path, N'''', N'''''') + N'app_imoltp'') TO FILEGROUP [imoltp]')"
+        )
+        assert len(statements) == 7
+
+    def test_add_file(self):
+        statement = add_file_statement(
+            "app", {"Name": "archive", "Size": "1GB", "FileGrowth": "10%"}
+        )
+        assert statement.endswith(
+            "N'app_archive.ndf'', SIZE = 1GB, FILEGROWTH = 10%) TO FILEGROUP [archive]')"
+        )
+
+
+class DropDatabaseTestCase(TestCase):
+    def test_force_disconnect(self):
+        assert drop_database_statement("app") == "DROP DATABASE IF EXISTS [app]"
+        sql = drop_database_statement("app", force_disconnect=True)
+        assert "ALTER DATABASE [app] SET SINGLE_USER WITH ROLLBACK IMMEDIATE" in sql
+        assert sql.index("SINGLE_USER") < sql.index("DROP DATABASE IF EXISTS [app]")
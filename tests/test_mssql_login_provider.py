@@ -1,20 +1,35 @@
+import json
 import logging
+import os
 import random
 import re
 import string
 import sys
 import uuid
+from io import StringIO
 from unittest import TestCase
+from unittest.mock import MagicMock, patch
 
 import boto3
 import pymssql
 
-from mssql_resource_provider import handler
+from mssql_resource_provider import connection_pool, handler
+from mssql_resource_provider.login import MSSQLLogin
 from mssql_resource_provider.connection_info import from_url
+import mssql_emulator
+from mock_connection import mock_connect
 
 logging.basicConfig(level=logging.INFO)
 
 
+def setUpModule():
+    mssql_emulator.start()
+
+
+def tearDownModule():
+    mssql_emulator.stop()
+
+
 def random_user():
     chars = string.ascii_letters
     return "".join(random.choice(chars) for i in range(20))
@@ -252,3 +267,169 @@ class MSSQLLoginTestCase(TestCase):
         finally:
             ssm.delete_parameter(Name=user_password_name)
             ssm.delete_parameter(Name=dbowner_password_name)
+
+
+class MSSQLLoginNoopUpdateTestCase(TestCase):
+    def setUp(self) -> None:
+        self.provider = MSSQLLogin()
+        request = Event("Update", "kong", "mssql:Whatever:login:7")
+        request["ResourceProperties"]["Password"] = "S3cr3t!"
+        request["OldResourceProperties"] = dict(request["ResourceProperties"])
+        self.provider.set_request(request, {})
+        assert self.provider.is_valid_request()
+        self.provider.connection = MagicMock()
+        self.provider.connect = MagicMock()
+        self.provider.close = MagicMock()
+        self.cursor = (
+            self.provider.connection.cursor.return_value.__enter__.return_value
+        )
+
+    def statements(self):
+        return [c[0][0] for c in self.cursor.execute.call_args_list]
+
+    def test_no_changes(self):
+        self.cursor.fetchone.return_value = ("master", 1, 7, b"\x01")
+        self.provider.update()
+        assert self.provider.status == "SUCCESS", self.provider.reason
+
+        statements = self.statements()
+        assert len(statements) == 1
+        assert "PWDCOMPARE(@password, password_hash)" in statements[0]
+        assert "S3cr3t!" not in statements[0]
+        assert self.cursor.execute.call_args[0][1] == {
+            "login_name": "kong",
+            "password": "S3cr3t!",
+        }
+        assert self.provider.physical_resource_id == "mssql:Whatever:login:7"
+
+    def test_only_changed_clauses(self):
+        self.cursor.fetchone.return_value = ("alt_db", 1, 7, b"\x01")
+        self.provider.update()
+        assert self.statements()[1] == (
+            "ALTER LOGIN [kong] WITH DEFAULT_DATABASE = [master]"
+        )
+
+        self.cursor.reset_mock()
+        self.cursor.fetchone.return_value = ("master", 0, 7, b"\x01")
+        self.provider.update()
+        assert self.statements()[1] == "ALTER LOGIN [kong] WITH PASSWORD = 'S3cr3t!'"
+
+
+class MSSQLLoginForceDisconnectTestCase(TestCase):
+    def test_delete(self):
+        provider = MSSQLLogin()
+        request = Event("Delete", "kong", "mssql:Whatever:login:7")
+        request["ResourceProperties"]["ForceDisconnect"] = "true"
+        provider.set_request(request, {})
+        assert provider.is_valid_request()
+        connection = mock_connect(provider)
+
+        provider.delete()
+        assert provider.status == "SUCCESS", provider.reason
+        provider.connect.assert_called_once_with(autocommit=True)
+
+        cursor = connection.cursor.return_value.__enter__.return_value
+        cursor.execute.assert_called_once()
+        sql = cursor.execute.call_args[0][0]
+        assert "FROM sys.dm_exec_sessions" in sql
+        assert "WHERE login_name IN (N'kong')" in sql
+        assert "IF SUSER_ID(N'kong') IS NOT NULL DROP LOGIN [kong]" in sql
+
+
+class MSSQLLoginFanOutTestCase(TestCase):
+    def setUp(self) -> None:
+        connection_pool.clear()
+        self.connections = {}
+
+    def tearDown(self) -> None:
+        connection_pool.clear()
+
+    def connect(self, **kwargs):
+        connection = MagicMock()
+        cursor = connection.cursor.return_value
+        cursor.fetchone.return_value = (None, 7, b"\x01\x02")
+        self.connections[kwargs["host"]] = connection
+        return connection
+
+    def statements(self, host: str) -> list:
+        cursor = self.connections[host].cursor.return_value
+        return [c[0][0] for c in cursor.execute.call_args_list]
+
+    def test_create(self):
+        request = Event("Create", "kong")
+        request["ResourceProperties"]["Server"]["URL"] = [
+            "mssql://primary:1444",
+            "mssql://dr1:1444",
+            "mssql://dr2:1444",
+        ]
+        provider = MSSQLLogin()
+        provider.send_response = MagicMock()
+        with patch("pymssql.connect", side_effect=self.connect):
+            response = provider.handle(request, {})
+
+        assert response["Status"] == "SUCCESS", response["Reason"]
+        assert response["PhysicalResourceId"] == "mssql:Whatever:login:7"
+        assert set(self.connections) == {"primary", "dr1", "dr2"}
+        assert "SID" not in self.statements("primary")[0]
+        for host in ["dr1", "dr2"]:
+            assert "SID = 0x0102," in self.statements(host)[0]
+            self.connections[host].commit.assert_called_once()
+
+        connection_pool.clear()
+        request["ResourceProperties"]["Server"]["URL"] = "mssql://primary:1444"
+        with patch("pymssql.connect", side_effect=self.connect):
+            response = provider.handle(request, {})
+        assert response["Status"] == "SUCCESS", response["Reason"]
+        assert "SID" not in self.statements("primary")[0]
+
+    def test_failure_on_one_server(self):
+        request = Event("Delete", "kong", "mssql:Whatever:login:7")
+        request["ResourceProperties"]["Server"]["URL"] = [
+            "mssql://primary:1444",
+            "mssql://dr1:1444",
+        ]
+
+        def connect(**kwargs):
+            if kwargs["host"] == "dr1":
+                raise pymssql.OperationalError(18456, b"Login failed")
+            return self.connect(**kwargs)
+
+        provider = MSSQLLogin()
+        provider.send_response = MagicMock()
+        with patch("pymssql.connect", side_effect=connect):
+            response = provider.handle(request, {})
+
+        assert response["Status"] == "FAILED"
+        assert response["Reason"].startswith("dr1: Failed to connect")
+        assert "DROP LOGIN [kong]" in self.statements("primary")[-1]
+
+
+class MSSQLLoginFanOutEmulatorTestCase(TestCase):
+    def setUp(self) -> None:
+        if os.getenv("MSSQL_LIVE"):
+            self.skipTest("the fan-out requires a server for each host")
+        self.servers = {h: mssql_emulator.Server() for h in ["primary", "dr1", "dr2"]}
+
+    def connect(self, **kwargs):
+        return self.servers[kwargs["host"]].connect(**kwargs)
+
+    def test_metrics(self):
+        request = Event("Create", "kong")
+        request["ResourceProperties"]["Server"]["URL"] = [
+            f"mssql://{host}:1444" for host in self.servers
+        ]
+        with patch("pymssql.connect", side_effect=self.connect), patch(
+            "sys.stdout", new_callable=StringIO
+        ) as stdout:
+            response = MSSQLLogin().handle(request, {})
+        assert response["Status"] == "SUCCESS", response["Reason"]
+        for server in self.servers.values():
+            assert "kong" in server.logins
+
+        # the connects and statements on all servers are emitted with the request
+        emitted = json.loads(stdout.getvalue().splitlines()[-1])
+        assert len(emitted["Connect"]) == 3
+        assert len(emitted["Commit"]) == 3
+        # CREATE LOGIN and the lookup of its sid on each server
+        assert emitted["Statements"] == 6
+        assert len(emitted["Execute"]) == 6
@@ -0,0 +1,222 @@
+import uuid
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+import pymssql
+
+from mssql_resource_provider import base, database, login, retry
+from mssql_resource_provider.database import MSSQLDatabase
+from mssql_resource_provider.user import MSSQLUser
+from mock_connection import mock_connect
+
+
+def request(properties: dict) -> dict:
+    return {
+        "RequestType": "Update",
+        "ResponseURL": "https://httpbin.org/put",
+        "StackId": "arn:aws:cloudformation:us-west-2:EXAMPLE/stack-name/guid",
+        "RequestId": "request-%s" % str(uuid.uuid4()),
+        "ResourceType": "Custom::MSSQLUser",
+        "LogicalResourceId": "Whatever",
+        "PhysicalResourceId": "mssql:Whatever:database:5:user:7",
+        "ResourceProperties": properties,
+    }
+
+
+class LookupIdentityTestCase(TestCase):
+    def setUp(self) -> None:
+        self.provider = MSSQLUser()
+        self.provider.set_request(
+            request(
+                {
+                    "UserName": "kong",
+                    "LoginName": "kong",
+                    "Server": {
+                        "URL": "mssql://localhost:1444/kong",
+                        "Password": "P@ssW0rd",
+                    },
+                }
+            ),
+            {},
+        )
+        self.provider.convert_property_types()
+        self.provider.connection = MagicMock()
+        self.cursor = (
+            self.provider.connection.cursor.return_value.__enter__.return_value
+        )
+        self.cursor.fetchone.return_value = (5, 7, b"\x01\x02")
+
+    def test_single_round_trip(self):
+        assert self.provider.allow_update
+        assert self.provider.url == "mssql:Whatever:database:5:user:7"
+        assert self.cursor.execute.call_count == 1
+
+        sql, parameters = self.cursor.execute.call_args[0]
+        assert "kong" not in sql
+        assert parameters == {
+            "database": "kong",
+            "username": "kong",
+            "login_name": None,
+        }
+
+        identity = self.provider.lookup_identity("kong", "kong")
+        assert identity.sid == b"\x01\x02"
+        assert self.cursor.execute.call_count == 1
+
+    def test_no_literal_names(self):
+        self.provider.lookup_identity(login_name="o'kong")
+        self.provider.lookup_identities("kong", ["kong", "o'kong", "<k&ng>"])
+        (login_sql, login_name), (users_sql, users) = [
+            c[0] for c in self.cursor.execute.call_args_list
+        ]
+        assert login_sql == base.identity_statement
+        assert login_name == {
+            "database": None,
+            "username": None,
+            "login_name": "o'kong",
+        }
+        assert users_sql == base.identities_statement
+        assert users == {
+            "database": "kong",
+            "names": "<n>kong</n><n>o'kong</n><n>&lt;k&amp;ng&gt;</n>",
+        }
+
+        for sql in [
+            base.identity_statement,
+            base.identities_statement,
+            login.login_state_statement,
+            database.database_state_statement,
+            database.database_files_statement,
+        ]:
+            assert sql.startswith("EXEC sp_executesql N'")
+            assert "%(" in sql and "kong" not in sql
+
+    def test_forget_identities(self):
+        self.provider.lookup_identity("kong", "kong")
+        self.provider.forget_identities()
+        self.provider.lookup_identity("kong", "kong")
+        assert self.cursor.execute.call_count == 2
+
+    def test_new_request_forgets(self):
+        self.provider.lookup_identity("kong", "kong")
+        self.provider.set_request(request(self.provider.properties), {})
+        self.provider.connection = MagicMock()
+        cursor = self.provider.connection.cursor.return_value.__enter__.return_value
+        cursor.fetchone.return_value = (5, None, None)
+        assert self.provider.lookup_identity("kong", "kong").principal_id is None
+
+    def test_forget_principal(self):
+        self.provider.lookup_identity("kong", "kong")
+        self.provider.forget_principal("kong", "kong")
+        assert self.provider.lookup_identity("kong").database_id == 5
+        assert self.cursor.execute.call_count == 1
+        self.provider.lookup_identity("kong", "kong")
+        assert self.cursor.execute.call_count == 2
+
+    def test_forget_database(self):
+        self.provider.lookup_identity("kong", "kong")
+        self.provider.lookup_identity(login_name="kong")
+        self.provider.forget_database("kong")
+        self.provider.lookup_identity(login_name="kong")
+        assert self.cursor.execute.call_count == 2
+        self.provider.lookup_identity("kong")
+        assert self.cursor.execute.call_count == 3
+
+
+class DatabaseUpdateTestCase(TestCase):
+    def setUp(self) -> None:
+        self.provider = MSSQLDatabase()
+        self.provider.set_request(
+            {
+                **request(
+                    {
+                        "Name": "new",
+                        "Server": {
+                            "URL": "mssql://localhost:1444",
+                            "Password": "P@ssW0rd",
+                        },
+                    }
+                ),
+                "ResourceType": "Custom::MSSQLDatabase",
+                "OldResourceProperties": {"Name": "old"},
+            },
+            {},
+        )
+        self.connection = mock_connect(self.provider)
+        self.cursor = self.connection.cursor.return_value.__enter__.return_value
+
+    def test_rename_single_connection(self):
+        self.cursor.fetchone.return_value = (None, None, None)
+        self.cursor.fetchall.return_value = []
+        self.provider.execute()
+        assert self.provider.status == "SUCCESS", self.provider.reason
+        self.provider.connect.assert_called_once()
+        self.cursor.callproc.assert_called_once_with(
+            "rdsadmin.dbo.rds_modify_db_name", ("old", "new")
+        )
+
+    def test_rename_to_existing(self):
+        self.cursor.fetchone.return_value = (9, None, None)
+        self.provider.execute()
+        assert self.provider.status == "FAILED"
+        assert self.provider.reason == "database new already exists"
+        self.provider.connect.assert_called_once()
+        self.cursor.callproc.assert_not_called()
+
+
+class RetryTestCase(TestCase):
+    def setUp(self) -> None:
+        self.provider = MSSQLDatabase()
+        self.provider.set_request(
+            {
+                **request(
+                    {
+                        "Name": "app",
+                        "Server": {
+                            "URL": "mssql://localhost:1444",
+                            "Password": "P@ssW0rd",
+                        },
+                    }
+                ),
+                "RequestType": "Create",
+                "ResourceType": "Custom::MSSQLDatabase",
+            },
+            {},
+        )
+        del self.provider.request["PhysicalResourceId"]
+        del self.provider.response["PhysicalResourceId"]
+        self.connection = mock_connect(self.provider)
+        self.cursor = self.connection.cursor.return_value.__enter__.return_value
+
+    @patch("time.sleep")
+    def test_retry_transient(self, sleep):
+        locked = pymssql.OperationalError(1807, b"Could not obtain exclusive lock")
+        self.cursor.execute.side_effect = [locked, None, None]
+        self.cursor.fetchone.return_value = (5, None, None)
+
+        self.provider.execute()
+        assert self.provider.status == "SUCCESS", self.provider.reason
+        assert self.provider.physical_resource_id == "mssql:Whatever:database:5"
+        sleep.assert_called_once()
+        assert 0 <= sleep.call_args[0][0] <= retry.base_delay
+
+    @patch("time.sleep")
+    def test_no_retry(self, sleep):
+        self.cursor.execute.side_effect = pymssql.OperationalError(
+            1801, b"Database 'app' already exists."
+        )
+        self.provider.execute()
+        assert self.provider.status == "FAILED"
+        assert self.provider.physical_resource_id == "could-not-create"
+        sleep.assert_not_called()
+
+    def test_backoff(self):
+        deadlock = pymssql.OperationalError(1205, b"deadlock victim")
+        assert retry.backoff(deadlock, 0, None) <= retry.base_delay
+        assert retry.backoff(deadlock, retry.max_attempts - 1, None) is None
+        assert retry.backoff(deadlock, 0, retry.min_remaining_time) is None
+        assert retry.backoff(ValueError("invalid"), 0, None) is None
+
+        wrapped = pymssql.OperationalError((40613, b"Database is not available."))
+        assert retry.error_number(wrapped) == 40613
+        assert retry.is_transient(wrapped)
@@ -9,10 +9,19 @@ import pymssql
 
 from mssql_resource_provider import handler
 from mssql_resource_provider.connection_info import from_url
+import mssql_emulator
 
 logging.basicConfig(level=logging.INFO)
 
 
+def setUpModule():
+    mssql_emulator.start()
+
+
+def tearDownModule():
+    mssql_emulator.stop()
+
+
 def random_name():
     chars = string.ascii_letters
     return "".join(random.choice(chars) for i in range(20))
@@ -0,0 +1,119 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+from unittest import TestCase
+from unittest.mock import patch
+
+import mssql_emulator
+from mssql_resource_provider import service
+
+
+class BlockingProvider:
+    """
+    a provider which handles a request when `proceed` is set, and continues it once if asked to.
+    """
+
+    proceed = threading.Event()
+    handled = []
+
+    def __init__(self):
+        self.transport = None
+
+    def handle(self, request, context):
+        assert self.proceed.wait(5)
+        self.handled.append(request)
+        if request.get("Continue"):
+            self.transport.send({**request, "Continue": False}, context)
+        return {"Status": "SUCCESS"}
+
+
+class ServiceTestCase(TestCase):
+    def setUp(self) -> None:
+        BlockingProvider.proceed.clear()
+        BlockingProvider.handled.clear()
+        patcher = patch.object(service, "new_provider", lambda t: BlockingProvider())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.service = service.Service(workers=1, pending=1)
+        self.addCleanup(self.service.shutdown, 0)
+
+    def test_backpressure(self):
+        self.service.submit({"RequestId": "1"})
+        self.service.submit({"RequestId": "2"})
+        with self.assertRaises(ValueError):
+            self.service.submit({"RequestId": "3"})
+
+        BlockingProvider.proceed.set()
+        assert self.service.shutdown(5)
+        assert [r["RequestId"] for r in BlockingProvider.handled] == ["1", "2"]
+        with self.assertRaises(ValueError):
+            self.service.submit({"RequestId": "4"})
+
+    def test_continuation(self):
+        BlockingProvider.proceed.set()
+        self.service.submit({"RequestId": "1", "Continue": True}).result(5)
+        assert self.service.shutdown(5)
+        assert len(BlockingProvider.handled) == 2
+        # the slot of the request was released once, by the continuation
+        assert self.service.slots._value == 2
+
+    def test_shutdown_timeout(self):
+        self.service.submit({"RequestId": "1"})
+        assert not self.service.shutdown(0.1)
+        BlockingProvider.proceed.set()
+
+    def test_http_endpoint(self):
+        handler = type("Handler", (service.RequestHandler,), {"service": self.service})
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        def post(body: bytes) -> int:
+            url = f"http://127.0.0.1:{server.server_address[1]}/"
+            try:
+                with urllib.request.urlopen(url, data=body) as response:
+                    return response.status
+            except urllib.error.HTTPError as e:
+                return e.code
+
+        assert post(json.dumps({"RequestId": "1"}).encode("utf8")) == 202
+        assert post(json.dumps({"RequestId": "2"}).encode("utf8")) == 202
+        assert post(json.dumps({"RequestId": "3"}).encode("utf8")) == 503
+        assert post(b"[1, 2") == 400
+        BlockingProvider.proceed.set()
+
+
+class ServiceEmulatorTestCase(TestCase):
+    def setUp(self) -> None:
+        self.server = mssql_emulator.start()
+        self.addCleanup(mssql_emulator.stop)
+        if not self.server:
+            self.skipTest("the responses are sent to CloudFormation")
+
+    def test_concurrent_requests(self):
+        requests = [
+            {
+                "RequestType": "Create",
+                "ResponseURL": "https://dev/null",
+                "StackId": "arn:aws:cloudformation:us-west-2:EXAMPLE/stack-name/guid",
+                "RequestId": f"request-{i}",
+                "ResourceType": "Custom::MSSQLLogin",
+                "LogicalResourceId": "Login",
+                "ResourceProperties": {
+                    "LoginName": f"app{i}",
+                    "Password": "Secret!123",
+                    "Server": {"URL": "mssql://localhost:1444", "Password": "P@ssW0rd"},
+                },
+            }
+            for i in range(20)
+        ]
+        runner = service.Service(workers=4, pending=16)
+        futures = [runner.submit(r) for r in requests]
+        assert runner.shutdown(5)
+
+        for future in futures:
+            assert future.result()["Status"] == "SUCCESS", future.result()["Reason"]
+        assert {f"app{i}" for i in range(20)} <= set(self.server.logins)
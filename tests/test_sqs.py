@@ -0,0 +1,95 @@
+import json
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+import pymssql
+
+import mssql_emulator
+from mssql_resource_provider import connection_pool, service, sqs
+from mssql_resource_provider.base import MSSQLResource
+
+
+def login_request(name: str, url: str = "mssql://localhost:1444") -> dict:
+    return {
+        "RequestType": "Create",
+        "ResponseURL": "https://dev/null",
+        "StackId": "arn:aws:cloudformation:us-west-2:EXAMPLE/stack-name/guid",
+        "RequestId": f"request-{name}",
+        "ResourceType": "Custom::MSSQLLogin",
+        "LogicalResourceId": name,
+        "ResourceProperties": {
+            "LoginName": name,
+            "Password": "Secret!123",
+            "Server": {"URL": url, "Password": "P@ssW0rd"},
+        },
+    }
+
+
+def record(message_id: str, request: dict, sns: bool = True) -> dict:
+    body = json.dumps(request)
+    if sns:
+        body = json.dumps({"Type": "Notification", "Message": body})
+    return {"messageId": message_id, "body": body}
+
+
+class SQSTestCase(TestCase):
+    def setUp(self) -> None:
+        self.server = mssql_emulator.start()
+        self.addCleanup(mssql_emulator.stop)
+        if not self.server:
+            self.skipTest("the responses are sent to CloudFormation")
+
+    def test_grouped_by_server(self):
+        event = {
+            "Records": [
+                record("1", login_request("app1")),
+                record("2", login_request("app2"), sns=False),
+                record("3", login_request("app3", "mssql://localhost:1444/tempdb")),
+                record("4", login_request("app4")),
+                {"messageId": "5", "body": "{}"},
+            ]
+        }
+        with patch("pymssql.connect", side_effect=self.server.connect) as connect:
+            response = sqs.handler(event, None)
+
+        assert response == {"batchItemFailures": [{"itemIdentifier": "5"}]}
+        assert {"app1", "app2", "app3", "app4"} <= set(self.server.logins)
+        # one connection for each server, shared by the requests
+        assert connect.call_count == 2
+        assert connection_pool.stats["hits"] >= 2
+
+    def test_failed_response(self):
+        def send_response(provider):
+            if provider.request["RequestId"] == "request-app2":
+                raise Exception("failed to put the response")
+
+        event = {
+            "Records": [
+                record("1", login_request("app1")),
+                record("2", login_request("app2")),
+            ]
+        }
+        with patch.object(MSSQLResource, "send_response", send_response):
+            response = sqs.handler(event, None)
+        assert response == {"batchItemFailures": [{"itemIdentifier": "2"}]}
+
+    def test_no_time_left(self):
+        context = MagicMock()
+        context.get_remaining_time_in_millis.return_value = 5000
+        event = {"Records": [record("1", login_request("app1"))]}
+        response = sqs.handler(event, context)
+        assert response == {"batchItemFailures": [{"itemIdentifier": "1"}]}
+        assert "app1" not in self.server.logins
+
+    def test_lambda_timeout(self):
+        # an invocation of the function with its timeout of 30 seconds
+        event = {"Records": [record("1", login_request("app1"))]}
+        response = sqs.handler(event, service.Context(30))
+        assert response == {"batchItemFailures": []}
+        assert "app1" in self.server.logins
+
+    def test_continued_request(self):
+        request = {**login_request("app1"), "AsyncState": {}}
+        with patch("mssql_resource_provider.handler") as handler:
+            sqs.handler(request, None)
+        handler.assert_called_once_with(request, None)
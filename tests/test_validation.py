@@ -0,0 +1,58 @@
+import copy
+from unittest import TestCase
+from unittest.mock import patch
+
+import jsonschema
+from cfn_resource_provider import ResourceProvider, default_injecting_validator
+
+from mssql_resource_provider import grant, login, user, validation
+
+server = {"URL": "mssql://localhost:1444", "Password": "P@ssW0rd"}
+
+invalid = [
+    (login.request_schema, {"LoginName": "a", "Server": server}),
+    (login.request_schema, {"LoginName": "a]", "Password": "x", "Server": server}),
+    (login.request_schema, {"LoginName": "a", "Password": "x", "Server": {}}),
+    (user.request_schema, {"UserName": "a", "Server": server}),
+    (grant.request_schema, {"Permission": "ALL", "Database": "a", "Server": server}),
+    (grant.request_schema, {"Permissions": [], "UserName": "a", "Server": server}),
+]
+
+
+def message(instance, schema, validate) -> str:
+    try:
+        validate(copy.deepcopy(instance), schema)
+    except jsonschema.ValidationError as e:
+        return e.message
+    return None
+
+
+class ValidationTestCase(TestCase):
+    def test_identical_errors(self):
+        for schema, instance in invalid:
+            expected = message(instance, schema, default_injecting_validator.validate)
+            assert expected
+            assert message(instance, schema, validation.validate) == expected
+            with patch.object(validation, "fastjsonschema", None):
+                assert message(instance, schema, validation.validate) == expected
+
+    def test_defaults(self):
+        for compiled in [validation.fastjsonschema, None]:
+            with patch.object(validation, "fastjsonschema", compiled):
+                instance = {"UserName": "a", "LoginName": "a", "Server": server}
+                validation.validate(instance, user.request_schema)
+                assert instance["DefaultSchema"] == "dbo"
+
+    def test_validator_is_cached(self):
+        assert validation.get_validator(
+            login.request_schema
+        ) is validation.get_validator(login.request_schema)
+
+    def test_best_match(self):
+        request = {"RequestType": "Create", "ResponseURL": "ftp://x"}
+        schema = ResourceProvider.cfn_request_schema
+        with self.assertRaises(jsonschema.ValidationError) as expected:
+            jsonschema.validate(request, schema)
+        with self.assertRaises(jsonschema.ValidationError) as actual:
+            validation.validate_best_match(request, schema)
+        assert actual.exception.message == expected.exception.message
@@ -0,0 +1,75 @@
+import json
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+import pymssql
+
+from mssql_resource_provider import connection_info, connection_pool, warmup
+from mssql_resource_provider.connection_info import from_url
+
+
+class WarmUpTestCase(TestCase):
+    def setUp(self) -> None:
+        connection_pool.clear()
+        connection_info.clear_ssm_cache()
+        self.ssm = MagicMock()
+        self.ssm.get_parameters.return_value = {
+            "Parameters": [{"Name": "/db/sa", "Value": "P@ssW0rd"}],
+            "InvalidParameters": [],
+        }
+
+    def tearDown(self) -> None:
+        connection_pool.clear()
+        connection_info.clear_ssm_cache()
+
+    @patch("socket.getaddrinfo")
+    @patch("pymssql.connect")
+    def test_from_environment(self, connect, getaddrinfo):
+        connect.side_effect = lambda **kwargs: MagicMock()
+        servers = [{"URL": "mssql://sa@db:1444/app", "PasswordParameterName": "/db/sa"}]
+        with patch.dict(
+            "os.environ", {"WARMUP_SERVERS": json.dumps(servers)}
+        ), patch.object(connection_info, "default_ssm_client", self.ssm):
+            warmup.from_environment()
+
+        getaddrinfo.assert_called_once()
+        assert getaddrinfo.call_args[0][:2] == ("db", 1444)
+        connect.assert_called_once()
+
+        # the first request finds the password in the cache and the session in the pool
+        info = from_url(
+            "mssql://sa@db:1444/app",
+            connection_info.get_ssm_password(self.ssm, "/db/sa"),
+        )
+        connection = connection_pool.acquire(info)
+        assert connect.call_count == 1
+        assert self.ssm.get_parameters.call_count == 1
+        connection_pool.release(info, connection)
+
+    @patch("pymssql.connect")
+    def test_failure_is_ignored(self, connect):
+        connect.side_effect = Exception("unreachable")
+        warmup.warm_up(
+            [{"URL": "mssql://sa@localhost:1444/app", "Password": "P@ssW0rd"}], self.ssm
+        )
+        warmup.warm_up([{"URL": "https://db", "Password": "P@ssW0rd"}], self.ssm)
+        self.ssm.get_parameters.assert_not_called()
+
+    @patch("socket.getaddrinfo")
+    @patch("pymssql.connect")
+    def test_unreachable(self, connect, getaddrinfo):
+        connect.side_effect = pymssql.OperationalError(
+            20009, b"Unable to connect: Adaptive Server is unavailable"
+        )
+        warmup.warm_up(
+            [
+                {"URL": "mssql://sa@db:1444/app", "Password": "P@ssW0rd"},
+                {
+                    "URL": "mssql://sa@db:1444/app?login_timeout=8",
+                    "Password": "P@ssW0rd",
+                },
+            ],
+            self.ssm,
+        )
+        timeouts = [c[1]["login_timeout"] for c in connect.call_args_list]
+        assert timeouts == [warmup.login_timeout, 8]